@@ -0,0 +1,97 @@
+"""partition usage_logs by day, add status_code and usage_rollups
+
+Revision ID: 0002_usage_partitions_rollups
+Revises: 0001_baseline
+Create Date: 2026-10-19 11:00:00
+
+"""
+from datetime import datetime, timedelta, timezone
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0002_usage_partitions_rollups"
+down_revision = "0001_baseline"
+branch_labels = None
+depends_on = None
+
+# Partitions for today and the following week; the maintain_usage_logs beat task keeps ahead from there.
+PARTITIONS_AHEAD_DAYS = 7
+COLUMNS = "id, user_id, api_key_id, endpoint, timestamp, response_time"
+
+
+def _usage_logs_columns() -> list:
+    return [
+        sa.Column("id", sa.UUID(), nullable=False),
+        sa.Column("user_id", sa.UUID(), nullable=False),
+        sa.Column("api_key_id", sa.UUID(), nullable=True),
+        sa.Column("endpoint", sa.String(length=255), nullable=False),
+        sa.Column("timestamp", sa.DateTime(timezone=True), server_default=sa.text("now()"), nullable=False),
+        sa.Column("response_time", sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(["api_key_id"], ["api_keys.id"]),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+    ]
+
+
+def upgrade() -> None:
+    op.drop_index("ix_usage_logs_user_id_timestamp", table_name="usage_logs")
+    op.drop_index(op.f("ix_usage_logs_api_key_id"), table_name="usage_logs")
+    op.rename_table("usage_logs", "usage_logs_legacy")
+    op.execute("ALTER TABLE usage_logs_legacy RENAME CONSTRAINT usage_logs_pkey TO usage_logs_legacy_pkey")
+
+    op.create_table(
+        "usage_logs",
+        *_usage_logs_columns(),
+        sa.Column("status_code", sa.Integer(), nullable=True),
+        sa.PrimaryKeyConstraint("id", "timestamp"),
+        postgresql_partition_by="RANGE (timestamp)",
+    )
+    op.create_index(op.f("ix_usage_logs_api_key_id"), "usage_logs", ["api_key_id"], unique=False)
+    op.create_index("ix_usage_logs_user_id_timestamp", "usage_logs", ["user_id", "timestamp"], unique=False)
+    # Catches rows outside the daily partitions (older history, or if maintenance falls behind).
+    op.execute("CREATE TABLE usage_logs_default PARTITION OF usage_logs DEFAULT")
+    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    for offset in range(PARTITIONS_AHEAD_DAYS + 1):
+        day = today + timedelta(days=offset)
+        op.execute(
+            f"CREATE TABLE usage_logs_p{day:%Y%m%d} PARTITION OF usage_logs "
+            f"FOR VALUES FROM ('{day.isoformat()}') TO ('{(day + timedelta(days=1)).isoformat()}')"
+        )
+    op.execute(f"INSERT INTO usage_logs ({COLUMNS}) SELECT {COLUMNS} FROM usage_logs_legacy")
+    op.drop_table("usage_logs_legacy")
+
+    op.create_table(
+        "usage_rollups",
+        sa.Column("granularity", sa.String(length=8), nullable=False),
+        sa.Column("bucket_start", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("user_id", sa.UUID(), nullable=False),
+        sa.Column("endpoint", sa.String(length=255), nullable=False),
+        sa.Column("request_count", sa.Integer(), nullable=False),
+        sa.Column("error_count", sa.Integer(), nullable=False),
+        sa.Column("total_ms", sa.Float(), nullable=False),
+        sa.Column("p50_ms", sa.Float(), nullable=False),
+        sa.Column("p95_ms", sa.Float(), nullable=False),
+        sa.Column("p99_ms", sa.Float(), nullable=False),
+        sa.Column("max_ms", sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("granularity", "bucket_start", "user_id", "endpoint"),
+    )
+    op.create_index(
+        "ix_usage_rollups_user_granularity_bucket", "usage_rollups", ["user_id", "granularity", "bucket_start"], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_usage_rollups_user_granularity_bucket", table_name="usage_rollups")
+    op.drop_table("usage_rollups")
+
+    op.create_table("usage_logs_legacy", *_usage_logs_columns(), sa.PrimaryKeyConstraint("id", name="usage_logs_legacy_pkey"))
+    op.execute(f"INSERT INTO usage_logs_legacy ({COLUMNS}) SELECT {COLUMNS} FROM usage_logs")
+    # Dropping the parent drops every partition with it.
+    op.drop_table("usage_logs")
+    op.rename_table("usage_logs_legacy", "usage_logs")
+    op.execute("ALTER TABLE usage_logs RENAME CONSTRAINT usage_logs_legacy_pkey TO usage_logs_pkey")
+    op.create_index(op.f("ix_usage_logs_api_key_id"), "usage_logs", ["api_key_id"], unique=False)
+    op.create_index("ix_usage_logs_user_id_timestamp", "usage_logs", ["user_id", "timestamp"], unique=False)
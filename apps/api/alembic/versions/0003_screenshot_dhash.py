@@ -0,0 +1,33 @@
+"""add perceptual hash (dHash) columns and band indexes to screenshots
+
+Revision ID: 0003_screenshot_dhash
+Revises: 0002_usage_partitions_rollups
+Create Date: 2026-10-19 14:00:00
+
+Similarity search (ScreenshotsRepository.find_similar) uses bit_count(bit), so needs PostgreSQL 14+.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0003_screenshot_dhash"
+down_revision = "0002_usage_partitions_rollups"
+branch_labels = None
+depends_on = None
+
+BANDS = 4
+
+
+def upgrade() -> None:
+    op.add_column("screenshots", sa.Column("dhash", sa.BigInteger(), nullable=True))
+    for i in range(BANDS):
+        op.add_column("screenshots", sa.Column(f"dhash_b{i}", sa.Integer(), nullable=True))
+        op.create_index(f"ix_screenshots_user_id_dhash_b{i}", "screenshots", ["user_id", f"dhash_b{i}"], unique=False)
+
+
+def downgrade() -> None:
+    for i in range(BANDS):
+        op.drop_index(f"ix_screenshots_user_id_dhash_b{i}", table_name="screenshots")
+        op.drop_column("screenshots", f"dhash_b{i}")
+    op.drop_column("screenshots", "dhash")
@@ -0,0 +1,26 @@
+"""add updated_at to screenshots
+
+Revision ID: 0004_screenshot_updated_at
+Revises: 0003_screenshot_dhash
+Create Date: 2026-10-19 18:00:00
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0004_screenshot_updated_at"
+down_revision = "0003_screenshot_dhash"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Existing rows start from created_at, so old stuck rows count as stale right away.
+    op.add_column("screenshots", sa.Column("updated_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False))
+    op.execute("UPDATE screenshots SET updated_at = created_at")
+
+
+def downgrade() -> None:
+    op.drop_column("screenshots", "updated_at")
@@ -4,31 +4,66 @@ from fastapi import Depends, Request
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.cache.principals import CachedPrincipal, Principal, principal_cache
+from app.core.config import settings
 from app.core.exceptions import http_error
 from app.core.security import decode_token
 from app.db.session import get_db
+from app.middleware.ip_filter import client_address, ip_filter
+from app.models.user import User
 from app.repositories.users import UsersRepository
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/auth/login")
 
 
-async def get_current_user(db: AsyncSession = Depends(get_db), token: str = Depends(oauth2_scheme)):
+async def get_current_user(
+    request: Request, db: AsyncSession = Depends(get_db), token: str = Depends(oauth2_scheme)
+) -> CachedPrincipal:
+    """
+    Returns a read-only principal snapshot for the bearer token.
+    Verified claims and user snapshots are cached briefly, so most requests skip both the
+    signature check and the users lookup.
+    """
+    payload = principal_cache.get_claims(token)
     try:
-        payload = decode_token(token)
+        if payload is None:
+            payload = decode_token(token)
         sub = payload.get("sub")
         if not sub:
             raise http_error(401, "Invalid token")
         user_id = uuid.UUID(sub)
     except Exception:
         raise http_error(401, "Invalid token")
+    principal_cache.remember_claims(token, payload)
+    request.state.principal_id = user_id
+
+    if settings.IP_FILTER_ENABLED:
+        address = client_address(request)
+        if address is not None and not ip_filter.user_allowed(address, user_id):
+            raise http_error(403, "Forbidden")
+
+    token_id = payload.get("jti") or payload.get("iat")
+    principal = principal_cache.get(user_id, token_id)
+    if principal is not None:
+        return principal
 
     user = await UsersRepository(db).get_by_id(user_id)
+    if not user:
+        raise http_error(401, "User not found")
+    return principal_cache.remember(user, token_id, payload)
+
+
+async def get_current_db_user(db: AsyncSession = Depends(get_db), principal: CachedPrincipal = Depends(get_current_user)) -> User:
+    """Loads the authenticated user into this request's session, for handlers that modify it."""
+    user = await UsersRepository(db).get_by_id(principal.id)
     if not user:
         raise http_error(401, "User not found")
     return user
 
 
-async def get_principal(request: Request, db: AsyncSession = Depends(get_db), token: str = Depends(oauth2_scheme)):
+async def get_principal(
+    request: Request, db: AsyncSession = Depends(get_db), token: str = Depends(oauth2_scheme)
+) -> Principal:
     """
     Returns a user principal from either:
     - API key middleware (request.state.user)
@@ -37,14 +72,13 @@ async def get_principal(request: Request, db: AsyncSession = Depends(get_db), to
     state_user = getattr(request.state, "user", None)
     if state_user is not None:
         return state_user
-    return await get_current_user(db=db, token=token)
+    return await get_current_user(request, db=db, token=token)
 
 
 def require_roles(*roles: str):
-    async def _dep(user=Depends(get_principal)):
+    async def _dep(user: Principal = Depends(get_principal)) -> Principal:
         if user.role not in roles:
             raise http_error(403, "Forbidden")
         return user
 
     return _dep
-
@@ -0,0 +1,57 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Literal
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.deps import get_principal, require_roles
+from app.cache.principals import Principal
+from app.db.session import get_read_db
+from app.repositories.usage import UsageRepository
+from app.schemas.usage import UsageBucketOut
+
+router = APIRouter(prefix="/analytics", tags=["analytics"])
+
+# Widest window one request may cover, per granularity
+MAX_WINDOW = {"hour": timedelta(days=31), "day": timedelta(days=366)}
+
+
+def _window(granularity: str, start: datetime | None, end: datetime | None) -> tuple[datetime, datetime]:
+    from app.core.exceptions import http_error
+
+    end = end or datetime.now(timezone.utc)
+    start = start or end - (timedelta(days=1) if granularity == "hour" else timedelta(days=30))
+    if start >= end:
+        raise http_error(400, "start must be before end")
+    if end - start > MAX_WINDOW[granularity]:
+        raise http_error(400, f"window too large for {granularity} granularity")
+    return start, end
+
+
+@router.get("/usage", response_model=list[UsageBucketOut])
+async def my_usage(
+    granularity: Literal["hour", "day"] = "hour",
+    start: datetime | None = None,
+    end: datetime | None = None,
+    endpoint: str | None = Query(default=None, max_length=255),
+    user: Principal = Depends(get_principal),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Caller's own request counts, errors and latency percentiles, served from the rollups only."""
+    start, end = _window(granularity, start, end)
+    return await UsageRepository(db).list_rollups(granularity=granularity, start=start, end=end, user_id=user.id, endpoint=endpoint)
+
+
+@router.get("/users/{user_id}/usage", response_model=list[UsageBucketOut])
+async def user_usage(
+    user_id: uuid.UUID,
+    granularity: Literal["hour", "day"] = "hour",
+    start: datetime | None = None,
+    end: datetime | None = None,
+    endpoint: str | None = Query(default=None, max_length=255),
+    _: object = Depends(require_roles("admin")),
+    db: AsyncSession = Depends(get_read_db),
+):
+    start, end = _window(granularity, start, end)
+    return await UsageRepository(db).list_rollups(granularity=granularity, start=start, end=end, user_id=user_id, endpoint=endpoint)
@@ -4,8 +4,9 @@ from fastapi import APIRouter, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.deps import get_current_user
+from app.cache.principals import CachedPrincipal
 from app.core.config import settings
-from app.db.session import get_db
+from app.db.session import get_db, get_read_db
 from app.repositories.api_keys import APIKeysRepository
 from app.schemas.api_keys import APIKeyCreateRequest, APIKeyCreateResponse, APIKeyOut, APIKeyRotateResponse
 from app.utils.api_keys import generate_api_key
@@ -23,12 +24,12 @@ def default_key_rpm(subscription_tier: str) -> int:
 
 
 @router.get("", response_model=list[APIKeyOut])
-async def list_keys(user=Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+async def list_keys(user: CachedPrincipal = Depends(get_current_user), db: AsyncSession = Depends(get_read_db)):
     return await APIKeysRepository(db).list_for_user(user.id)
 
 
 @router.post("", response_model=APIKeyCreateResponse)
-async def create_key(payload: APIKeyCreateRequest, user=Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+async def create_key(payload: APIKeyCreateRequest, user: CachedPrincipal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     raw, key_hash, last4 = generate_api_key()
     rpm = default_key_rpm(user.subscription_tier)
     key = await APIKeysRepository(db).create(
@@ -44,7 +45,7 @@ async def create_key(payload: APIKeyCreateRequest, user=Depends(get_current_user
 
 
 @router.post("/{api_key_id}/revoke", response_model=APIKeyOut)
-async def revoke_key(api_key_id: str, user=Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+async def revoke_key(api_key_id: str, user: CachedPrincipal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     repo = APIKeysRepository(db)
     key = await repo.get_for_user(user.id, api_key_id)
     if not key:
@@ -55,7 +56,7 @@ async def revoke_key(api_key_id: str, user=Depends(get_current_user), db: AsyncS
 
 
 @router.post("/{api_key_id}/rotate", response_model=APIKeyRotateResponse)
-async def rotate_key(api_key_id: str, user=Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+async def rotate_key(api_key_id: str, user: CachedPrincipal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     repo = APIKeysRepository(db)
     old = await repo.get_for_user(user.id, api_key_id)
     if not old:
@@ -80,7 +81,7 @@ async def rotate_key(api_key_id: str, user=Depends(get_current_user), db: AsyncS
 
 
 @router.post("/{api_key_id}/renew", response_model=APIKeyOut)
-async def renew_key(api_key_id: str, user=Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+async def renew_key(api_key_id: str, user: CachedPrincipal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
     repo = APIKeysRepository(db)
     key = await repo.get_for_user(user.id, api_key_id)
     if not key:
@@ -88,7 +89,7 @@ async def renew_key(api_key_id: str, user=Depends(get_current_user), db: AsyncSe
 
         raise http_error(404, "Not found")
     # Simple auto-renew: extend expiry by 30 days from now.
-    key.expires_at = datetime.now(timezone.utc) + timedelta(days=30)  # type: ignore[name-defined]
+    key.expires_at = datetime.now(timezone.utc) + timedelta(days=30)
     await db.commit()
     await db.refresh(key)
     return key
@@ -1,8 +1,9 @@
 from fastapi import APIRouter, Depends, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.api.deps import get_current_user
+from app.api.deps import get_current_db_user
 from app.db.session import get_db
+from app.models.user import User
 from app.schemas.auth_enterprise import (
     LoginRequest,
     MFASetupResponse,
@@ -76,19 +77,19 @@ async def reset_password(payload: ResetPasswordRequest, db: AsyncSession = Depen
 
 
 @router.post("/mfa/setup", response_model=MFASetupResponse)
-async def mfa_setup(user=Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+async def mfa_setup(user: User = Depends(get_current_db_user), db: AsyncSession = Depends(get_db)):
     secret, uri = await EnterpriseAuthService(db).mfa_setup(user)
     return MFASetupResponse(secret=secret, otpauth_uri=uri)
 
 
 @router.post("/mfa/enable")
-async def mfa_enable(payload: MFAVerifyRequest, user=Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+async def mfa_enable(payload: MFAVerifyRequest, user: User = Depends(get_current_db_user), db: AsyncSession = Depends(get_db)):
     await EnterpriseAuthService(db).mfa_enable(user, payload.code)
     return {"ok": True}
 
 
 @router.post("/mfa/disable")
-async def mfa_disable(payload: MFAVerifyRequest, user=Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+async def mfa_disable(payload: MFAVerifyRequest, user: User = Depends(get_current_db_user), db: AsyncSession = Depends(get_db)):
     await EnterpriseAuthService(db).mfa_disable(user, payload.code)
     return {"ok": True}
 
@@ -0,0 +1,59 @@
+from typing import Literal
+
+from fastapi import APIRouter, Depends, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.deps import get_current_user, require_roles
+from app.cache.principals import CachedPrincipal
+from app.db.session import get_db, get_read_db
+from app.schemas.ip_lists import IPListEntryCreate, IPListEntryOut
+from app.services.ip_lists import IPListsService
+
+router = APIRouter(tags=["ip-lists"])
+
+ListName = Literal["allow", "deny"]
+
+
+@router.get("/admin/ip-lists/{list_name}", response_model=list[IPListEntryOut])
+async def list_global(list_name: ListName, _: object = Depends(require_roles("admin")), db: AsyncSession = Depends(get_read_db)):
+    return await IPListsService(db).entries(list_name=list_name)
+
+
+@router.post("/admin/ip-lists/{list_name}", response_model=IPListEntryOut, status_code=201)
+async def add_global(
+    list_name: ListName,
+    payload: IPListEntryCreate,
+    _: object = Depends(require_roles("admin")),
+    db: AsyncSession = Depends(get_db),
+):
+    return await IPListsService(db).add(list_name=list_name, ip=payload.ip)
+
+
+@router.delete("/admin/ip-lists/{list_name}")
+async def remove_global(
+    list_name: ListName,
+    ip: str = Query(min_length=2, max_length=64),
+    _: object = Depends(require_roles("admin")),
+    db: AsyncSession = Depends(get_db),
+):
+    return {"removed": await IPListsService(db).remove(list_name=list_name, ip=ip)}
+
+
+@router.get("/users/me/ip-lists/{list_name}", response_model=list[IPListEntryOut])
+async def list_mine(list_name: ListName, user: CachedPrincipal = Depends(get_current_user), db: AsyncSession = Depends(get_read_db)):
+    return await IPListsService(db).entries(list_name=list_name, user_id=user.id)
+
+
+@router.post("/users/me/ip-lists/{list_name}", response_model=IPListEntryOut, status_code=201)
+async def add_mine(list_name: ListName, payload: IPListEntryCreate, user: CachedPrincipal = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    return await IPListsService(db).add(list_name=list_name, ip=payload.ip, user_id=user.id)
+
+
+@router.delete("/users/me/ip-lists/{list_name}")
+async def remove_mine(
+    list_name: ListName,
+    ip: str = Query(min_length=2, max_length=64),
+    user: CachedPrincipal = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    return {"removed": await IPListsService(db).remove(list_name=list_name, ip=ip, user_id=user.id)}
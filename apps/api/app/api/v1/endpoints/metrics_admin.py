@@ -1,12 +1,118 @@
+import time
+from typing import Any, Literal
+
 from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
 
 from app.api.deps import require_roles
-from app.monitoring.metrics import metrics
+from app.db.session import slow_queries
+from app.monitoring.aggregation import cluster_view
+from app.monitoring.metrics import metrics, summarize
+from app.monitoring.prometheus import render_prometheus
+from app.monitoring.stages import parse_stage_key
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
 
+async def _cluster_or_error() -> tuple[dict, dict]:
+    view = await cluster_view()
+    if view is None:
+        from app.core.exceptions import http_error
+
+        raise http_error(400, "Metrics aggregation is off (set METRICS_AGGREGATION)")
+    return view
+
+
 @router.get("/metrics")
-async def get_metrics(_: object = Depends(require_roles("admin"))):
-    return metrics.snapshot()
+async def get_metrics(scope: Literal["process", "cluster"] = "process", _: object = Depends(require_roles("admin"))):
+    """scope=cluster merges the histograms pushed by every API and worker process."""
+    if scope == "cluster":
+        histograms, counters = await _cluster_or_error()
+        routes = {key: summarize(h, errors) for key, (h, errors) in histograms.items()}
+        return {"ts": time.time(), "scope": "cluster", "routes": routes, "counters": counters}
+
+    snap = metrics.snapshot()
+    snap["scope"] = "process"
+    snap["db"] = {
+        "slow_queries": [{"ts": ts, "ms": ms, "statement": stmt} for ts, ms, stmt in reversed(slow_queries)],
+    }
+    return snap
+
+
+@router.get("/metrics/prometheus", response_class=PlainTextResponse)
+async def get_metrics_prometheus(
+    scope: Literal["process", "cluster"] = "process", _: object = Depends(require_roles("admin"))
+):
+    if scope == "cluster":
+        histograms, counters = await _cluster_or_error()
+        body = render_prometheus(histograms, counters, {})
+    else:
+        body = render_prometheus(metrics.histograms(), metrics.counters(), metrics.gauges())
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+
+@router.get("/pipeline/stages")
+async def get_pipeline_stages(scope: Literal["process", "cluster"] = "cluster", _: object = Depends(require_roles("admin"))):
+    """
+    Screenshot pipeline time per stage, broken down by platform and source host:
+    {platform: {host: {stage: {count, errors, mean_ms, p50_ms, ...}}}}.
+    The pipeline runs in Celery workers, so the cluster view is the default.
+    """
+    if scope == "cluster":
+        histograms, counters = await _cluster_or_error()
+    else:
+        histograms, counters = metrics.histograms(), metrics.counters()
+    breakdown: dict = {}
+    for key, (h, errors) in histograms.items():
+        parsed = parse_stage_key(key)
+        if parsed is None:
+            continue
+        stage, platform, host = parsed
+        breakdown.setdefault(platform, {}).setdefault(host, {})[stage] = summarize(h, errors)
+    bytes_total = {k[len("pipeline.bytes.") :]: v for k, v in counters.items() if k.startswith("pipeline.bytes.")}
+    return {"ts": time.time(), "scope": scope, "stages": breakdown, "bytes": bytes_total}
+
+
+@router.get("/scheduler")
+async def get_scheduler(scope: Literal["process", "cluster"] = "cluster", _: object = Depends(require_roles("admin"))):
+    """
+    Per-tier scheduling tail latency and current backlog:
+    {tier: {queue, staged: {tenants, jobs}, staged_ms|queue_wait_ms|latency_ms: {count, p50_ms, p95_ms, p99_ms, ...}}}.
+    queue_wait and latency are recorded by workers, so the cluster view is the default.
+    """
+    import asyncio
+
+    from app.tasks.scheduler import METRIC_NAMES, TIER_QUEUES, TIERS, metric_key, scheduler
+
+    if scope == "cluster":
+        histograms, _counters = await _cluster_or_error()
+    else:
+        histograms = metrics.histograms()
+    backlog = await asyncio.to_thread(scheduler.backlog)
+    tiers: dict[str, dict[str, Any]] = {}
+    for tier in TIERS:
+        tiers[tier] = {"queue": TIER_QUEUES[tier], "staged": backlog[tier]}
+        for name in METRIC_NAMES:
+            entry = histograms.get(metric_key(name, tier))
+            tiers[tier][f"{name}_ms"] = summarize(*entry) if entry else None
+    return {"ts": time.time(), "scope": scope, "tiers": tiers}
+
+
+@router.get("/pipeline/hosts")
+async def get_pipeline_hosts(_: object = Depends(require_roles("admin"))):
+    """
+    Per origin host: adaptive fetch concurrency {host: {limit, in_flight, blocked_until}} and
+    circuit breakers that have opened {host: {state, open_until, failures, total}}.
+    """
+    from app.cache.redis import get_redis_client
+    from app.processing.circuit_breaker import circuit_breaker
+    from app.processing.host_limits import host_limiter
 
+    r = get_redis_client()
+    scope = "cluster" if r is not None else "process"
+    try:
+        hosts = await host_limiter.snapshot(r)
+        circuits = await circuit_breaker.snapshot(r)
+    except Exception:
+        scope, hosts, circuits = "process", await host_limiter.snapshot(), await circuit_breaker.snapshot()
+    return {"ts": time.time(), "scope": scope, "hosts": hosts, "circuits": circuits}
@@ -2,21 +2,28 @@ from fastapi import APIRouter, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.deps import get_principal
+from app.cache.principals import Principal
 from app.db.session import get_db
 from app.processing.scrapers import scrape_app_store, scrape_play_store
 from app.services.screenshots import ScreenshotsService
-from app.tasks.screenshot_tasks import enqueue_screenshot_processing
+from app.tasks.enqueue import enqueue_screenshots
 
 router = APIRouter(prefix="/pipeline", tags=["pipeline"])
 
 
 @router.post("/scrape")
-async def scrape_and_enqueue(payload: dict, user=Depends(get_principal), db: AsyncSession = Depends(get_db)):
+async def scrape_and_enqueue(payload: dict, user: Principal = Depends(get_principal), db: AsyncSession = Depends(get_db)):
     """
     Input:
       { "platform": "appstore"|"playstore", "app_id": "<id or package>" }
     Output:
-      { "batchId": "<synthetic>", "count": N, "screenshotIds": [...] }
+      { "batchId": "<synthetic>", "count": N, "screenshotIds": [...], "enqueued": true|false,
+        "diff": { "added": [...], "removed": [...], "unchanged": [...] } }
+    Incremental: only URLs the user doesn't already have for this app are created and processed
+    (count/screenshotIds), plus still-listed ones that FAILED or got stuck (SCREENSHOT_STALE_SECONDS);
+    screenshots no longer listed are marked SUPERSEDED. diff entries are {"id", "url"}.
+    enqueued is false when the jobs couldn't be queued; the rows stay QUEUED and a later scrape
+    re-queues them.
     """
     platform = payload.get("platform")
     app_id = payload.get("app_id")
@@ -30,11 +37,25 @@ async def scrape_and_enqueue(payload: dict, user=Depends(get_principal), db: Asy
     batch_id = f"{platform}:{app_id}"
 
     svc = ScreenshotsService(db)
-    ids = []
-    for idx, url in enumerate(urls):
-        s = await svc.create(user_id=user.id, app_id=app_id, platform=platform, url=url, metadata={"title": result.title, "developer": result.developer})
-        ids.append(str(s.id))
-        enqueue_screenshot_processing(str(s.id), batch_id=batch_id, idx=idx, priority="normal")
-
-    return {"batchId": batch_id, "count": len(ids), "screenshotIds": ids}
-
+    diff = await svc.sync_app(
+        user_id=user.id, app_id=app_id, platform=platform, urls=urls, metadata={"title": result.title, "developer": result.developer}
+    )
+    # idx is the position in the store listing, so progress events line up with the scrape.
+    position = {url: idx for idx, url in enumerate(dict.fromkeys(urls))}
+    queued = sorted(diff.added + diff.retried, key=lambda s: position[s.url])
+    ids = [str(s.id) for s in queued]
+    # One submit for the batch: the scheduler interleaves it with other tenants' work.
+    enqueued = True
+    if queued:
+        enqueued = enqueue_screenshots([(str(s.id), position[s.url]) for s in queued], tenant_id=user.id, tier=user.subscription_tier, batch_id=batch_id)
+
+    def _entries(rows):
+        return [{"id": str(s.id), "url": s.url} for s in rows]
+
+    return {
+        "batchId": batch_id,
+        "count": len(ids),
+        "screenshotIds": ids,
+        "enqueued": enqueued,
+        "diff": {"added": _entries(diff.added), "removed": _entries(diff.removed), "unchanged": _entries(diff.unchanged)},
+    }
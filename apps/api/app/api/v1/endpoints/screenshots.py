@@ -1,35 +1,116 @@
-from fastapi import APIRouter, Depends
+from typing import Literal
+
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import Response
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.api.deps import get_principal
-from app.db.session import get_db
-from app.schemas.screenshots import ScreenshotCreate, ScreenshotOut
+from app.cache.principals import Principal
+from app.core.config import settings
+from app.core.exceptions import http_error
+from app.db.session import get_db, get_read_db
+from app.processing.phash import MAX_DISTANCE
+from app.processing.transforms import TransformSpec, transformer
+from app.schemas.screenshots import ScreenshotCreate, ScreenshotOut, ScreenshotSrcsetOut, SimilarScreenshotOut
 from app.services.screenshots import ScreenshotsService
-from app.tasks.screenshot_tasks import enqueue_screenshot_processing
+from app.tasks.enqueue import enqueue_screenshot_processing
 
 router = APIRouter(prefix="/screenshots", tags=["screenshots"])
 
 
 @router.get("", response_model=list[ScreenshotOut])
-async def list_screenshots(user=Depends(get_principal), db: AsyncSession = Depends(get_db)):
+async def list_screenshots(user: Principal = Depends(get_principal), db: AsyncSession = Depends(get_read_db)):
     return await ScreenshotsService(db).list(user.id)
 
 
 @router.post("", response_model=ScreenshotOut)
-async def create_screenshot(payload: ScreenshotCreate, user=Depends(get_principal), db: AsyncSession = Depends(get_db)):
+async def create_screenshot(payload: ScreenshotCreate, user: Principal = Depends(get_principal), db: AsyncSession = Depends(get_db)):
     s = await ScreenshotsService(db).create(
         user_id=user.id, app_id=payload.app_id, platform=payload.platform, url=payload.url, metadata=payload.meta
     )
-    enqueue_screenshot_processing(str(s.id))
+    enqueue_screenshot_processing(str(s.id), tenant_id=user.id, tier=user.subscription_tier)
     return s
 
 
 @router.get("/{screenshot_id}", response_model=ScreenshotOut)
-async def get_screenshot(screenshot_id: str, user=Depends(get_principal), db: AsyncSession = Depends(get_db)):
+async def get_screenshot(screenshot_id: str, user: Principal = Depends(get_principal), db: AsyncSession = Depends(get_read_db)):
     s = await ScreenshotsService(db).get(user.id, screenshot_id)
     if not s:
-        from app.core.exceptions import http_error
-
         raise http_error(404, "Not found")
     return s
 
+
+@router.get("/{screenshot_id}/srcset", response_model=ScreenshotSrcsetOut)
+async def screenshot_srcset(screenshot_id: str, user: Principal = Depends(get_principal), db: AsyncSession = Depends(get_read_db)):
+    """
+    Every stored width of a processed screenshot (variants plus the full-size image) with fresh URLs,
+    so clients pick the smallest file that fills their layout.
+    """
+    s = await ScreenshotsService(db).get(user.id, screenshot_id)
+    if not s:
+        raise http_error(404, "Not found")
+    meta = s.meta or {}
+    if s.status != "COMPLETE" or not meta.get("webp_key"):
+        raise http_error(409, "Screenshot not processed yet")
+    images = [v for v in meta.get("variants") or [] if v.get("key")]
+    images.append({"width": meta["width"], "height": meta["height"], "key": meta["webp_key"]})
+    images.sort(key=lambda v: v["width"])
+
+    from app.storage.s3 import object_urls  # boto3 loads on first use, not at API startup
+
+    urls = object_urls([v["key"] for v in images])
+    return {
+        "srcset": ", ".join(f"{url} {v['width']}w" for url, v in zip(urls, images)),
+        "images": [{"width": v["width"], "height": v["height"], "url": url} for url, v in zip(urls, images)],
+    }
+
+
+@router.get("/{screenshot_id}/transform", response_class=Response)
+async def transform_screenshot(
+    screenshot_id: str,
+    width: int | None = Query(None, ge=1, le=settings.TRANSFORM_MAX_DIMENSION),
+    height: int | None = Query(None, ge=1, le=settings.TRANSFORM_MAX_DIMENSION),
+    fit: Literal["contain", "cover", "fill"] = "contain",
+    format: Literal["webp", "png", "jpeg"] = "webp",
+    user: Principal = Depends(get_principal),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    A resized, cropped or re-encoded rendition of a processed screenshot, made on first request and
+    cached (see app.processing.transforms). X-Transform-Cache says which layer answered.
+    """
+    s = await ScreenshotsService(db).get(user.id, screenshot_id)
+    if not s:
+        raise http_error(404, "Not found")
+    meta = s.meta or {}
+    if s.status != "COMPLETE" or not meta.get("webp_key"):
+        raise http_error(409, "Screenshot not processed yet")
+    spec = TransformSpec(width=width, height=height, fit=fit, format=format)
+    try:
+        data, source = await transformer.transform(meta, spec)
+    except LookupError:
+        raise http_error(404, "Image not found in storage")
+    return Response(
+        data, media_type=spec.content_type, headers={"Cache-Control": "private, max-age=86400", "X-Transform-Cache": source}
+    )
+
+
+@router.get("/{screenshot_id}/similar", response_model=list[SimilarScreenshotOut])
+async def similar_screenshots(
+    screenshot_id: str,
+    max_distance: int = Query(6, ge=0, le=MAX_DISTANCE),
+    limit: int = Query(20, ge=1, le=100),
+    user: Principal = Depends(get_principal),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """
+    Near-identical screenshots among the user's own (any app or platform), by dHash Hamming distance,
+    nearest first. 0-4 bits is practically the same image; around 10 still tends to be the same layout.
+    """
+    svc = ScreenshotsService(db)
+    found = await svc.similar(user.id, screenshot_id, max_distance=max_distance, limit=limit)
+    if found is None:
+        if not await svc.get(user.id, screenshot_id):
+            raise http_error(404, "Not found")
+        raise http_error(409, "Screenshot not processed yet")
+    return [{"screenshot": s, "distance": d} for s, d in found]
@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from app.api.v1.endpoints import api_keys, auth, auth_enterprise, developer, metrics_admin, pipeline, screenshots, users
+from app.api.v1.endpoints import analytics, api_keys, auth, auth_enterprise, developer, ip_lists, metrics_admin, pipeline, screenshots, users
 
 api_router = APIRouter()
 api_router.include_router(auth.router)
@@ -9,6 +9,8 @@ api_router.include_router(users.router)
 api_router.include_router(screenshots.router)
 api_router.include_router(api_keys.router)
 api_router.include_router(developer.router)
+api_router.include_router(ip_lists.router)
 api_router.include_router(metrics_admin.router)
 api_router.include_router(pipeline.router)
+api_router.include_router(analytics.router)
 
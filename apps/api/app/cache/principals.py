@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Iterable
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session as OrmSession, object_session
+
+from app.cache.memory import TTLCache
+from app.cache.redis import get_redis_client
+from app.core.config import settings
+from app.models.user import User
+from app.utils.tokens import sha256_hex
+
+INVALIDATE_CHANNEL = "principals:invalidate"
+ALL_USERS = "*"
+
+
+@dataclass(frozen=True)
+class CachedPrincipal:
+    """Read-only snapshot of the user fields request handlers and role checks rely on."""
+
+    id: uuid.UUID
+    email: str
+    role: str
+    subscription_tier: str
+    email_verified: bool
+    mfa_enabled: bool
+    locked_until: datetime | None
+    created_at: datetime
+
+    @classmethod
+    def from_user(cls, user: User) -> "CachedPrincipal":
+        return cls(
+            id=user.id,
+            email=user.email,
+            role=user.role,
+            subscription_tier=user.subscription_tier,
+            email_verified=user.email_verified,
+            mfa_enabled=user.mfa_enabled,
+            locked_until=user.locked_until,
+            created_at=user.created_at,
+        )
+
+
+# What get_principal returns: API key auth attaches the ORM user, bearer auth a cached snapshot.
+Principal = User | CachedPrincipal
+
+
+class PrincipalCache:
+    """
+    Per-process cache for bearer-authenticated requests:
+    - verified JWT claims keyed by token hash (skips signature verification)
+    - user snapshots keyed by (user id, token jti/iat) (skips the users lookup)
+    Entries live for PRINCIPAL_CACHE_TTL_SECONDS at most and never past the token's expiry.
+    Committed changes to cached user fields (ORM attribute sets and bulk UPDATE/DELETE on users)
+    drop the affected entries here and are published on INVALIDATE_CHANNEL, so every other process
+    drops them too. Writes outside the ORM (raw SQL, other services) and messages missed while
+    Redis was unreachable are only bounded by the TTL.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._claims = TTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self._principals = TTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self._listener: asyncio.Task | None = None
+        self._publishing: set[asyncio.Task] = set()
+
+    def _ttl_for(self, claims: dict[str, Any]) -> float:
+        exp = claims.get("exp")
+        if exp is None:
+            return self.ttl_seconds
+        return min(self.ttl_seconds, float(exp) - time.time())
+
+    def get_claims(self, token: str) -> dict[str, Any] | None:
+        return self._claims.get(sha256_hex(token))
+
+    def remember_claims(self, token: str, claims: dict[str, Any]) -> None:
+        ttl = self._ttl_for(claims)
+        if ttl > 0:
+            self._claims.set(sha256_hex(token), claims, ttl_seconds=ttl)
+
+    def get(self, user_id: uuid.UUID, token_id: Any) -> CachedPrincipal | None:
+        return self._principals.get((user_id, token_id))
+
+    def remember(self, user: User, token_id: Any, claims: dict[str, Any]) -> CachedPrincipal:
+        principal = CachedPrincipal.from_user(user)
+        ttl = self._ttl_for(claims)
+        if ttl > 0:
+            self._principals.set((user.id, token_id), principal, ttl_seconds=ttl)
+        return principal
+
+    def invalidate_user(self, user_id: uuid.UUID) -> None:
+        self._principals.discard_where(lambda key, _value: isinstance(key, tuple) and key[0] == user_id)
+
+    def invalidate(self, user_ids: Iterable[uuid.UUID | str]) -> None:
+        """Drops the given users' snapshots; ALL_USERS among them drops every snapshot."""
+        for user_id in user_ids:
+            if user_id == ALL_USERS:
+                self._principals.clear()
+                return
+            self.invalidate_user(user_id if isinstance(user_id, uuid.UUID) else uuid.UUID(str(user_id)))
+
+    def clear(self) -> None:
+        self._claims.clear()
+        self._principals.clear()
+
+    def publish(self, user_ids: set[uuid.UUID | str]) -> None:
+        """Tells the other processes to drop these users' snapshots. Never waits; without Redis or a loop it's a no-op."""
+        r = get_redis_client()
+        if r is None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        payload = json.dumps(sorted(str(u) for u in user_ids))
+
+        async def send() -> None:
+            try:
+                await r.publish(INVALIDATE_CHANNEL, payload)
+            except Exception:
+                return
+
+        task = loop.create_task(send())
+        self._publishing.add(task)
+        task.add_done_callback(self._publishing.discard)
+
+    async def start(self) -> None:
+        if self._listener is None and get_redis_client() is not None:
+            self._listener = asyncio.get_running_loop().create_task(self._listen())
+
+    async def stop(self) -> None:
+        task, self._listener = self._listener, None
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except BaseException:
+                pass
+
+    async def _listen(self) -> None:
+        """Applies invalidations from other processes; reconnects after Redis errors."""
+        while True:
+            r = get_redis_client()
+            if r is None:
+                return
+            pubsub = r.pubsub()
+            try:
+                await pubsub.subscribe(INVALIDATE_CHANNEL)
+                # Anything published while unsubscribed is lost: start clean.
+                self._principals.clear()
+                while True:
+                    msg = await pubsub.get_message(ignore_subscribe_messages=True, timeout=5.0)
+                    if msg and msg.get("data"):
+                        try:
+                            self.invalidate(json.loads(msg["data"]))
+                        except Exception:
+                            pass
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                await asyncio.sleep(1.0)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+
+principal_cache = PrincipalCache(
+    max_entries=settings.PRINCIPAL_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+)
+
+
+_PENDING = "principal_cache.invalidate"
+_USERS_TABLE = User.__tablename__
+
+
+def _pending(session: OrmSession) -> set:
+    return session.info.setdefault(_PENDING, set())
+
+
+def _invalidate_on_change(target: User, value, oldvalue, _initiator):
+    if target.id is not None and value != oldvalue:
+        principal_cache.invalidate_user(target.id)
+        session = object_session(target)
+        if session is not None:
+            _pending(session).add(target.id)
+    return value
+
+
+# Role, tier, lockout and verification/MFA state all feed authorization decisions.
+for _attr in (User.role, User.subscription_tier, User.locked_until, User.email_verified, User.mfa_enabled):
+    event.listen(_attr, "set", _invalidate_on_change, retval=True)
+
+
+@event.listens_for(OrmSession, "do_orm_execute")
+def _invalidate_on_bulk_write(state):
+    """update(User)/delete(User) can touch any row: every snapshot goes once the transaction commits."""
+    if (state.is_update or state.is_delete) and getattr(state.statement.table, "name", None) == _USERS_TABLE:
+        _pending(state.session).add(ALL_USERS)
+
+
+@event.listens_for(OrmSession, "after_commit")
+def _publish_after_commit(session):
+    user_ids = session.info.pop(_PENDING, None)
+    if user_ids:
+        # Again after commit: a request in between may have cached the old row.
+        principal_cache.invalidate(user_ids)
+        principal_cache.publish(user_ids)
+
+
+@event.listens_for(OrmSession, "after_rollback")
+def _forget_after_rollback(session):
+    session.info.pop(_PENDING, None)
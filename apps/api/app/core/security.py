@@ -1,12 +1,30 @@
+import asyncio
+import secrets
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
-from typing import Any
+from time import perf_counter
+from typing import Any, Callable, TypeVar
 
 from jose import jwt
 from passlib.context import CryptContext
 
 from app.core.config import settings
+from app.core.exceptions import http_error
+from app.monitoring.metrics import metrics
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Hashes below the configured cost are flagged by needs_update() and rehashed on next login.
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.PASSWORD_BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.PASSWORD_BCRYPT_ROUNDS,
+)
+
+T = TypeVar("T")
+
+# bcrypt releases the GIL, so a small dedicated pool hashes in parallel without touching the event loop.
+_hash_pool = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="pwhash")
+_pending = 0
 
 
 def hash_password(password: str) -> str:
@@ -17,9 +35,51 @@ def verify_password(password: str, password_hash: str) -> bool:
     return pwd_context.verify(password, password_hash)
 
 
+async def _run_hashing(fn: Callable[..., T], *args: Any) -> T:
+    """
+    Runs a hashing call on the password pool.
+    - fails fast with 503 once PASSWORD_HASH_MAX_QUEUE calls are already waiting
+    - records pool wait and hash time in the metrics store
+    """
+    global _pending
+    if _pending >= settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_MAX_QUEUE:
+        # Rejections show up as errors on the queue-wait series.
+        metrics.observe("auth.password_queue_wait", 0.0, is_error=True)
+        raise http_error(503, "Too many authentication requests. Try again shortly.")
+
+    def _timed() -> tuple[T, float, float]:
+        started = perf_counter()
+        result = fn(*args)
+        return result, started, perf_counter()
+
+    _pending += 1
+    enqueued = perf_counter()
+    try:
+        result, started, finished = await asyncio.get_running_loop().run_in_executor(_hash_pool, _timed)
+    finally:
+        _pending -= 1
+    metrics.observe("auth.password_queue_wait", (started - enqueued) * 1000.0, is_error=False)
+    metrics.observe("auth.password_hash", (finished - started) * 1000.0, is_error=False)
+    return result
+
+
+async def hash_password_async(password: str) -> str:
+    return await _run_hashing(pwd_context.hash, password)
+
+
+async def verify_and_update_password_async(password: str, password_hash: str) -> tuple[bool, str | None]:
+    """
+    Verifies off the event loop.
+    Returns: (valid, replacement_hash) where replacement_hash is set when the stored hash
+    uses outdated cost parameters and should be saved in its place.
+    """
+    return await _run_hashing(pwd_context.verify_and_update, password, password_hash)
+
+
 def create_access_token(subject: str, extra_claims: dict[str, Any] | None = None) -> str:
-    expire = datetime.now(timezone.utc) + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode: dict[str, Any] = {"sub": subject, "exp": expire}
+    now = datetime.now(timezone.utc)
+    expire = now + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    to_encode: dict[str, Any] = {"sub": subject, "exp": expire, "iat": now, "jti": secrets.token_hex(8)}
     if extra_claims:
         to_encode.update(extra_claims)
     return jwt.encode(to_encode, settings.JWT_SECRET_KEY, algorithm=settings.JWT_ALGORITHM)
@@ -27,4 +87,3 @@ def create_access_token(subject: str, extra_claims: dict[str, Any] | None = None
 
 def decode_token(token: str) -> dict[str, Any]:
     return jwt.decode(token, settings.JWT_SECRET_KEY, algorithms=[settings.JWT_ALGORITHM])
-
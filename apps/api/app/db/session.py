@@ -1,12 +1,182 @@
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from collections import deque
+from collections.abc import AsyncGenerator
+from time import perf_counter, time
 
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
+
+from app.cache.memory import TTLCache
+from app.cache.redis import get_redis_client
 from app.core.config import settings
+from app.monitoring.metrics import metrics
+
+# (epoch seconds, duration ms, statement) for the most recent slow queries
+slow_queries: deque[tuple[float, float, str]] = deque(maxlen=50)
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that records how long each checkout waited for a connection (timeouts count as errors)."""
+
+    def _do_get(self):
+        start = perf_counter()
+        try:
+            conn = super()._do_get()
+        except Exception:
+            metrics.observe("db.pool.checkout_wait", (perf_counter() - start) * 1000.0, is_error=True)
+            raise
+        metrics.observe("db.pool.checkout_wait", (perf_counter() - start) * 1000.0, is_error=False)
+        return conn
+
+
+def engine_options(url: str, profile: str) -> dict:
+    """
+    Pool settings per process profile:
+    - "api": a long-lived queue pool shared by concurrent requests
+    - "worker": Celery tasks each run in a fresh event loop, and asyncpg connections can't move between
+      loops, so the default (pool size 0) opens a connection per session instead of pooling
+    """
+    if profile == "worker":
+        size, overflow = settings.DB_WORKER_POOL_SIZE, settings.DB_WORKER_MAX_OVERFLOW
+    else:
+        size, overflow = settings.DB_POOL_SIZE, settings.DB_MAX_OVERFLOW
+
+    opts: dict = {"pool_pre_ping": True}
+    if size <= 0:
+        opts["poolclass"] = NullPool
+    else:
+        opts.update(
+            poolclass=InstrumentedQueuePool,
+            pool_size=size,
+            max_overflow=overflow,
+            pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+            pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+            pool_use_lifo=True,
+        )
+    if "+asyncpg" in url:
+        # Both caches must be 0 behind PgBouncer in transaction mode.
+        opts["connect_args"] = {
+            "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+            "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+        }
+    return opts
+
+
+def pool_stats(engine: AsyncEngine) -> dict:
+    pool = engine.sync_engine.pool
+    if not isinstance(pool, QueuePool):
+        return {"pool": type(pool).__name__}
+    return {
+        "pool": type(pool).__name__,
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        # overflow() starts at -size until the core connections exist
+        "overflow": max(0, pool.overflow()),
+        "max_overflow": pool._max_overflow,
+    }
+
+
+def instrument_engine(engine: AsyncEngine, name: str) -> None:
+    """Reports pool occupancy as a gauge and queries slower than DB_SLOW_QUERY_MS to the metrics store."""
+    metrics.register_gauge(f"db.pool.{name}", lambda: pool_stats(engine))
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _before(conn, _cursor, _statement, _params, _context, _executemany):
+        conn.info.setdefault("query_start", []).append(perf_counter())
+
+    @event.listens_for(engine.sync_engine, "after_cursor_execute")
+    def _after(conn, _cursor, statement, _params, _context, _executemany):
+        starts = conn.info.get("query_start")
+        if not starts:
+            return
+        elapsed = (perf_counter() - starts.pop()) * 1000.0
+        if elapsed >= settings.DB_SLOW_QUERY_MS:
+            metrics.observe(f"db.slow_query.{name}", elapsed, is_error=False)
+            slow_queries.append((time(), round(elapsed, 1), statement[:500]))
+
 
-engine = create_async_engine(settings.DATABASE_URL, pool_pre_ping=True)
-SessionLocal = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+class PrimarySession(Session):
+    """Sync session class behind SessionLocal, so commit hooks only see primary-database sessions."""
 
 
-async def get_db() -> AsyncSession:
+@event.listens_for(PrimarySession, "after_commit")
+def _remember_commit(session):
+    session.info["committed"] = True
+
+
+engine = create_async_engine(settings.DATABASE_URL, **engine_options(settings.DATABASE_URL, settings.DB_POOL_PROFILE))
+instrument_engine(engine, "primary")
+SessionLocal = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession, sync_session_class=PrimarySession)
+
+# Read-only traffic goes to the replica when one is configured, else shares the primary.
+if settings.DATABASE_READ_URL:
+    read_engine = create_async_engine(
+        settings.DATABASE_READ_URL, **engine_options(settings.DATABASE_READ_URL, settings.DB_POOL_PROFILE)
+    )
+    instrument_engine(read_engine, "replica")
+    ReadSessionLocal = async_sessionmaker(read_engine, expire_on_commit=False, class_=AsyncSession)
+else:
+    read_engine = engine
+    ReadSessionLocal = SessionLocal
+
+# user id -> True while the user's reads must stay on the primary
+_recent_writers = TTLCache(max_entries=10000, ttl_seconds=settings.READ_YOUR_WRITES_SECONDS)
+
+
+def _principal_id(request: Request):
+    user = getattr(request.state, "user", None)
+    if user is not None:
+        return user.id
+    return getattr(request.state, "principal_id", None)
+
+
+async def mark_recent_write(user_id) -> None:
+    if user_id is None or ReadSessionLocal is SessionLocal:
+        return
+    _recent_writers.set(user_id, True)
+    r = get_redis_client()
+    if r:
+        try:
+            await r.set(f"ryw:{user_id}", 1, ex=settings.READ_YOUR_WRITES_SECONDS)
+        except Exception:
+            pass
+
+
+async def wrote_recently(user_id) -> bool:
+    """True if the user committed a write in the last READ_YOUR_WRITES_SECONDS (any API process)."""
+    if user_id is None:
+        return False
+    if _recent_writers.get(user_id):
+        return True
+    r = get_redis_client()
+    if r:
+        try:
+            return bool(await r.exists(f"ryw:{user_id}"))
+        except Exception:
+            return False
+    return False
+
+
+async def get_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
     async with SessionLocal() as session:
-        yield session
+        try:
+            yield session
+        finally:
+            if session.info.get("committed"):
+                await mark_recent_write(_principal_id(request))
+
 
+async def get_read_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Session for read-only endpoints, bound to the replica unless the caller wrote within
+    READ_YOUR_WRITES_SECONDS (then the primary, so they see their own changes).
+    Declare it after the principal dependency so the caller is already known.
+    """
+    factory = ReadSessionLocal
+    if factory is not SessionLocal and await wrote_recently(_principal_id(request)):
+        factory = SessionLocal
+    async with factory() as session:
+        yield session
@@ -7,13 +7,16 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from app.api.v1.router import api_router as api_v1
 from app.api.v2.router import api_router as api_v2
+from app.cache.principals import principal_cache
 from app.core.config import settings
 from app.core.exceptions import AppError
 from app.middleware.api_key_auth import APIKeyAuthMiddleware
+from app.middleware.ip_filter import IPFilterMiddleware, UserIPFilterMiddleware, ip_filter
 from app.middleware.rate_limit import RateLimitMiddleware
 from app.middleware.security_headers import SecurityHeadersMiddleware
 from app.middleware.usage_logging import UsageLoggingMiddleware
-from app.monitoring.metrics import metrics
+from app.monitoring.aggregation import start_metrics_pusher, stop_metrics_pusher
+from app.monitoring.metrics import metrics, route_key
 from app.websockets.manager import manager
 from app.websockets.progress import stream_progress
 
@@ -32,10 +35,20 @@ def create_app() -> FastAPI:
             allow_headers=["*"],
         )
 
+    app.add_event_handler("startup", start_metrics_pusher)
+    app.add_event_handler("shutdown", stop_metrics_pusher)
+    app.add_event_handler("startup", ip_filter.start)
+    app.add_event_handler("shutdown", ip_filter.stop)
+    app.add_event_handler("startup", principal_cache.start)
+    app.add_event_handler("shutdown", principal_cache.stop)
+
     # Middleware
     app.add_middleware(RateLimitMiddleware)
     app.add_middleware(SecurityHeadersMiddleware)
+    # Per-user lists inside API key auth (they need request.state.user), global lists outside it
+    app.add_middleware(UserIPFilterMiddleware)
     app.add_middleware(APIKeyAuthMiddleware)
+    app.add_middleware(IPFilterMiddleware)
     app.add_middleware(UsageLoggingMiddleware)
 
     # Versioned APIs
@@ -73,7 +86,7 @@ def create_app() -> FastAPI:
         start = perf_counter()
         resp = await call_next(request)
         elapsed = (perf_counter() - start) * 1000.0
-        metrics.observe(f"{request.method} {request.url.path}", elapsed, is_error=resp.status_code >= 500)
+        metrics.observe(route_key(request.scope, request.method, resp.status_code), elapsed, is_error=resp.status_code >= 500)
         return resp
 
     return app
@@ -8,6 +8,7 @@ from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.responses import Response
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.cache.memory import TTLCache
 from app.core.config import settings
 from app.core.exceptions import http_error
 from app.db.session import SessionLocal
@@ -81,58 +82,92 @@ class APIKeyAuthMiddleware(BaseHTTPMiddleware):
             return response
 
 
+_TOKEN_BUCKET_LUA = """
+local key = KEYS[1]
+local now = tonumber(ARGV[1])
+local cap = tonumber(ARGV[2])
+local refill = tonumber(ARGV[3])
+local want = tonumber(ARGV[4])
+
+local data = redis.call('HMGET', key, 'tokens', 'ts')
+local tokens = tonumber(data[1])
+local ts = tonumber(data[2])
+if tokens == nil then tokens = cap end
+if ts == nil then ts = now end
+
+local delta = math.max(0, now - ts)
+local new_tokens = math.min(cap, tokens + delta * refill)
+local granted = math.min(want, math.floor(new_tokens))
+new_tokens = new_tokens - granted
+redis.call('HSET', key, 'tokens', new_tokens, 'ts', now)
+redis.call('EXPIRE', key, 120)
+return {granted, math.floor(new_tokens)}
+"""
+
+_script = None
+# key -> [leased tokens left, remaining in shared bucket at lease time]
+_leases = TTLCache(max_entries=settings.RATE_LIMIT_MEMORY_MAX_KEYS, ttl_seconds=settings.RATE_LIMIT_LEASE_TTL_SECONDS)
+# key -> (tokens, ts); idle buckets are full again after 60s, so expiring them is lossless
+_mem = TTLCache(max_entries=settings.RATE_LIMIT_MEMORY_MAX_KEYS, ttl_seconds=120)
+
+
+def _token_bucket_script(r):
+    """Registers the Lua script once per client; calls go through EVALSHA (reloaded on NOSCRIPT)."""
+    global _script
+    if _script is None or _script.registered_client is not r:
+        _script = r.register_script(_TOKEN_BUCKET_LUA)
+    return _script
+
+
+def lease_size(rpm: int) -> int:
+    """
+    Tokens to take from the shared bucket per Redis call.
+    Scales with the key's rate (one lease per ~100ms of full-rate traffic) so low-rate keys stay exact.
+    """
+    return max(1, min(settings.RATE_LIMIT_LEASE_SIZE, rpm // 600))
+
+
 async def token_bucket_allow(key: str, rpm: int) -> tuple[bool, int, int]:
     """
-    Token bucket using Redis if available; fallback to in-memory fixed-window-ish bucket.
+    Token bucket using Redis if available; fallback to in-memory per-process bucket.
+    High-rate keys lease small blocks of tokens from Redis and spend them locally; leased tokens are
+    already debited from the shared bucket, so the global limit is never exceeded.
     Returns: (allowed, remaining_tokens, reset_epoch_seconds)
     """
-    r = get_redis_client()
     now = time.time()
     capacity = max(1, rpm)
     refill_per_sec = rpm / 60.0
     reset = int(now + 60)
 
+    lease = _leases.get(key)
+    if lease is not None and lease[0] > 0:
+        lease[0] -= 1
+        return True, lease[0] + lease[1], reset
+
+    r = get_redis_client()
     if r:
-        # Lua script for atomic refill + decrement
-        lua = """
-        local key = KEYS[1]
-        local now = tonumber(ARGV[1])
-        local cap = tonumber(ARGV[2])
-        local refill = tonumber(ARGV[3])
-
-        local data = redis.call('HMGET', key, 'tokens', 'ts')
-        local tokens = tonumber(data[1])
-        local ts = tonumber(data[2])
-        if tokens == nil then tokens = cap end
-        if ts == nil then ts = now end
-
-        local delta = math.max(0, now - ts)
-        local new_tokens = math.min(cap, tokens + delta * refill)
-        local allowed = 0
-        if new_tokens >= 1 then
-          allowed = 1
-          new_tokens = new_tokens - 1
-        end
-        redis.call('HMSET', key, 'tokens', new_tokens, 'ts', now)
-        redis.call('EXPIRE', key, 120)
-        return {allowed, math.floor(new_tokens)}
-        """
+        want = lease_size(rpm)
         try:
-            allowed, remaining = await r.eval(lua, 1, key, now, capacity, refill_per_sec)
-            return bool(allowed == 1), int(remaining), reset
+            granted, remaining = await _token_bucket_script(r)(keys=[key], args=[now, capacity, refill_per_sec, want])
         except Exception:
             pass
+        else:
+            granted, remaining = int(granted), int(remaining)
+            if granted < 1:
+                return False, 0, reset
+            if granted > 1:
+                # Another coroutine may have leased concurrently; keep both blocks.
+                current = _leases.get(key)
+                left = granted - 1 + (current[0] if current else 0)
+                _leases.set(key, [left, remaining])
+            return True, granted - 1 + remaining, reset
 
     # Fallback: naive per-process bucket
-    if not hasattr(token_bucket_allow, "_mem"):
-        token_bucket_allow._mem = {}  # type: ignore[attr-defined]
-    mem = token_bucket_allow._mem  # type: ignore[attr-defined]
-    tokens, ts = mem.get(key, (capacity, now))
+    tokens, ts = _mem.get(key, (capacity, now))
     delta = max(0, now - ts)
     tokens = min(capacity, tokens + delta * refill_per_sec)
     allowed = tokens >= 1
     if allowed:
         tokens -= 1
-    mem[key] = (tokens, now)
+    _mem.set(key, (tokens, now))
     return allowed, int(tokens), reset
-
@@ -0,0 +1,263 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+import uuid
+
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.responses import Response
+
+from app.cache.redis import get_redis_client
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.repositories.ip_lists import IPListsRepository
+from app.utils.cidr import CIDRTrie, IPAddress, parse_address
+
+CHANGES_CHANNEL = "ipfilter:changes"
+
+
+def _user_key(user_id) -> uuid.UUID:
+    return user_id if isinstance(user_id, uuid.UUID) else uuid.UUID(str(user_id))
+
+
+class IPFilter:
+    """
+    Compiled view of ip_allowlist / ip_denylist.
+    - global deny wins; a non-empty global allowlist admits only matching addresses
+    - per-user lists apply the same rules once the caller is known
+    - full reload every IP_FILTER_RELOAD_SECONDS, incremental updates via Redis pub/sub in between;
+      both run as background tasks, so requests only ever read the compiled tries
+    """
+
+    def __init__(self):
+        self._global = {"allow": CIDRTrie(), "deny": CIDRTrie()}
+        self._users: dict[str, dict[uuid.UUID, CIDRTrie]] = {"allow": {}, "deny": {}}
+        self.loaded_at: float | None = None
+        self._reloading: list[dict] | None = None
+        self._reloader: asyncio.Task | None = None
+        self._listener: asyncio.Task | None = None
+
+    def global_allowed(self, address: IPAddress) -> bool:
+        if self._global["deny"].contains(address):
+            return False
+        allow = self._global["allow"]
+        return not len(allow) or allow.contains(address)
+
+    def user_allowed(self, address: IPAddress, user_id) -> bool:
+        key = _user_key(user_id)
+        deny = self._users["deny"].get(key)
+        if deny is not None and deny.contains(address):
+            return False
+        allow = self._users["allow"].get(key)
+        return allow is None or allow.contains(address)
+
+    def _add(self, list_name: str, user_id, ip: str) -> None:
+        if user_id is None:
+            self._global[list_name].add(ip)
+        else:
+            self._users[list_name].setdefault(_user_key(user_id), CIDRTrie()).add(ip)
+
+    def apply_change(self, change: dict) -> None:
+        """Applies one {"op", "list", "ip", "user_id"} notification in place."""
+        list_name, user_id, ip = change["list"], change.get("user_id"), change["ip"]
+        if self._reloading is not None:
+            # Replayed onto the new tries once the reload swaps them in.
+            self._reloading.append(change)
+        try:
+            if change["op"] == "add":
+                self._add(list_name, user_id, ip)
+                return
+            if user_id is None:
+                self._global[list_name].remove(ip)
+                return
+            key = _user_key(user_id)
+            trie = self._users[list_name].get(key)
+            if trie is not None and trie.remove(ip) and not len(trie):
+                del self._users[list_name][key]
+        except (KeyError, ValueError):
+            return
+
+    async def reload(self) -> None:
+        self._reloading = []
+        try:
+            async with SessionLocal() as db:
+                repo = IPListsRepository(db)
+                rows = {name: await repo.list_all(name) for name in ("allow", "deny")}
+            pending = self._reloading
+        finally:
+            self._reloading = None
+
+        current = self._global, self._users
+        self._global = {"allow": CIDRTrie(), "deny": CIDRTrie()}
+        self._users = {"allow": {}, "deny": {}}
+        try:
+            for name, entries in rows.items():
+                for user_id, ip in entries:
+                    try:
+                        self._add(name, user_id, ip)
+                    except ValueError:
+                        continue
+        except Exception:
+            self._global, self._users = current
+            raise
+        for change in pending:
+            self.apply_change(change)
+        self.loaded_at = time.time()
+
+    async def start(self) -> None:
+        """App startup: one load before serving traffic (a failure is retried in the background), then the loops."""
+        if not settings.IP_FILTER_ENABLED:
+            return
+        try:
+            await self.reload()
+        except Exception:
+            pass
+        self.ensure_running()
+
+    async def stop(self) -> None:
+        for task in (self._reloader, self._listener):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except BaseException:
+                    pass
+        self._reloader = self._listener = None
+
+    def ensure_running(self) -> None:
+        """Starts the reload loop and the change listener on this event loop if they aren't running. Never waits."""
+        loop = asyncio.get_running_loop()
+        if not _running_on(self._reloader, loop):
+            self._reloader = loop.create_task(self._reload_loop())
+        if not _running_on(self._listener, loop) and get_redis_client() is not None:
+            self._listener = loop.create_task(self._listen())
+
+    async def _reload_loop(self) -> None:
+        """Full reloads; failures keep the last good state and retry after IP_FILTER_RETRY_SECONDS."""
+        delay = 0.0 if self.loaded_at is None else settings.IP_FILTER_RELOAD_SECONDS
+        while True:
+            await asyncio.sleep(delay)
+            try:
+                await self.reload()
+                delay = settings.IP_FILTER_RELOAD_SECONDS
+            except Exception:
+                delay = settings.IP_FILTER_RETRY_SECONDS
+
+    async def _listen(self) -> None:
+        r = get_redis_client()
+        if r is None:
+            return
+        pubsub = r.pubsub()
+        await pubsub.subscribe(CHANGES_CHANNEL)
+        try:
+            while True:
+                msg = await pubsub.get_message(ignore_subscribe_messages=True, timeout=5.0)
+                if msg and msg.get("data"):
+                    try:
+                        self.apply_change(json.loads(msg["data"]))
+                    except Exception:
+                        pass
+        finally:
+            try:
+                await pubsub.unsubscribe(CHANGES_CHANNEL)
+                await pubsub.close()
+            except Exception:
+                pass
+
+
+def _running_on(task: asyncio.Task | None, loop: asyncio.AbstractEventLoop) -> bool:
+    return task is not None and not task.done() and task.get_loop() is loop
+
+
+ip_filter = IPFilter()
+
+
+async def publish_ip_list_change(change: dict) -> None:
+    r = get_redis_client()
+    if not r:
+        return
+    try:
+        await r.publish(CHANGES_CHANNEL, json.dumps(change))
+    except Exception:
+        return
+
+
+_trusted: tuple[str, CIDRTrie] = ("", CIDRTrie())
+
+
+def _trusted_proxies() -> CIDRTrie:
+    """IP_FILTER_TRUSTED_PROXIES compiled once per value of the setting."""
+    global _trusted
+    raw = settings.IP_FILTER_TRUSTED_PROXIES
+    if _trusted[0] != raw:
+        trie = CIDRTrie()
+        for network in raw.split(","):
+            if network.strip():
+                trie.add(network)
+        _trusted = (raw, trie)
+    return _trusted[1]
+
+
+def client_address(request: Request) -> IPAddress | None:
+    """
+    The caller's address: the peer, unless the peer is a trusted proxy. Then X-Forwarded-For is read
+    from the right (the hop the proxy appended) and the first address that isn't a trusted proxy is
+    the caller; entries left of it were written by the client and are ignored.
+    """
+    if not request.client:
+        return None
+    try:
+        address = parse_address(request.client.host)
+    except ValueError:
+        return None
+    trusted = _trusted_proxies()
+    if not len(trusted) or not trusted.contains(address):
+        return address
+    hops = [hop.strip() for value in request.headers.getlist("x-forwarded-for") for hop in value.split(",")]
+    for hop in reversed(hops):
+        try:
+            address = parse_address(hop)
+        except ValueError:
+            # Garbage behind our own proxies: judge the request by the last proxy's address.
+            break
+        if not trusted.contains(address):
+            break
+    return address
+
+
+class IPFilterMiddleware(BaseHTTPMiddleware):
+    """
+    Enforces the global allow/deny lists on every request. Runs outside API key auth, so a denied
+    address never costs a key lookup.
+    """
+
+    async def dispatch(self, request: Request, call_next):
+        if not settings.IP_FILTER_ENABLED or request.url.path == "/health":
+            return await call_next(request)
+
+        address = client_address(request)
+        if address is None:
+            return await call_next(request)
+
+        ip_filter.ensure_running()
+        if not ip_filter.global_allowed(address):
+            return Response("Forbidden", status_code=403)
+        return await call_next(request)
+
+
+class UserIPFilterMiddleware(BaseHTTPMiddleware):
+    """
+    Enforces the caller's own lists once API key auth has resolved the user (runs inside it).
+    Bearer-token users are checked in deps.
+    """
+
+    async def dispatch(self, request: Request, call_next):
+        user = getattr(request.state, "user", None)
+        if user is None or not settings.IP_FILTER_ENABLED:
+            return await call_next(request)
+        address = client_address(request)
+        if address is not None and not ip_filter.user_allowed(address, user.id):
+            return Response("Forbidden", status_code=403)
+        return await call_next(request)
@@ -6,6 +6,7 @@ from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.requests import Request
 from starlette.responses import Response
 
+from app.cache.memory import TTLCache
 from app.cache.redis import get_redis_client
 from app.core.config import settings
 
@@ -20,7 +21,8 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
     def __init__(self, app, requests_per_minute: int | None = None):
         super().__init__(app)
         self.rpm = requests_per_minute or settings.DEFAULT_RATE_LIMIT_PER_MINUTE
-        self._mem: dict[str, tuple[int, float]] = {}  # key -> (count, expires_at)
+        # key -> count; keys embed the minute, so entries only need to outlive their window
+        self._mem = TTLCache(max_entries=settings.RATE_LIMIT_MEMORY_MAX_KEYS, ttl_seconds=70)
 
     async def dispatch(self, request: Request, call_next):
         # Skip docs/static
@@ -48,11 +50,7 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
                 # Redis down => fall back to memory
                 pass
 
-        now = time.time()
-        count, exp = self._mem.get(key, (0, now + 70))
-        if now > exp:
-            count, exp = 0, now + 70
-        count += 1
-        self._mem[key] = (count, exp)
+        count = self._mem.get(key, 0) + 1
+        self._mem.set(key, count)
         return count <= self.rpm
 
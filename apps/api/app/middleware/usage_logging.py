@@ -7,6 +7,7 @@ from starlette.requests import Request
 
 from app.db.session import SessionLocal
 from app.models.usage_log import UsageLog
+from app.monitoring.metrics import route_template
 
 
 class UsageLoggingMiddleware(BaseHTTPMiddleware):
@@ -24,6 +25,8 @@ class UsageLoggingMiddleware(BaseHTTPMiddleware):
         api_key = getattr(request.state, "api_key", None)
         if not user:
             return response
+        # Template rather than raw path, so ids don't multiply rollup rows
+        endpoint = f"{request.method} {route_template(request.scope)}"
 
         async def _write():
             async with SessionLocal() as db:
@@ -31,8 +34,9 @@ class UsageLoggingMiddleware(BaseHTTPMiddleware):
                     UsageLog(
                         user_id=user.id,
                         api_key_id=getattr(api_key, "id", None),
-                        endpoint=f"{request.method} {path}",
+                        endpoint=endpoint,
                         response_time=float(elapsed_ms),
+                        status_code=response.status_code,
                     )
                 )
                 await db.commit()
@@ -6,5 +6,6 @@ from .screenshot import Screenshot  # noqa: F401
 from .session import Session  # noqa: F401
 from .subscription import Subscription  # noqa: F401
 from .usage_log import UsageLog  # noqa: F401
+from .usage_rollup import UsageRollup  # noqa: F401
 from .user import User  # noqa: F401
 
@@ -1,7 +1,7 @@
 import uuid
 from datetime import datetime
 
-from sqlalchemy import DateTime, ForeignKey, JSON, String, func
+from sqlalchemy import BigInteger, DateTime, ForeignKey, Index, Integer, JSON, String, func
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column
 
@@ -10,9 +10,15 @@ from app.db.base import Base
 
 class Screenshot(Base):
     __tablename__ = "screenshots"
+    __table_args__ = (
+        # Serves the per-user listing (newest first) and per-user lookups.
+        Index("ix_screenshots_user_id_created_at", "user_id", "created_at"),
+        # One per dHash band: similar-screenshot search probes each band (multi-index hashing).
+        *(Index(f"ix_screenshots_user_id_dhash_b{i}", "user_id", f"dhash_b{i}") for i in range(4)),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    user_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("users.id"), index=True, nullable=False)
+    user_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
 
     app_id: Mapped[str] = mapped_column(String(255), index=True, nullable=False)
     platform: Mapped[str] = mapped_column(String(32), nullable=False)  # appstore|playstore
@@ -22,5 +28,16 @@ class Screenshot(Base):
     meta: Mapped[dict] = mapped_column("metadata", JSON, default=dict, nullable=False)
     status: Mapped[str] = mapped_column(String(32), default="QUEUED", nullable=False)
 
+    # 64-bit dHash (stored signed) and its 16-bit bands, see app.processing.phash. NULL until processed.
+    dhash: Mapped[int | None] = mapped_column(BigInteger, nullable=True)
+    dhash_b0: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    dhash_b1: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    dhash_b2: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    dhash_b3: Mapped[int | None] = mapped_column(Integer, nullable=True)
+
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    # Bumped on every change (ORM and bulk updates); how long a QUEUED/PROCESSING row has been stuck.
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False
+    )
 
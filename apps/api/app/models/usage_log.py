@@ -1,7 +1,7 @@
 import uuid
 from datetime import datetime
 
-from sqlalchemy import DateTime, ForeignKey, Float, String, func
+from sqlalchemy import DateTime, ForeignKey, Float, Index, Integer, String, func
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import Mapped, mapped_column
 
@@ -9,13 +9,22 @@ from app.db.base import Base
 
 
 class UsageLog(Base):
+    """
+    Raw per-request log, range-partitioned by day on timestamp (see app/repositories/usage.py).
+    The partition key must be part of the primary key.
+    """
+
     __tablename__ = "usage_logs"
+    __table_args__ = (
+        Index("ix_usage_logs_user_id_timestamp", "user_id", "timestamp"),
+        {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    user_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("users.id"), index=True, nullable=False)
+    user_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
     api_key_id: Mapped[uuid.UUID | None] = mapped_column(UUID(as_uuid=True), ForeignKey("api_keys.id"), index=True, nullable=True)
 
     endpoint: Mapped[str] = mapped_column(String(255), nullable=False)
-    timestamp: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    timestamp: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True, server_default=func.now(), nullable=False)
     response_time: Mapped[float] = mapped_column(Float, nullable=False)
-
+    status_code: Mapped[int | None] = mapped_column(Integer, nullable=True)
@@ -0,0 +1,28 @@
+import uuid
+from datetime import datetime
+
+from sqlalchemy import DateTime, Float, ForeignKey, Index, Integer, String
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.base import Base
+
+
+class UsageRollup(Base):
+    """Per-user, per-endpoint aggregates of usage_logs; granularity is "hour" or "day"."""
+
+    __tablename__ = "usage_rollups"
+    __table_args__ = (Index("ix_usage_rollups_user_granularity_bucket", "user_id", "granularity", "bucket_start"),)
+
+    granularity: Mapped[str] = mapped_column(String(8), primary_key=True)
+    bucket_start: Mapped[datetime] = mapped_column(DateTime(timezone=True), primary_key=True)
+    user_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), ForeignKey("users.id"), primary_key=True)
+    endpoint: Mapped[str] = mapped_column(String(255), primary_key=True)
+
+    request_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    error_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    total_ms: Mapped[float] = mapped_column(Float, nullable=False)
+    p50_ms: Mapped[float] = mapped_column(Float, nullable=False)
+    p95_ms: Mapped[float] = mapped_column(Float, nullable=False)
+    p99_ms: Mapped[float] = mapped_column(Float, nullable=False)
+    max_ms: Mapped[float] = mapped_column(Float, nullable=False)
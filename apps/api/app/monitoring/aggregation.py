@@ -0,0 +1,308 @@
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from array import array
+from typing import TYPE_CHECKING
+
+from app.core.config import settings
+from app.monitoring.histogram import LogLinearHistogram, bucket_bounds
+from app.monitoring.metrics import MetricsStore, metrics
+
+if TYPE_CHECKING:
+    import redis
+    from redis.commands.core import Script
+
+REDIS_PREFIX = "metrics:cluster"
+
+# Adds one push worth of deltas into the current window (ARGV[2]): bucket/count/sum/error
+# increments, min/max folded in. Window keys expire ARGV[3] seconds after their last push.
+_APPLY_DELTA_LUA = """
+local d = cjson.decode(ARGV[1])
+local w = KEYS[1] .. ':w:' .. ARGV[2]
+local ttl = tonumber(ARGV[3])
+for key, s in pairs(d.series) do
+  local h = w .. ':h:' .. key
+  redis.call('SADD', w .. ':series', key)
+  for idx, n in pairs(s.b) do
+    redis.call('HINCRBY', h, 'b' .. idx, n)
+  end
+  redis.call('HINCRBY', h, 'count', s.count)
+  redis.call('HINCRBY', h, 'sum_us', s.sum_us)
+  redis.call('HINCRBY', h, 'errors', s.errors)
+  local max_us = tonumber(redis.call('HGET', h, 'max_us') or '-1')
+  if s.max_us > max_us then redis.call('HSET', h, 'max_us', s.max_us) end
+  if s.min_us ~= cjson.null then
+    local min_us = tonumber(redis.call('HGET', h, 'min_us') or '-1')
+    if min_us < 0 or s.min_us < min_us then redis.call('HSET', h, 'min_us', s.min_us) end
+  end
+  redis.call('EXPIRE', h, ttl)
+end
+if next(d.series) ~= nil then redis.call('EXPIRE', w .. ':series', ttl) end
+for name, n in pairs(d.counters) do
+  redis.call('HINCRBY', KEYS[1] .. ':counters', name, n)
+end
+return 1
+"""
+
+
+class MetricsPusher:
+    """
+    Background thread that shares this process's metrics every METRICS_PUSH_SECONDS:
+    - "redis": pushes only what changed since the last push (sparse bucket deltas), summed
+      server-side into METRICS_WINDOW_SECONDS windows that expire, so the cluster view covers
+      recent traffic across restarts and hosts; counters are lifetime totals
+    - "shm": writes this process's full histograms to one small file per process under
+      METRICS_SHM_DIR (tmpfs), for single-host deployments without Redis; stale files of exited
+      processes are deleted, and a process removes its own file when it stops
+    """
+
+    def __init__(self, store: MetricsStore, mode: str):
+        self.store = store
+        self.mode = mode
+        self._last: dict[str, tuple[array, int, int, int]] = {}
+        self._last_counters: dict[str, int] = {}
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._redis: redis.Redis | None = None
+        self._script: Script | None = None
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, name="metrics-pusher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        if self.mode == "shm":
+            try:
+                os.remove(_shm_path(os.getpid()))
+            except OSError:
+                pass
+            return
+        self.push()
+
+    def _loop(self) -> None:
+        while not self._stop.wait(settings.METRICS_PUSH_SECONDS):
+            self.push()
+
+    def push(self) -> None:
+        try:
+            if self.mode == "redis":
+                self._push_redis()
+            elif self.mode == "shm":
+                self._push_shm()
+        except Exception:
+            # Metrics must never take the process down; the next push retries with a larger delta.
+            return
+
+    def delta(self) -> dict:
+        """Sparse changes since the previous delta() call; see _APPLY_DELTA_LUA for the shape."""
+        series = {}
+        for key, (h, errors) in self.store.histograms().items():
+            counts = array("Q", h.counts)
+            count, sum_us = h.count, h.sum_us
+            prev = self._last.get(key)
+            if prev is not None and prev[1] == count and prev[3] == errors:
+                continue
+            if prev is None:
+                buckets = {i: n for i, n in enumerate(counts) if n}
+                d_count, d_sum, d_errors = count, sum_us, errors
+            else:
+                buckets = {i: n - p for i, (n, p) in enumerate(zip(counts, prev[0])) if n != p}
+                d_count, d_sum, d_errors = count - prev[1], sum_us - prev[2], errors - prev[3]
+            self._last[key] = (counts, count, sum_us, errors)
+            # min/max of this delta's samples only (the process-lifetime extremes would leak into
+            # every window): the outer changed buckets' bounds, tightened by the observed extremes.
+            min_us = max_us = None
+            if buckets:
+                min_us = max(bucket_bounds(min(buckets))[0], h.min_us or 0)
+                max_us = min(bucket_bounds(max(buckets))[1], h.max_us)
+            series[key] = {
+                "b": {str(i): n for i, n in buckets.items()},
+                "count": d_count,
+                "sum_us": d_sum,
+                "errors": d_errors,
+                "min_us": min_us,
+                "max_us": max_us if max_us is not None else 0,
+            }
+        counters = {}
+        for name, value in self.store.counters().items():
+            if value != self._last_counters.get(name, 0):
+                counters[name] = value - self._last_counters.get(name, 0)
+                self._last_counters[name] = value
+        return {"series": series, "counters": counters}
+
+    def _push_redis(self) -> None:
+        if self._redis is None or self._script is None:
+            if not settings.REDIS_URL:
+                raise RuntimeError("METRICS_AGGREGATION=redis needs REDIS_URL")
+            import redis
+
+            self._redis = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+            self._script = self._redis.register_script(_APPLY_DELTA_LUA)
+        baseline = dict(self._last), dict(self._last_counters)
+        d = self.delta()
+        if not (d["series"] or d["counters"]):
+            return
+        window = current_window()
+        ttl = settings.METRICS_WINDOW_SECONDS * (settings.METRICS_WINDOWS + 1)
+        try:
+            self._script(keys=[REDIS_PREFIX], args=[json.dumps(d), window, ttl])
+        except Exception:
+            # Not applied: restore the baseline so the next delta includes these changes again.
+            self._last, self._last_counters = baseline
+            raise
+
+    def _push_shm(self) -> None:
+        os.makedirs(settings.METRICS_SHM_DIR, exist_ok=True)
+        remove_stale_shm_files()
+        state = {
+            "pid": os.getpid(),
+            "ts": time.time(),
+            "series": {key: {**h.to_dict(), "errors": errors} for key, (h, errors) in self.store.histograms().items()},
+            "counters": self.store.counters(),
+        }
+        path = _shm_path(os.getpid())
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp, path)
+
+
+def current_window(now: float | None = None) -> int:
+    return int((time.time() if now is None else now) // settings.METRICS_WINDOW_SECONDS)
+
+
+def _shm_path(pid: int) -> str:
+    return os.path.join(settings.METRICS_SHM_DIR, f"{pid}.json")
+
+
+def remove_stale_shm_files() -> int:
+    """
+    Deletes process files not refreshed within METRICS_SHM_STALE_SECONDS: a live pusher rewrites
+    its file every METRICS_PUSH_SECONDS, so these belong to processes that exited without stop().
+    """
+    cutoff = time.time() - settings.METRICS_SHM_STALE_SECONDS
+    removed = 0
+    try:
+        names = os.listdir(settings.METRICS_SHM_DIR)
+    except FileNotFoundError:
+        return 0
+    for name in names:
+        if not (name.endswith(".json") or name.endswith(".json.tmp")):
+            continue
+        path = os.path.join(settings.METRICS_SHM_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            continue
+    return removed
+
+
+_pusher: MetricsPusher | None = None
+
+
+def start_metrics_pusher() -> None:
+    """Starts the pusher for METRICS_AGGREGATION ("off" | "shm" | "redis"); call once per process."""
+    global _pusher
+    mode = settings.METRICS_AGGREGATION
+    if mode not in ("shm", "redis") or (mode == "redis" and not settings.REDIS_URL):
+        return
+    if _pusher is None:
+        _pusher = MetricsPusher(metrics, mode)
+    _pusher.start()
+
+
+def stop_metrics_pusher() -> None:
+    if _pusher is not None:
+        _pusher.stop()
+
+
+def _merge_state(out: dict, counters: dict, series: dict, new_counters: dict) -> None:
+    for key, data in series.items():
+        h = LogLinearHistogram.from_dict(data)
+        if key in out:
+            out[key][0].merge(h)
+            out[key] = (out[key][0], out[key][1] + int(data.get("errors", 0)))
+        else:
+            out[key] = (h, int(data.get("errors", 0)))
+    for name, n in new_counters.items():
+        counters[name] = counters.get(name, 0) + int(n)
+
+
+def read_shm_view() -> tuple[dict, dict]:
+    """Merges every live process file (written within METRICS_SHM_STALE_SECONDS)."""
+    histograms: dict = {}
+    counters: dict = {}
+    try:
+        names = os.listdir(settings.METRICS_SHM_DIR)
+    except FileNotFoundError:
+        return histograms, counters
+    cutoff = time.time() - settings.METRICS_SHM_STALE_SECONDS
+    for name in names:
+        if not name.endswith(".json"):
+            continue
+        path = os.path.join(settings.METRICS_SHM_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                continue
+            with open(path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            continue
+        _merge_state(histograms, counters, state.get("series", {}), state.get("counters", {}))
+    return histograms, counters
+
+
+async def read_redis_view(r, now: float | None = None) -> tuple[dict, dict]:
+    """Histograms of the newest METRICS_WINDOWS windows (the current one still filling), lifetime counters."""
+    last = current_window(now)
+    windows = [f"{REDIS_PREFIX}:w:{w}" for w in range(last - settings.METRICS_WINDOWS + 1, last + 1)]
+    pipe = r.pipeline()
+    for w in windows:
+        pipe.smembers(f"{w}:series")
+    members = await pipe.execute()
+    pipe = r.pipeline()
+    wanted = [(w, key) for w, keys in zip(windows, members) for key in sorted(keys)]
+    for w, key in wanted:
+        pipe.hgetall(f"{w}:h:{key}")
+    rows = await pipe.execute() if wanted else []
+    histograms: dict = {}
+    counters: dict = {}
+    for (_w, key), row in zip(wanted, rows):
+        if not row:
+            continue
+        data = {
+            "counts": {f[1:]: int(v) for f, v in row.items() if f.startswith("b")},
+            "count": int(row.get("count", 0)),
+            "sum_us": int(row.get("sum_us", 0)),
+            "min_us": int(row["min_us"]) if "min_us" in row else None,
+            "max_us": int(row.get("max_us", 0)),
+            "errors": int(row.get("errors", 0)),
+        }
+        _merge_state(histograms, counters, {key: data}, {})
+    _merge_state(histograms, counters, {}, await r.hgetall(f"{REDIS_PREFIX}:counters"))
+    return histograms, counters
+
+
+async def cluster_view() -> tuple[dict, dict] | None:
+    """(histograms, counters) merged across processes, or None when aggregation is off."""
+    mode = settings.METRICS_AGGREGATION
+    if mode == "shm":
+        return read_shm_view()
+    if mode == "redis":
+        from app.cache.redis import get_redis_client
+
+        r = get_redis_client()
+        if r is None:
+            return None
+        return await read_redis_view(r)
+    return None
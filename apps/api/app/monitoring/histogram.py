@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import math
+from array import array
+
+# 2**SUB_BITS linear sub-buckets per power of two: worst-case relative error 1/32 (~3%).
+SUB_BITS = 5
+SUB_COUNT = 1 << SUB_BITS
+# Values are recorded in whole microseconds; anything at or above 2**32 us (~71 min) lands in the last bucket.
+MAX_BITS = 32
+BUCKET_COUNT = 2 * SUB_COUNT + (MAX_BITS - SUB_BITS - 1) * SUB_COUNT
+
+
+def bucket_index(value_us: int) -> int:
+    if value_us < 2 * SUB_COUNT:
+        return max(0, value_us)
+    shift = value_us.bit_length() - SUB_BITS - 1
+    idx = 2 * SUB_COUNT + (shift - 1) * SUB_COUNT + ((value_us >> shift) - SUB_COUNT)
+    return min(idx, BUCKET_COUNT - 1)
+
+
+def bucket_bounds(idx: int) -> tuple[int, int]:
+    """Inclusive [low, high] microsecond range covered by a bucket."""
+    if idx < 2 * SUB_COUNT:
+        return idx, idx
+    shift = (idx - 2 * SUB_COUNT) // SUB_COUNT + 1
+    mantissa = (idx - 2 * SUB_COUNT) % SUB_COUNT + SUB_COUNT
+    return mantissa << shift, ((mantissa + 1) << shift) - 1
+
+
+class LogLinearHistogram:
+    """
+    HDR-style latency histogram with a fixed bucket layout (values in milliseconds, stored as microseconds).
+    - constant memory: one 8-byte counter per bucket, whatever the sample count
+    - percentiles walk the buckets once: O(BUCKET_COUNT), no sorting
+    - the layout is identical everywhere, so histograms from different processes merge by adding counts
+    """
+
+    __slots__ = ("counts", "count", "sum_us", "min_us", "max_us")
+
+    def __init__(self):
+        self.counts = array("Q", bytes(8 * BUCKET_COUNT))
+        self.count = 0
+        self.sum_us = 0
+        self.min_us: int | None = None
+        self.max_us = 0
+
+    def record(self, value_ms: float) -> None:
+        v = max(0, int(value_ms * 1000.0))
+        self.counts[bucket_index(v)] += 1
+        self.count += 1
+        self.sum_us += v
+        if self.min_us is None or v < self.min_us:
+            self.min_us = v
+        if v > self.max_us:
+            self.max_us = v
+
+    def merge(self, other: LogLinearHistogram) -> None:
+        counts = self.counts
+        for i, n in enumerate(other.counts):
+            if n:
+                counts[i] += n
+        self.count += other.count
+        self.sum_us += other.sum_us
+        if other.min_us is not None and (self.min_us is None or other.min_us < self.min_us):
+            self.min_us = other.min_us
+        self.max_us = max(self.max_us, other.max_us)
+
+    def percentile(self, p: float) -> float | None:
+        """Upper bound of the bucket holding the p-quantile, in ms (never above the observed max)."""
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(p * self.count))
+        seen = 0
+        for i, n in enumerate(self.counts):
+            if not n:
+                continue
+            seen += n
+            if seen >= rank:
+                return min(bucket_bounds(i)[1], self.max_us) / 1000.0
+        return self.max_us / 1000.0
+
+    def cumulative_counts(self, bounds_ms) -> list[int]:
+        """
+        Samples in buckets whose upper bound is <= each bound (ascending), in one pass over the buckets.
+        Used for coarser exposition buckets.
+        """
+        limits = [int(b * 1000.0) for b in bounds_ms]
+        out = [0] * len(limits)
+        for i, n in enumerate(self.counts):
+            if not n:
+                continue
+            high = bucket_bounds(i)[1]
+            for j, limit in enumerate(limits):
+                if high <= limit:
+                    out[j] += n
+        return out
+
+    def mean(self) -> float | None:
+        return self.sum_us / self.count / 1000.0 if self.count else None
+
+    def to_dict(self) -> dict:
+        """Sparse, JSON-friendly form; see from_dict."""
+        return {
+            "counts": {str(i): n for i, n in enumerate(self.counts) if n},
+            "count": self.count,
+            "sum_us": self.sum_us,
+            "min_us": self.min_us,
+            "max_us": self.max_us,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> LogLinearHistogram:
+        h = cls()
+        for i, n in data.get("counts", {}).items():
+            h.counts[int(i)] = int(n)
+        h.count = int(data.get("count", 0))
+        h.sum_us = int(data.get("sum_us", 0))
+        h.min_us = data.get("min_us")
+        h.max_us = int(data.get("max_us", 0))
+        return h
+
+    def nbytes(self) -> int:
+        return self.counts.itemsize * len(self.counts)
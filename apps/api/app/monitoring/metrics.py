@@ -1,49 +1,112 @@
 from __future__ import annotations
 
-import math
+import sys
 import time
-from collections import defaultdict, deque
+from collections import defaultdict
+from collections.abc import Mapping
+from typing import Any, Callable
+
+from app.core.config import settings
+from app.monitoring.histogram import LogLinearHistogram
+
+# Series that arrive after the cap is reached are folded into this one.
+OVERFLOW_KEY = "__overflow__"
 
 
 class MetricsStore:
     """
-    Lightweight in-process latency store (suitable scaffold).
-    Keeps last N latencies per route for p50/p95/p99.
+    Lightweight in-process metrics store.
+    Latencies go into a fixed-layout log-linear histogram per key (constant memory, mergeable
+    across processes); p50/p95/p99 are read from the buckets, accurate to ~3%.
+    At most max_series latency series are kept; later keys share OVERFLOW_KEY.
     """
 
-    def __init__(self, max_samples: int = 2000):
-        self.max_samples = max_samples
-        self._latencies: dict[str, deque[float]] = defaultdict(lambda: deque(maxlen=max_samples))
-        self._counts: dict[str, int] = defaultdict(int)
+    def __init__(self, max_series: int | None = None):
+        self.max_series = max_series or settings.METRICS_MAX_SERIES
+        self._histograms: dict[str, LogLinearHistogram] = {}
         self._errors: dict[str, int] = defaultdict(int)
+        self._gauges: dict[str, Callable[[], Any]] = {}
+        self._counters: dict[str, int] = defaultdict(int)
+        self._overflowed = 0
 
     def observe(self, key: str, latency_ms: float, is_error: bool):
-        self._latencies[key].append(latency_ms)
-        self._counts[key] += 1
+        h = self._histograms.get(key)
+        if h is None:
+            if len(self._histograms) >= self.max_series:
+                key = OVERFLOW_KEY
+                self._overflowed += 1
+            h = self._histograms.get(key)
+            if h is None:
+                h = self._histograms[key] = LogLinearHistogram()
+        h.record(latency_ms)
         if is_error:
             self._errors[key] += 1
 
-    def snapshot(self):
+    def incr(self, key: str, n: int = 1):
+        """Monotonic counter for event totals that have no latency (e.g. rows purged)."""
+        self._counters[key] += n
+
+    def register_gauge(self, key: str, fn: Callable[[], Any]):
+        """Registers a callback sampled on every snapshot (e.g. connection pool occupancy)."""
+        self._gauges[key] = fn
+
+    def histograms(self) -> dict[str, tuple[LogLinearHistogram, int]]:
+        """key -> (histogram, error count), for exposition and merging."""
+        return {key: (h, self._errors.get(key, 0)) for key, h in self._histograms.items()}
+
+    def counters(self) -> dict[str, int]:
+        return dict(self._counters)
+
+    def gauges(self) -> dict[str, Any]:
         out = {}
-        for key, samples in self._latencies.items():
-            arr = sorted(samples)
-            out[key] = {
-                "count": self._counts[key],
-                "errors": self._errors[key],
-                "p50_ms": _pct(arr, 0.50),
-                "p95_ms": _pct(arr, 0.95),
-                "p99_ms": _pct(arr, 0.99),
-            }
-        return {"ts": time.time(), "routes": out}
-
-
-def _pct(sorted_values: list[float], p: float) -> float | None:
-    if not sorted_values:
-        return None
-    idx = int(math.ceil(p * len(sorted_values))) - 1
-    idx = max(0, min(idx, len(sorted_values) - 1))
-    return sorted_values[idx]
+        for key, fn in self._gauges.items():
+            try:
+                out[key] = fn()
+            except Exception:
+                out[key] = None
+        return out
 
+    def snapshot(self):
+        routes = {}
+        total_bytes = 0
+        for key, (h, errors) in self.histograms().items():
+            routes[key] = summarize(h, errors)
+            routes[key]["bytes"] = series_bytes(key, h)
+            total_bytes += routes[key]["bytes"]
+        series = {
+            "count": len(routes),
+            "max": self.max_series,
+            "bytes": total_bytes,
+            "overflowed_observations": self._overflowed,
+        }
+        return {"ts": time.time(), "routes": routes, "series": series, "gauges": self.gauges(), "counters": self.counters()}
 
-metrics = MetricsStore()
 
+def summarize(h: LogLinearHistogram, errors: int) -> dict:
+    return {
+        "count": h.count,
+        "errors": errors,
+        "mean_ms": h.mean(),
+        "p50_ms": h.percentile(0.50),
+        "p95_ms": h.percentile(0.95),
+        "p99_ms": h.percentile(0.99),
+        "max_ms": h.max_us / 1000.0 if h.count else None,
+    }
+
+
+def series_bytes(key: str, h: LogLinearHistogram) -> int:
+    """Approximate memory held by one series: bucket array, histogram object and key."""
+    return sys.getsizeof(h) + sys.getsizeof(h.counts) + sys.getsizeof(key)
+
+
+def route_template(scope: Mapping[str, Any]) -> str:
+    """Path template of the matched route; requests that matched none share "<unmatched>"."""
+    return getattr(scope.get("route"), "path", None) or "<unmatched>"
+
+
+def route_key(scope: Mapping[str, Any], method: str, status_code: int) -> str:
+    """"<METHOD> <route template> <status class>", e.g. "GET /api/v1/screenshots/{screenshot_id} 2xx"."""
+    return f"{method} {route_template(scope)} {status_code // 100}xx"
+
+
+metrics = MetricsStore()
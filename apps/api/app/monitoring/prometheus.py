@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+from app.monitoring.histogram import LogLinearHistogram
+
+# Exposition bucket bounds in ms; coarser than the internal buckets, which are summed into them.
+EXPOSITION_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def render_prometheus(histograms: dict[str, tuple[LogLinearHistogram, int]], counters: dict[str, int], gauges: dict) -> str:
+    """Prometheus text exposition (format 0.0.4) of a metrics store's contents."""
+    lines = [
+        "# HELP app_latency_ms Observed latency per series in milliseconds.",
+        "# TYPE app_latency_ms histogram",
+    ]
+    for key in sorted(histograms):
+        h, _errors = histograms[key]
+        series = _label(key)
+        for bound, n in zip(EXPOSITION_BUCKETS_MS, h.cumulative_counts(EXPOSITION_BUCKETS_MS)):
+            lines.append(f'app_latency_ms_bucket{{series="{series}",le="{bound}"}} {n}')
+        lines.append(f'app_latency_ms_bucket{{series="{series}",le="+Inf"}} {h.count}')
+        lines.append(f'app_latency_ms_sum{{series="{series}"}} {h.sum_us / 1000.0!r}')
+        lines.append(f'app_latency_ms_count{{series="{series}"}} {h.count}')
+
+    lines += ["# HELP app_errors_total Observations flagged as errors per series.", "# TYPE app_errors_total counter"]
+    for key in sorted(histograms):
+        lines.append(f'app_errors_total{{series="{_label(key)}"}} {histograms[key][1]}')
+
+    lines += ["# HELP app_events_total Event counters.", "# TYPE app_events_total counter"]
+    for key in sorted(counters):
+        lines.append(f'app_events_total{{name="{_label(key)}"}} {counters[key]}')
+
+    lines += ["# HELP app_gauge Sampled gauges; dict-valued gauges are exported per numeric field.", "# TYPE app_gauge gauge"]
+    for key in sorted(gauges):
+        value = gauges[key]
+        fields = value.items() if isinstance(value, dict) else [("value", value)]
+        for field, v in fields:
+            if isinstance(v, (int, float)) and not isinstance(v, bool):
+                lines.append(f'app_gauge{{name="{_label(key)}",field="{_label(str(field))}"}} {v}')
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+from app.monitoring.metrics import metrics
+
+# Histogram keys are "pipeline.<stage> <platform> <host>"; see parse_stage_key.
+STAGE_PREFIX = "pipeline."
+
+
+def source_host(url: str) -> str:
+    return (urlparse(url).hostname or "unknown").lower()
+
+
+def stage_key(stage: str, platform: str, host: str) -> str:
+    return f"{STAGE_PREFIX}{stage} {platform} {host}"
+
+
+def parse_stage_key(key: str) -> tuple[str, str, str] | None:
+    if not key.startswith(STAGE_PREFIX):
+        return None
+    parts = key[len(STAGE_PREFIX) :].split(" ")
+    if len(parts) != 3:
+        return None
+    return parts[0], parts[1], parts[2]
+
+
+class StageTimer:
+    """
+    Wall time and byte counts per stage of one pipeline job.
+    - compact() is what gets stored in the screenshot's meta["stages"]
+    - report() feeds per-stage histograms labelled by platform and source host
+    """
+
+    def __init__(self):
+        self.ms: dict[str, float] = {}
+        self.bytes: dict[str, int] = {}
+        self.failed: str | None = None
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.failed = name
+            raise
+        finally:
+            self.ms[name] = self.ms.get(name, 0.0) + (time.perf_counter() - start) * 1000.0
+
+    def add_bytes(self, name: str, n: int) -> None:
+        self.bytes[name] = self.bytes.get(name, 0) + n
+
+    def compact(self) -> dict:
+        out = {"ms": {k: round(v, 1) for k, v in self.ms.items()}, "bytes": dict(self.bytes)}
+        if self.failed:
+            out["failed"] = self.failed
+        return out
+
+    def report(self, platform: str, host: str) -> None:
+        for name, ms in self.ms.items():
+            metrics.observe(stage_key(name, platform, host), ms, is_error=name == self.failed)
+        total = (time.perf_counter() - self._started) * 1000.0
+        metrics.observe(stage_key("total", platform, host), total, is_error=self.failed is not None)
+        for name, n in self.bytes.items():
+            metrics.incr(f"pipeline.bytes.{name}", n)
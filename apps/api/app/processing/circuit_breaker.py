@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+
+from app.core.config import settings
+from app.monitoring.metrics import metrics
+
+PREFIX = "circuit"
+HOSTS_KEY = f"{PREFIX}:hosts"
+STATE_TTL_SECONDS = 86400
+
+# KEYS: state hash. ARGV: now, probe lease seconds.
+# Returns {allowed (0|1), seconds until the caller should try again}.
+_ALLOW_LUA = """
+local now = tonumber(ARGV[1])
+local open_until = tonumber(redis.call('HGET', KEYS[1], 'open_until') or '0')
+if open_until == 0 then
+  return {1, '0'}
+end
+if now < open_until then
+  return {0, tostring(open_until - now)}
+end
+local probe_until = tonumber(redis.call('HGET', KEYS[1], 'probe_until') or '0')
+if now < probe_until then
+  return {0, tostring(probe_until - now)}
+end
+redis.call('HSET', KEYS[1], 'probe_until', tostring(now + tonumber(ARGV[2])))
+return {1, '0'}
+"""
+
+# KEYS: state hash, known hosts set.
+# ARGV: now, ok (0|1), window seconds, min failures, failure ratio, open seconds, state ttl, host.
+# Returns closed | open | opened (this call tripped the breaker).
+_RECORD_LUA = """
+local now, ok = tonumber(ARGV[1]), ARGV[2] == '1'
+local open_until = tonumber(redis.call('HGET', KEYS[1], 'open_until') or '0')
+if open_until > 0 then
+  if now < open_until then
+    return 'open'
+  end
+  if ok then
+    redis.call('DEL', KEYS[1])
+    return 'closed'
+  end
+  redis.call('HSET', KEYS[1], 'open_until', tostring(now + tonumber(ARGV[6])), 'probe_until', '0')
+  return 'opened'
+end
+local start = tonumber(redis.call('HGET', KEYS[1], 'window_start') or '0')
+if now - start >= tonumber(ARGV[3]) then
+  redis.call('HSET', KEYS[1], 'window_start', ARGV[1], 'total', 0, 'failures', 0)
+end
+local total = redis.call('HINCRBY', KEYS[1], 'total', 1)
+local failures = tonumber(redis.call('HGET', KEYS[1], 'failures') or '0')
+if not ok then
+  failures = redis.call('HINCRBY', KEYS[1], 'failures', 1)
+end
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[7]))
+if not ok and failures >= tonumber(ARGV[4]) and failures / total >= tonumber(ARGV[5]) then
+  redis.call('HSET', KEYS[1], 'open_until', tostring(now + tonumber(ARGV[6])), 'probe_until', '0')
+  redis.call('SADD', KEYS[2], ARGV[8])
+  return 'opened'
+end
+return 'closed'
+"""
+
+
+class CircuitOpen(RuntimeError):
+    """The source host's breaker is open; try again in retry_after seconds."""
+
+    def __init__(self, host: str, retry_after: float):
+        super().__init__(f"circuit open for {host}")
+        self.host = host
+        self.retry_after = retry_after
+
+
+@dataclass
+class _Circuit:
+    window_start: float = 0.0
+    total: int = 0
+    failures: int = 0
+    open_until: float = 0.0
+    probe_until: float = 0.0
+
+
+def _state_name(open_until: float, now: float) -> str:
+    if not open_until:
+        return "closed"
+    return "open" if now < open_until else "half_open"
+
+
+class CircuitBreaker:
+    """
+    Per source host breaker over fetch outcomes, shared by all workers through Redis.
+    - closed: fetches go through; failures (timeouts, connection errors, 429, 5xx) and successes
+      are counted in fixed windows of CIRCUIT_WINDOW_SECONDS
+    - open: a failure spike (enough failures, a high enough share) rejects fetches for
+      CIRCUIT_OPEN_SECONDS, so jobs are deferred instead of hammering a struggling origin
+    - half-open: then one probe fetch at a time; success closes the breaker, failure reopens it
+    Without Redis (or when it fails) the same rules apply per process.
+    """
+
+    def __init__(self):
+        self._mem: dict[str, _Circuit] = {}
+        self._allow = None
+        self._record = None
+
+    def _registered(self, r):
+        if self._allow is None or self._allow.registered_client is not r:
+            self._allow = r.register_script(_ALLOW_LUA)
+            self._record = r.register_script(_RECORD_LUA)
+        return self._allow, self._record
+
+    def _mem_allow(self, host: str, now: float) -> float:
+        c = self._mem.get(host)
+        if c is None or not c.open_until:
+            return 0.0
+        if now < c.open_until:
+            return c.open_until - now
+        if now < c.probe_until:
+            return c.probe_until - now
+        c.probe_until = now + settings.CIRCUIT_OPEN_SECONDS
+        return 0.0
+
+    def _mem_record(self, host: str, ok: bool, now: float) -> str:
+        c = self._mem.setdefault(host, _Circuit())
+        if c.open_until:
+            if now < c.open_until:
+                return "open"
+            if ok:
+                del self._mem[host]
+                return "closed"
+            c.open_until, c.probe_until = now + settings.CIRCUIT_OPEN_SECONDS, 0.0
+            return "opened"
+        if now - c.window_start >= settings.CIRCUIT_WINDOW_SECONDS:
+            c.window_start, c.total, c.failures = now, 0, 0
+        c.total += 1
+        if not ok:
+            c.failures += 1
+            if c.failures >= settings.CIRCUIT_MIN_FAILURES and c.failures / c.total >= settings.CIRCUIT_FAILURE_RATIO:
+                c.open_until, c.probe_until = now + settings.CIRCUIT_OPEN_SECONDS, 0.0
+                return "opened"
+        return "closed"
+
+    async def check(self, host: str, r=None) -> None:
+        """Raises CircuitOpen unless a fetch from host may go ahead now (possibly as the half-open probe)."""
+        now = time.time()
+        wait = None
+        if r is not None:
+            allow, _ = self._registered(r)
+            try:
+                allowed, retry_after = await allow(keys=[f"{PREFIX}:{host}"], args=[now, settings.CIRCUIT_OPEN_SECONDS])
+                wait = 0.0 if int(allowed) else float(retry_after)
+            except Exception:
+                wait = None
+        if wait is None:
+            wait = self._mem_allow(host, now)
+        if wait > 0:
+            metrics.incr(f"circuit.rejected.{host}")
+            raise CircuitOpen(host, wait)
+
+    async def record(self, host: str, ok: bool, r=None) -> str:
+        """Counts one fetch outcome; returns closed, open or opened."""
+        now = time.time()
+        state = None
+        if r is not None:
+            _, record = self._registered(r)
+            try:
+                state = await record(
+                    keys=[f"{PREFIX}:{host}", HOSTS_KEY],
+                    args=[
+                        now,
+                        1 if ok else 0,
+                        settings.CIRCUIT_WINDOW_SECONDS,
+                        settings.CIRCUIT_MIN_FAILURES,
+                        settings.CIRCUIT_FAILURE_RATIO,
+                        settings.CIRCUIT_OPEN_SECONDS,
+                        STATE_TTL_SECONDS,
+                        host,
+                    ],
+                )
+            except Exception:
+                state = None
+        if state is None:
+            state = self._mem_record(host, ok, now)
+        if state == "opened":
+            metrics.incr(f"circuit.opened.{host}")
+        return state
+
+    async def snapshot(self, r=None) -> dict[str, dict]:
+        """host -> {state, open_until, failures, total} for hosts whose breaker has opened."""
+        now = time.time()
+        if r is None:
+            return {
+                host: {"state": _state_name(c.open_until, now), "open_until": c.open_until or None, "failures": c.failures, "total": c.total}
+                for host, c in self._mem.items()
+                if c.open_until
+            }
+        hosts = sorted(await r.smembers(HOSTS_KEY))
+        pipe = r.pipeline()
+        for host in hosts:
+            pipe.hgetall(f"{PREFIX}:{host}")
+        rows = await pipe.execute() if hosts else []
+        out = {}
+        stale = []
+        for host, state in zip(hosts, rows):
+            open_until = float((state or {}).get("open_until", 0) or 0)
+            if not open_until:
+                stale.append(host)
+                continue
+            out[host] = {
+                "state": _state_name(open_until, now),
+                "open_until": open_until,
+                "failures": int(state.get("failures", 0) or 0),
+                "total": int(state.get("total", 0) or 0),
+            }
+        if stale:
+            await r.srem(HOSTS_KEY, *stale)
+        return out
+
+
+circuit_breaker = CircuitBreaker()
@@ -0,0 +1,240 @@
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+import uuid
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+
+from app.core.config import settings
+from app.monitoring.metrics import metrics
+
+PREFIX = "hostlimit"
+HOSTS_KEY = f"{PREFIX}:hosts"
+# State for hosts not fetched in this long expires; they start over at HOST_LIMIT_INITIAL.
+STATE_TTL_SECONDS = 86400
+
+# KEYS: state hash, leases zset, known hosts set. ARGV: now, token, lease_seconds, initial limit, state ttl, host.
+# Returns {granted (0|1), limit}. Leases expire, so slots held by a crashed worker come back.
+_ACQUIRE_LUA = """
+local now = tonumber(ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now)
+local limit = tonumber(redis.call('HGET', KEYS[1], 'limit') or ARGV[4])
+local blocked = tonumber(redis.call('HGET', KEYS[1], 'blocked_until') or '0')
+if now < blocked or redis.call('ZCARD', KEYS[2]) >= math.floor(limit) then
+  return {0, tostring(limit)}
+end
+redis.call('ZADD', KEYS[2], now + tonumber(ARGV[3]), ARGV[2])
+redis.call('HSETNX', KEYS[1], 'limit', ARGV[4])
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[5]))
+redis.call('EXPIRE', KEYS[2], tonumber(ARGV[5]))
+redis.call('SADD', KEYS[3], ARGV[6])
+return {1, tostring(limit)}
+"""
+
+# KEYS: state hash, leases zset.
+# ARGV: now, token, outcome (ok|throttle|neutral), initial, min, max, increase, factor, cooldown, blocked_until.
+# Returns the new limit.
+_RELEASE_LUA = """
+local now = tonumber(ARGV[1])
+redis.call('ZREM', KEYS[2], ARGV[2])
+local limit = tonumber(redis.call('HGET', KEYS[1], 'limit') or ARGV[4])
+if ARGV[3] == 'ok' then
+  limit = math.min(tonumber(ARGV[6]), limit + tonumber(ARGV[7]) / limit)
+elseif ARGV[3] == 'throttle' then
+  local last = tonumber(redis.call('HGET', KEYS[1], 'last_decrease') or '0')
+  if now - last >= tonumber(ARGV[9]) then
+    limit = math.max(tonumber(ARGV[5]), limit * tonumber(ARGV[8]))
+    redis.call('HSET', KEYS[1], 'last_decrease', ARGV[1])
+  end
+  local until_ts = tonumber(ARGV[10])
+  if until_ts > tonumber(redis.call('HGET', KEYS[1], 'blocked_until') or '0') then
+    redis.call('HSET', KEYS[1], 'blocked_until', ARGV[10])
+  end
+end
+redis.call('HSET', KEYS[1], 'limit', tostring(limit))
+return tostring(limit)
+"""
+
+
+class HostLimitTimeout(RuntimeError):
+    """No slot for the host within HOST_LIMIT_MAX_WAIT_SECONDS."""
+
+
+@dataclass
+class _HostState:
+    limit: float
+    in_flight: int = 0
+    last_decrease: float = 0.0
+    blocked_until: float = 0.0
+
+
+class Slot:
+    """One granted fetch; report how it went with ok() or throttled() before the block exits."""
+
+    def __init__(self):
+        self.outcome = "neutral"
+        self.retry_after: float | None = None
+
+    def ok(self) -> None:
+        self.outcome = "ok"
+
+    def throttled(self, retry_after: float | None = None) -> None:
+        self.outcome = "throttle"
+        self.retry_after = retry_after
+
+
+def adjust(limit: float, outcome: str) -> float:
+    """AIMD step: +HOST_LIMIT_INCREASE per window of successes, x HOST_LIMIT_DECREASE_FACTOR on throttling."""
+    if outcome == "ok":
+        return min(float(settings.HOST_LIMIT_MAX), limit + settings.HOST_LIMIT_INCREASE / limit)
+    if outcome == "throttle":
+        return max(float(settings.HOST_LIMIT_MIN), limit * settings.HOST_LIMIT_DECREASE_FACTOR)
+    return limit
+
+
+class HostLimiter:
+    """
+    Adaptive concurrency limit per origin host, shared by all worker processes through Redis.
+    - a fetch takes a slot (a lease that expires after HOST_LIMIT_LEASE_SECONDS) while fewer than
+      floor(limit) are in flight; otherwise it waits, up to HOST_LIMIT_MAX_WAIT_SECONDS
+    - success grows the limit additively (about +1 per limit's worth of successes); 429, 5xx and
+      timeouts cut it multiplicatively, at most once per HOST_LIMIT_COOLDOWN_SECONDS so one burst
+      of failures counts once; Retry-After pauses the host entirely
+    Without Redis (or when it fails) the same rules apply per process.
+    """
+
+    def __init__(self):
+        self._mem: dict[str, _HostState] = {}
+        self._acquire = None
+        self._release_script = None
+
+    def _registered(self, r):
+        """Registers the scripts once per client; calls go through EVALSHA."""
+        if self._acquire is None or self._acquire.registered_client is not r:
+            self._acquire = r.register_script(_ACQUIRE_LUA)
+            self._release_script = r.register_script(_RELEASE_LUA)
+        return self._acquire, self._release_script
+
+    def _mem_state(self, host: str) -> _HostState:
+        state = self._mem.get(host)
+        if state is None:
+            state = self._mem[host] = _HostState(limit=float(settings.HOST_LIMIT_INITIAL))
+        return state
+
+    async def _try_acquire(self, host: str, token: str, r) -> tuple[bool, bool]:
+        """(granted, via Redis)."""
+        now = time.time()
+        if r is not None:
+            acquire, _ = self._registered(r)
+            try:
+                granted, _limit = await acquire(
+                    keys=[f"{PREFIX}:{host}", f"{PREFIX}:{host}:leases", HOSTS_KEY],
+                    args=[now, token, settings.HOST_LIMIT_LEASE_SECONDS, settings.HOST_LIMIT_INITIAL, STATE_TTL_SECONDS, host],
+                )
+                return bool(int(granted)), True
+            except Exception:
+                pass
+        state = self._mem_state(host)
+        if now < state.blocked_until or state.in_flight >= int(state.limit):
+            return False, False
+        state.in_flight += 1
+        return True, False
+
+    async def _release(self, host: str, token: str, slot: Slot, r, via_redis: bool) -> None:
+        now = time.time()
+        blocked_until = now + slot.retry_after if slot.retry_after else 0.0
+        if slot.outcome == "throttle":
+            metrics.incr(f"hostlimit.throttled.{host}")
+        if via_redis:
+            _, release = self._registered(r)
+            try:
+                await release(
+                    keys=[f"{PREFIX}:{host}", f"{PREFIX}:{host}:leases"],
+                    args=[
+                        now,
+                        token,
+                        slot.outcome,
+                        settings.HOST_LIMIT_INITIAL,
+                        settings.HOST_LIMIT_MIN,
+                        settings.HOST_LIMIT_MAX,
+                        settings.HOST_LIMIT_INCREASE,
+                        settings.HOST_LIMIT_DECREASE_FACTOR,
+                        settings.HOST_LIMIT_COOLDOWN_SECONDS,
+                        blocked_until,
+                    ],
+                )
+            except Exception:
+                # The lease expires on its own; only this adjustment is lost.
+                pass
+            return
+        state = self._mem_state(host)
+        state.in_flight = max(0, state.in_flight - 1)
+        if slot.outcome == "throttle":
+            if now - state.last_decrease >= settings.HOST_LIMIT_COOLDOWN_SECONDS:
+                state.limit = adjust(state.limit, "throttle")
+                state.last_decrease = now
+            state.blocked_until = max(state.blocked_until, blocked_until)
+        else:
+            state.limit = adjust(state.limit, slot.outcome)
+
+    @asynccontextmanager
+    async def slot(self, host: str, r=None):
+        """
+        Holds a fetch slot for host for the duration of the block:
+
+            async with host_limiter.slot(host, r) as slot:
+                ...
+                slot.ok()  # or slot.throttled(retry_after)
+        """
+        token = uuid.uuid4().hex
+        start = time.monotonic()
+        deadline = start + settings.HOST_LIMIT_MAX_WAIT_SECONDS
+        delay = 0.02
+        while True:
+            granted, via_redis = await self._try_acquire(host, token, r)
+            if granted:
+                break
+            if time.monotonic() >= deadline:
+                metrics.observe(f"hostlimit.wait {host}", (time.monotonic() - start) * 1000.0, is_error=True)
+                raise HostLimitTimeout(f"no fetch slot for {host} within {settings.HOST_LIMIT_MAX_WAIT_SECONDS}s")
+            await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+            delay = min(delay * 2, 0.5)
+        metrics.observe(f"hostlimit.wait {host}", (time.monotonic() - start) * 1000.0, is_error=False)
+
+        slot = Slot()
+        try:
+            yield slot
+        finally:
+            await self._release(host, token, slot, r, via_redis)
+
+    async def snapshot(self, r=None) -> dict[str, dict]:
+        """host -> {limit, in_flight, blocked_until}, from Redis when given, else this process."""
+        if r is None:
+            return {
+                host: {"limit": s.limit, "in_flight": s.in_flight, "blocked_until": s.blocked_until or None}
+                for host, s in self._mem.items()
+            }
+        hosts = sorted(await r.smembers(HOSTS_KEY))
+        now = time.time()
+        pipe = r.pipeline()
+        for host in hosts:
+            pipe.hgetall(f"{PREFIX}:{host}")
+            pipe.zcount(f"{PREFIX}:{host}:leases", now, "+inf")
+        rows = await pipe.execute() if hosts else []
+        out = {}
+        for i, host in enumerate(hosts):
+            state, in_flight = rows[2 * i], rows[2 * i + 1]
+            if not state:
+                continue
+            blocked = float(state.get("blocked_until", 0) or 0)
+            out[host] = {
+                "limit": float(state.get("limit", settings.HOST_LIMIT_INITIAL)),
+                "in_flight": int(in_flight),
+                "blocked_until": blocked if blocked > now else None,
+            }
+        return out
+
+
+host_limiter = HostLimiter()
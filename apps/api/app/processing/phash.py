@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+from itertools import combinations
+
+HASH_BITS = 64
+BANDS = 4
+BAND_BITS = HASH_BITS // BANDS
+# Probing each band within radius r finds every hash within 4 * (r + 1) - 1 bits (pigeonhole);
+# r = 2 (137 probes per band) is as far as the band lookups stay cheap.
+MAX_DISTANCE = BANDS * 3 - 1
+
+
+def dhash(im) -> int:
+    """
+    64-bit difference hash of a PIL image: grayscale 9x8, one bit per horizontally adjacent pair (left brighter).
+    Survives rescaling and recompression; a few bits change for small edits, many for a new layout.
+    """
+    from PIL import Image  # imported here: the API uses the band helpers, only workers hash
+
+    small = im.convert("L").resize((9, 8), Image.Resampling.BOX)
+    px = small.tobytes()
+    h = 0
+    for row in range(8):
+        for col in range(8):
+            h = (h << 1) | (px[row * 9 + col] > px[row * 9 + col + 1])
+    return h
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def to_signed(h: int) -> int:
+    """The hash as Postgres stores it (bigint is signed)."""
+    return h - (1 << HASH_BITS) if h >= 1 << (HASH_BITS - 1) else h
+
+
+def to_unsigned(v: int) -> int:
+    return v & ((1 << HASH_BITS) - 1)
+
+
+def bands(h: int) -> tuple[int, ...]:
+    """The hash's 16-bit bands, most significant first (the dhash_b0..b3 columns)."""
+    mask = (1 << BAND_BITS) - 1
+    return tuple((h >> (BAND_BITS * (BANDS - 1 - i))) & mask for i in range(BANDS))
+
+
+def band_probes(band: int, radius: int) -> list[int]:
+    """Every band value within radius bits of band, band itself first."""
+    out = [band]
+    for r in range(1, radius + 1):
+        for bits in combinations(range(BAND_BITS), r):
+            v = band
+            for bit in bits:
+                v ^= 1 << bit
+            out.append(v)
+    return out
+
+
+def probe_radius(max_distance: int) -> int:
+    """Smallest per-band radius that can't miss a hash within max_distance (multi-index hashing)."""
+    return max(0, max_distance) // BANDS
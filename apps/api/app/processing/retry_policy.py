@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import random
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import httpx
+from PIL import Image, UnidentifiedImageError
+
+from app.core.config import settings
+from app.processing.circuit_breaker import CircuitOpen
+from app.processing.host_limits import HostLimitTimeout
+
+# Statuses worth retrying: the origin is busy or broken for now, not saying "no".
+TRANSIENT_STATUSES = frozenset({408, 425, 429})
+
+
+class PermanentError(RuntimeError):
+    """The source can't produce a usable image; retrying won't change that."""
+
+
+@dataclass(frozen=True)
+class Decision:
+    """
+    What to do with a failed attempt.
+    - kind: permanent | transient | deferred (never reached the origin: circuit open, no fetch slot)
+    - final: give up now (dead-letter); otherwise retry after delay seconds
+    """
+
+    kind: str
+    reason: str
+    final: bool
+    delay: float = 0.0
+
+
+def retry_after_seconds(value: str | None) -> float | None:
+    """Retry-After as seconds from now (delta-seconds or HTTP-date form)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+
+def classify(exc: BaseException) -> tuple[str, str]:
+    """(kind, reason) for an exception raised while processing a screenshot."""
+    if isinstance(exc, PermanentError):
+        return "permanent", str(exc)
+    if isinstance(exc, CircuitOpen):
+        return "deferred", "circuit open"
+    if isinstance(exc, HostLimitTimeout):
+        return "deferred", "no fetch slot"
+    if isinstance(exc, httpx.HTTPStatusError):
+        status = exc.response.status_code
+        kind = "transient" if status >= 500 or status in TRANSIENT_STATUSES else "permanent"
+        return kind, f"http {status}"
+    if isinstance(exc, (httpx.InvalidURL, httpx.UnsupportedProtocol)):
+        return "permanent", "invalid url"
+    if isinstance(exc, httpx.TimeoutException):
+        return "transient", "timeout"
+    if isinstance(exc, httpx.TransportError):
+        return "transient", "connection error"
+    if isinstance(exc, (UnidentifiedImageError, Image.DecompressionBombError)):
+        return "permanent", "undecodable image"
+    # Database, storage and anything unexpected: assume it may pass.
+    return "transient", type(exc).__name__
+
+
+def is_origin_failure(exc: BaseException) -> bool:
+    """Whether a fetch error counts against the source host (for the circuit breaker)."""
+    if isinstance(exc, httpx.HTTPStatusError):
+        status = exc.response.status_code
+        return status >= 500 or status in TRANSIENT_STATUSES
+    return isinstance(exc, httpx.TransportError)
+
+
+def backoff_seconds(attempt: int, retry_after: float | None = None) -> float:
+    """Jittered exponential backoff for the attempt-th retry (0-based), never sooner than Retry-After."""
+    ceiling = min(settings.RETRY_BACKOFF_MAX_SECONDS, settings.RETRY_BACKOFF_BASE_SECONDS * 2**attempt)
+    return max(retry_after or 0.0, random.uniform(ceiling / 2, ceiling))
+
+
+def decide(exc: BaseException, *, failures: int, deferrals: int) -> Decision:
+    """
+    failures: transient failures before this one; deferrals: attempts that never reached the origin.
+    Permanent errors are final at once; transient ones after RETRY_MAX_RETRIES retries; deferrals
+    don't use up retries but are capped at CIRCUIT_MAX_DEFERRALS.
+    """
+    kind, reason = classify(exc)
+    if kind == "permanent":
+        return Decision(kind, reason, final=True)
+    if kind == "deferred":
+        if deferrals >= settings.CIRCUIT_MAX_DEFERRALS:
+            return Decision(kind, reason, final=True)
+        if isinstance(exc, CircuitOpen):
+            # Spread the deferred jobs out so they don't all come back as the breaker half-opens.
+            return Decision(kind, reason, final=False, delay=exc.retry_after + random.uniform(0, settings.CIRCUIT_OPEN_SECONDS))
+        return Decision(kind, reason, final=False, delay=backoff_seconds(min(deferrals, 4)))
+    if failures >= settings.RETRY_MAX_RETRIES:
+        return Decision(kind, reason, final=True)
+    retry_after = None
+    if isinstance(exc, httpx.HTTPStatusError):
+        retry_after = retry_after_seconds(exc.response.headers.get("retry-after"))
+    return Decision(kind, reason, final=False, delay=backoff_seconds(failures, retry_after))
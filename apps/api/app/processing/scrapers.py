@@ -1,10 +1,13 @@
 from __future__ import annotations
 
+import json
 import re
 from dataclasses import dataclass
 
-import httpx
-from bs4 import BeautifulSoup
+from app.core.config import settings
+
+# httpx and bs4/lxml are imported where used: the API process imports this module at startup
+# (via the pipeline endpoint) but only needs them once a scrape actually runs.
 
 
 @dataclass
@@ -16,13 +19,7 @@ class ScrapeResult:
     screenshots: list[str]
 
 
-async def scrape_app_store(app_id: str) -> ScrapeResult:
-    # Prefer stable iTunes lookup API
-    url = f"https://itunes.apple.com/lookup?id={app_id}&country=us"
-    async with httpx.AsyncClient(timeout=20) as client:
-        r = await client.get(url)
-        r.raise_for_status()
-        data = r.json()
+def parse_app_store_lookup(app_id: str, data: dict) -> ScrapeResult:
     results = data.get("results") or []
     if not results:
         raise RuntimeError("App Store lookup returned no results")
@@ -40,28 +37,19 @@ async def scrape_app_store(app_id: str) -> ScrapeResult:
     )
 
 
-async def scrape_play_store(package_name: str) -> ScrapeResult:
-    url = f"https://play.google.com/store/apps/details?id={package_name}&hl=en&gl=US"
-    headers = {
-        "user-agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-        "accept-language": "en-US,en;q=0.9",
-    }
-    async with httpx.AsyncClient(timeout=20, headers=headers, follow_redirects=True) as client:
-        r = await client.get(url)
-        r.raise_for_status()
-        html = r.text
+def parse_play_store_html(package_name: str, html: str) -> ScrapeResult:
+    from bs4 import BeautifulSoup
 
     soup = BeautifulSoup(html, "lxml")
     title = (soup.find("meta", {"property": "og:title"}) or {}).get("content")
     developer = (soup.find("meta", {"property": "og:description"}) or {}).get("content")
     icon = (soup.find("meta", {"property": "og:image"}) or {}).get("content")
 
-    matches = re.findall(r"https://play-lh\.googleusercontent\.com/[A-Za-z0-9_-]+(?:=[^\"\\s<]*)?", html)
+    image_base_url = settings.PLAY_STORE_IMAGE_BASE_URL
+    matches = re.findall(re.escape(image_base_url) + r"[A-Za-z0-9_-]+(?:=[^\"\\s<]*)?", html)
     # JSON-LD fallback
     for script in soup.find_all("script", {"type": "application/ld+json"}):
         try:
-            import json
-
             data = json.loads(script.text)
             if isinstance(data, dict) and "screenshot" in data:
                 val = data["screenshot"]
@@ -77,9 +65,35 @@ async def scrape_play_store(package_name: str) -> ScrapeResult:
         m = m.replace("\\u0026", "&").replace("\\u003d", "=").replace("&amp;", "&")
         if icon and m == icon:
             continue
-        if m.startswith("https://play-lh.googleusercontent.com/"):
+        if m.startswith(image_base_url):
             screenshots.append(m)
     screenshots = list(dict.fromkeys(screenshots))
 
     return ScrapeResult(app_id=package_name, platform="playstore", title=title, developer=developer, screenshots=screenshots)
 
+
+async def scrape_app_store(app_id: str) -> ScrapeResult:
+    import httpx
+
+    # Prefer stable iTunes lookup API
+    params = {"id": app_id, "country": "us"}
+    async with httpx.AsyncClient(timeout=20) as client:
+        r = await client.get(settings.APP_STORE_LOOKUP_URL, params=params)
+        r.raise_for_status()
+        data = r.json()
+    return parse_app_store_lookup(app_id, data)
+
+
+async def scrape_play_store(package_name: str) -> ScrapeResult:
+    import httpx
+
+    params = {"id": package_name, "hl": "en", "gl": "US"}
+    headers = {
+        "user-agent": "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+        "accept-language": "en-US,en;q=0.9",
+    }
+    async with httpx.AsyncClient(timeout=20, headers=headers, follow_redirects=True) as client:
+        r = await client.get(settings.PLAY_STORE_DETAILS_URL, params=params)
+        r.raise_for_status()
+        html = r.text
+    return parse_play_store_html(package_name, html)
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import asyncio
+import io
+import posixpath
+import time
+from dataclasses import dataclass
+
+from app.cache.memory import TTLCache
+from app.core.config import settings
+from app.monitoring.metrics import metrics
+
+CONTENT_TYPES = {"webp": "image/webp", "png": "image/png", "jpeg": "image/jpeg"}
+
+
+@dataclass(frozen=True)
+class TransformSpec:
+    """
+    width/height in px (either may be None: scale to the other, keeping the aspect ratio).
+    - contain: fit inside width x height, never larger than the original
+    - cover: fill width x height exactly, cropping the overflow around the center
+    - fill: stretch to width x height
+    """
+
+    width: int | None = None
+    height: int | None = None
+    fit: str = "contain"
+    format: str = "webp"
+
+    @property
+    def content_type(self) -> str:
+        return CONTENT_TYPES[self.format]
+
+    def slug(self) -> str:
+        return f"{self.width or 0}x{self.height or 0}-{self.fit}.{self.format}"
+
+    def scaled_size(self, src_w: int, src_h: int) -> tuple[int, int]:
+        """Size of the resized image before any crop (only cover crops)."""
+        w, h = self.width, self.height
+        if w and h:
+            if self.fit == "fill":
+                return w, h
+            pick = max if self.fit == "cover" else min
+            scale = pick(w / src_w, h / src_h)
+        elif w:
+            scale = w / src_w
+        elif h:
+            scale = h / src_h
+        else:
+            scale = 1.0
+        if self.fit == "contain" or not (w and h):
+            scale = min(scale, 1.0)
+        return max(1, round(src_w * scale)), max(1, round(src_h * scale))
+
+    def output_size(self, src_w: int, src_h: int) -> tuple[int, int]:
+        if self.fit == "cover" and self.width and self.height:
+            return self.width, self.height
+        return self.scaled_size(src_w, src_h)
+
+
+def derived_prefix(source_key: str) -> str:
+    """Folder of every cached transform of source_key: TRANSFORM_CACHE_PREFIX + the screenshot's folder."""
+    return f"{settings.TRANSFORM_CACHE_PREFIX}{posixpath.dirname(source_key)}/"
+
+
+def derived_key(source_key: str, spec: TransformSpec) -> str:
+    """Where the transform of source_key for spec is cached."""
+    return derived_prefix(source_key) + spec.slug()
+
+
+def pick_source(meta: dict, spec: TransformSpec) -> str:
+    """The smallest stored rendition (variants, then the full-size WebP) big enough to resize down from."""
+    need_w, need_h = spec.scaled_size(meta["width"], meta["height"])
+    for v in sorted(meta.get("variants") or [], key=lambda v: v["width"]):
+        if v.get("key") and v["width"] >= need_w and v["height"] >= need_h:
+            return v["key"]
+    return meta["webp_key"]
+
+
+def render(image_bytes: bytes, spec: TransformSpec, size: tuple[int, int]) -> bytes:
+    """Decodes, resizes (or crops) to size and encodes as spec.format. CPU-bound: call off the event loop."""
+    from PIL import Image, ImageOps
+
+    im = Image.open(io.BytesIO(image_bytes)).convert("RGBA")
+    if spec.fit == "cover" and spec.width and spec.height:
+        im = ImageOps.fit(im, size, Image.Resampling.LANCZOS)
+    elif im.size != size:
+        im = im.resize(size, Image.Resampling.LANCZOS)
+    out = io.BytesIO()
+    if spec.format == "jpeg":
+        flat = Image.new("RGB", im.size, (255, 255, 255))
+        flat.paste(im, mask=im.getchannel("A"))
+        flat.save(out, format="JPEG", quality=85, optimize=True)
+    elif spec.format == "png":
+        im.save(out, format="PNG")
+    else:
+        # method 4: noticeably faster than the pipeline's 6, which matters while a client waits.
+        im.save(out, format="WEBP", quality=80, method=4)
+    return out.getvalue()
+
+
+class Transformer:
+    """
+    On-demand renditions of processed screenshots.
+    Lookup order: this process's LRU, then the derived-asset cache in object storage, then a render
+    from the smallest stored rendition that is large enough (written back to both caches).
+    The LRU goes first although storage is the shared cache: everything in the LRU was written to
+    storage too, so checking storage first would cost a GET on every request and the LRU would never
+    save one.
+    Concurrent requests for the same rendition in a process share one lookup/render; storage calls,
+    decode and encode run in worker threads, off the event loop.
+    """
+
+    def __init__(self):
+        self._memory = TTLCache(
+            max_entries=settings.TRANSFORM_MEMORY_MAX_ENTRIES, ttl_seconds=settings.TRANSFORM_MEMORY_TTL_SECONDS
+        )
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    async def transform(self, meta: dict, spec: TransformSpec) -> tuple[bytes, str]:
+        """(image bytes, where they came from: memory | storage | rendered). LookupError if the source is gone."""
+        key = derived_key(meta["webp_key"], spec)
+        data = self._memory.get(key)
+        if data is not None:
+            metrics.incr("transform.memory")
+            return data, "memory"
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(key, meta, spec))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._finished(key, t))
+        else:
+            metrics.incr("transform.coalesced")
+        # A client going away must not cancel the work other requests are waiting on.
+        return await asyncio.shield(task)
+
+    def _finished(self, key: str, task: asyncio.Future) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # retrieved here, so an error nobody awaited anymore isn't logged as lost
+
+    async def _load(self, key: str, meta: dict, spec: TransformSpec) -> tuple[bytes, str]:
+        from app.storage.s3 import get_bytes, upload_bytes
+
+        start = time.perf_counter()
+        data = await asyncio.to_thread(get_bytes, key)
+        source = "storage"
+        if data is None:
+            raw = await asyncio.to_thread(get_bytes, pick_source(meta, spec))
+            if raw is None:
+                raise LookupError("source image missing")
+            data = await asyncio.to_thread(render, raw, spec, spec.output_size(meta["width"], meta["height"]))
+            source = "rendered"
+            try:
+                await asyncio.to_thread(upload_bytes, key, data, spec.content_type)
+            except Exception:
+                # Served anyway; the next miss renders again.
+                pass
+        metrics.observe(f"transform.{source}", (time.perf_counter() - start) * 1000.0, is_error=False)
+        if len(data) <= settings.TRANSFORM_MEMORY_MAX_ITEM_BYTES:
+            self._memory.set(key, data)
+        return data, source
+
+
+transformer = Transformer()
@@ -0,0 +1,39 @@
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.ip_list import IPAllowlist, IPDenylist
+
+_MODELS: dict[str, type[IPAllowlist] | type[IPDenylist]] = {"allow": IPAllowlist, "deny": IPDenylist}
+
+
+class IPListsRepository:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def list_all(self, list_name: str) -> list[tuple]:
+        """Returns (user_id, ip) rows for the whole list, global entries have user_id None."""
+        model = _MODELS[list_name]
+        res = await self.db.execute(select(model.user_id, model.ip))
+        return [tuple(row) for row in res.all()]
+
+    async def list_for_owner(self, list_name: str, user_id=None):
+        """Entries of one owner's list (global when user_id is None), newest first."""
+        model = _MODELS[list_name]
+        owner = model.user_id.is_(None) if user_id is None else model.user_id == user_id
+        res = await self.db.execute(select(model).where(owner).order_by(model.created_at.desc()))
+        return list(res.scalars().all())
+
+    async def add(self, *, list_name: str, ip: str, user_id=None):
+        entry = _MODELS[list_name](user_id=user_id, ip=ip)
+        self.db.add(entry)
+        await self.db.commit()
+        await self.db.refresh(entry)
+        return entry
+
+    async def remove(self, *, list_name: str, ip: str, user_id=None) -> int:
+        """Removes every row for (user_id, ip) so the in-memory set semantics stay exact."""
+        model = _MODELS[list_name]
+        owner = model.user_id.is_(None) if user_id is None else model.user_id == user_id
+        res = await self.db.execute(delete(model).where(owner, model.ip == ip))
+        await self.db.commit()
+        return res.rowcount or 0
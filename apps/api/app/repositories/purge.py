@@ -0,0 +1,21 @@
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+async def delete_chunk(db: AsyncSession, model, condition, *, after_id=None, limit: int) -> tuple[int, object]:
+    """
+    Deletes up to `limit` rows matching `condition`, walking the primary key upward from `after_id`.
+    Returns (rows deleted, last id scanned). A None id means the end of the table was reached.
+    - one short transaction per chunk; rows locked by live traffic are skipped and retried next run
+    - the keyset scan visits each row at most once per pass, so no extra index is needed
+    """
+    ids = select(model.id).where(condition)
+    if after_id is not None:
+        ids = ids.where(model.id > after_id)
+    ids = ids.order_by(model.id).limit(limit).with_for_update(skip_locked=True)
+    res = await db.execute(delete(model).where(model.id.in_(ids.scalar_subquery())).returning(model.id))
+    deleted = [row[0] for row in res.all()]
+    await db.commit()
+    if len(deleted) < limit:
+        return len(deleted), None
+    return len(deleted), max(deleted)
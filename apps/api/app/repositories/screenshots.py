@@ -1,7 +1,12 @@
-from sqlalchemy import select
+from datetime import datetime
+
+from sqlalchemy import and_, cast, delete, func, or_, select, update
+from sqlalchemy.dialects.postgresql import BIT
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.screenshot import Screenshot
+from app.models.user import User
+from app.processing.phash import band_probes, bands, probe_radius, to_signed
 
 
 class ScreenshotsRepository:
@@ -23,6 +28,76 @@ class ScreenshotsRepository:
         await self.db.refresh(s)
         return s
 
+    async def create_many(self, *, user_id, app_id: str, platform: str, urls: list[str], metadata: dict) -> list[Screenshot]:
+        """One insert round trip and one commit for a whole scrape."""
+        rows = [Screenshot(user_id=user_id, app_id=app_id, platform=platform, url=url, meta=dict(metadata), status="QUEUED") for url in urls]
+        if rows:
+            self.db.add_all(rows)
+            await self.db.commit()
+        return rows
+
+    async def list_current_for_app(self, user_id, app_id: str, platform: str) -> list[Screenshot]:
+        """The user's screenshots of one app that a later scrape hasn't superseded, newest first."""
+        res = await self.db.execute(
+            select(Screenshot)
+            .where(
+                Screenshot.user_id == user_id,
+                Screenshot.app_id == app_id,
+                Screenshot.platform == platform,
+                Screenshot.status != "SUPERSEDED",
+            )
+            .order_by(Screenshot.created_at.desc())
+        )
+        return list(res.scalars().all())
+
+    async def find_similar(self, user_id, dhash: int, *, max_distance: int, limit: int, exclude_id=None) -> list[tuple[Screenshot, int]]:
+        """
+        The user's screenshots whose dHash is within max_distance bits of dhash (unsigned), nearest first.
+        Multi-index hashing: a match must be close to dhash in at least one 16-bit band, so each band
+        index is probed for the few values within the pigeonhole radius, and only those candidates
+        have their full Hamming distance computed. Needs PostgreSQL 14+ for bit_count().
+        """
+        radius = probe_radius(max_distance)
+        band_cols = (Screenshot.dhash_b0, Screenshot.dhash_b1, Screenshot.dhash_b2, Screenshot.dhash_b3)
+        distance = func.bit_count(cast(Screenshot.dhash.op("#")(to_signed(dhash)), BIT(64)))
+        q = (
+            select(Screenshot, distance.label("distance"))
+            .where(
+                Screenshot.user_id == user_id,
+                or_(*(col.in_(band_probes(band, radius)) for col, band in zip(band_cols, bands(dhash)))),
+                distance <= max_distance,
+            )
+            .order_by(distance, Screenshot.created_at.desc())
+            .limit(limit)
+        )
+        if exclude_id is not None:
+            q = q.where(Screenshot.id != exclude_id)
+        res = await self.db.execute(q)
+        return [(s, int(d)) for s, d in res.all()]
+
+    async def set_status_many(self, screenshot_ids: list, status: str) -> int:
+        if not screenshot_ids:
+            return 0
+        res = await self.db.execute(update(Screenshot).where(Screenshot.id.in_(screenshot_ids)).values(status=status))
+        await self.db.commit()
+        return res.rowcount or 0
+
+    async def claim_for_processing(self, screenshot_id) -> Screenshot | None:
+        """
+        Moves the screenshot to PROCESSING in one conditional UPDATE, unless it is SUPERSEDED (a
+        re-scrape dropped its URL while the job was queued) or already COMPLETE (a duplicate job).
+        None when no row was moved.
+        """
+        res = await self.db.execute(
+            update(Screenshot)
+            .where(Screenshot.id == screenshot_id, Screenshot.status.not_in(("SUPERSEDED", "COMPLETE")))
+            .values(status="PROCESSING")
+            .returning(Screenshot)
+        )
+        s = res.scalar_one_or_none()
+        await self.db.commit()
+        return s
+
     async def update_status(self, screenshot_id, status: str):
         res = await self.db.execute(select(Screenshot).where(Screenshot.id == screenshot_id))
         s = res.scalar_one_or_none()
@@ -33,3 +108,47 @@ class ScreenshotsRepository:
         await self.db.refresh(s)
         return s
 
+    async def list_expired(self, cutoffs: dict[str, datetime | None], *, after_id=None, limit: int) -> list[tuple]:
+        """
+        Returns up to `limit` (id, meta) rows older than their owner's tier cutoff, in primary key order
+        after `after_id`. A None cutoff keeps that tier forever; unknown tiers use the "free" cutoff.
+        """
+        conditions = [
+            and_(User.subscription_tier == tier, Screenshot.created_at < cutoff) for tier, cutoff in cutoffs.items() if cutoff
+        ]
+        if cutoffs.get("free"):
+            conditions.append(and_(User.subscription_tier.notin_(list(cutoffs)), Screenshot.created_at < cutoffs["free"]))
+        if not conditions:
+            return []
+        q = select(Screenshot.id, Screenshot.meta).join(User, User.id == Screenshot.user_id).where(or_(*conditions))
+        if after_id is not None:
+            q = q.where(Screenshot.id > after_id)
+        res = await self.db.execute(q.order_by(Screenshot.id).limit(limit))
+        return [tuple(row) for row in res.all()]
+
+    async def list_unhashed(self, *, after_id=None, limit: int) -> list[tuple]:
+        """Up to `limit` (id, meta) rows of COMPLETE screenshots without a dHash, in primary key order after `after_id`."""
+        q = select(Screenshot.id, Screenshot.meta).where(Screenshot.status == "COMPLETE", Screenshot.dhash.is_(None))
+        if after_id is not None:
+            q = q.where(Screenshot.id > after_id)
+        res = await self.db.execute(q.order_by(Screenshot.id).limit(limit))
+        return [tuple(row) for row in res.all()]
+
+    async def set_dhashes(self, hashes: dict) -> int:
+        """Stores {screenshot_id: unsigned 64-bit dHash} with its bands, in one executemany."""
+        if not hashes:
+            return 0
+        rows = []
+        for screenshot_id, h in hashes.items():
+            b0, b1, b2, b3 = bands(h)
+            rows.append({"id": screenshot_id, "dhash": to_signed(h), "dhash_b0": b0, "dhash_b1": b1, "dhash_b2": b2, "dhash_b3": b3})
+        await self.db.execute(update(Screenshot), rows)
+        await self.db.commit()
+        return len(rows)
+
+    async def delete_many(self, screenshot_ids: list) -> int:
+        if not screenshot_ids:
+            return 0
+        res = await self.db.execute(delete(Screenshot).where(Screenshot.id.in_(screenshot_ids)))
+        await self.db.commit()
+        return res.rowcount or 0
@@ -1,9 +1,12 @@
 from datetime import datetime, timezone
+from typing import cast
 
-from sqlalchemy import select
+from sqlalchemy import Table, or_, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.session import Session
+from app.models.user import User
+from app.repositories.purge import delete_chunk
 
 
 class SessionsRepository:
@@ -19,7 +22,9 @@ class SessionsRepository:
         ip: str | None,
         user_agent: str | None,
         device_fingerprint: str | None,
+        commit: bool = True,
     ) -> Session:
+        """With commit=False the row is only added; the caller's commit flushes it with its other changes."""
         s = Session(
             user_id=user_id,
             refresh_token_hash=refresh_token_hash,
@@ -29,17 +34,79 @@ class SessionsRepository:
             device_fingerprint=device_fingerprint,
         )
         self.db.add(s)
-        await self.db.commit()
-        await self.db.refresh(s)
+        if commit:
+            await self.db.commit()
+            await self.db.refresh(s)
         return s
 
     async def get_by_refresh_hash(self, refresh_token_hash: str) -> Session | None:
         res = await self.db.execute(select(Session).where(Session.refresh_token_hash == refresh_token_hash))
         return res.scalar_one_or_none()
 
+    async def rotate(
+        self,
+        *,
+        refresh_token_hash: str,
+        new_refresh_token_hash: str,
+        expires_at: datetime,
+        device_fingerprint: str | None,
+    ):
+        """
+        Revokes a live session and issues its replacement in one transaction:
+        one UPDATE ... FROM users ... RETURNING plus one INSERT.
+        The revoked_at IS NULL guard means concurrent refreshes of the same token can't both win.
+        Returns: (user_id, role, new_session) or None if the token is unknown, revoked, expired
+        or bound to a different device.
+        """
+        now = datetime.now(timezone.utc)
+        # Core tables: an ORM update(Session) drops the users.role RETURNING column.
+        sessions, users = cast(Table, Session.__table__), cast(Table, User.__table__)
+        criteria = [
+            sessions.c.refresh_token_hash == refresh_token_hash,
+            sessions.c.revoked_at.is_(None),
+            sessions.c.expires_at > now,
+            sessions.c.user_id == users.c.id,
+        ]
+        if device_fingerprint:
+            criteria.append(
+                or_(sessions.c.device_fingerprint.is_(None), sessions.c.device_fingerprint == device_fingerprint)
+            )
+        res = await self.db.execute(
+            update(sessions)
+            .where(*criteria)
+            .values(revoked_at=now)
+            .returning(
+                sessions.c.user_id,
+                sessions.c.ip,
+                sessions.c.user_agent,
+                sessions.c.device_fingerprint,
+                users.c.role,
+            )
+        )
+        row = res.first()
+        if row is None:
+            await self.db.rollback()
+            return None
+
+        new_session = await self.create(
+            user_id=row.user_id,
+            refresh_token_hash=new_refresh_token_hash,
+            expires_at=expires_at,
+            ip=row.ip,
+            user_agent=row.user_agent,
+            device_fingerprint=row.device_fingerprint,
+            commit=False,
+        )
+        await self.db.commit()
+        return row.user_id, row.role, new_session
+
     async def revoke(self, session: Session):
         session.revoked_at = datetime.now(timezone.utc)
         await self.db.commit()
         await self.db.refresh(session)
         return session
 
+    async def purge_chunk(self, *, before: datetime, after_id=None, limit: int) -> tuple[int, object]:
+        """Deletes sessions that expired or were revoked before `before` (see delete_chunk)."""
+        condition = or_(Session.expires_at < before, Session.revoked_at < before)
+        return await delete_chunk(self.db, Session, condition, after_id=after_id, limit=limit)
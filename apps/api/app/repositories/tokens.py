@@ -1,8 +1,14 @@
-from sqlalchemy import select
+from sqlalchemy import or_, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.models.email_token import EmailVerificationToken
 from app.models.password_reset_token import PasswordResetToken
+from app.repositories.purge import delete_chunk
+
+_MODELS: dict[str, type[EmailVerificationToken] | type[PasswordResetToken]] = {
+    "email_verification": EmailVerificationToken,
+    "password_reset": PasswordResetToken,
+}
 
 
 class TokensRepository:
@@ -43,3 +49,8 @@ class TokensRepository:
         token.used_at = datetime.now(timezone.utc)
         await self.db.commit()
 
+    async def purge_chunk(self, kind: str, *, before, after_id=None, limit: int) -> tuple[int, object]:
+        """Deletes one-time tokens of `kind` that expired or were used before `before` (see delete_chunk)."""
+        model = _MODELS[kind]
+        condition = or_(model.expires_at < before, model.used_at < before)
+        return await delete_chunk(self.db, model, condition, after_id=after_id, limit=limit)
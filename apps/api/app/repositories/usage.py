@@ -0,0 +1,128 @@
+import re
+from datetime import date, datetime, timedelta, timezone
+
+from sqlalchemy import case, delete, func, literal, literal_column, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.usage_log import UsageLog
+from app.models.usage_rollup import UsageRollup
+
+_PARTITION_RE = re.compile(r"^usage_logs_p(\d{8})$")
+GRANULARITIES = ("hour", "day")
+
+
+def partition_name(day: date) -> str:
+    return f"usage_logs_p{day:%Y%m%d}"
+
+
+def is_usage_partition(table_name: str) -> bool:
+    """Daily partitions and the default partition are managed here, not by the ORM metadata."""
+    return table_name == "usage_logs_default" or bool(_PARTITION_RE.match(table_name))
+
+
+def _day_start(day: date) -> datetime:
+    return datetime(day.year, day.month, day.day, tzinfo=timezone.utc)
+
+
+class UsageRepository:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def rollup(self, granularity: str, start: datetime, end: datetime) -> int:
+        """
+        (Re)computes rollups for buckets in [start, end) from the raw rows.
+        Idempotent: buckets are overwritten, so late-arriving log rows are picked up on the next run.
+        """
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"unknown granularity {granularity!r}")
+        # Inlined so SELECT and GROUP BY render the identical expression.
+        bucket = func.date_trunc(literal_column(f"'{granularity}'"), UsageLog.timestamp)
+        latency = UsageLog.response_time
+        source = (
+            select(
+                literal(granularity),
+                bucket,
+                UsageLog.user_id,
+                UsageLog.endpoint,
+                func.count(),
+                func.count(case((UsageLog.status_code >= 400, 1))),
+                func.sum(latency),
+                func.percentile_cont(0.5).within_group(latency),
+                func.percentile_cont(0.95).within_group(latency),
+                func.percentile_cont(0.99).within_group(latency),
+                func.max(latency),
+            )
+            .where(UsageLog.timestamp >= start, UsageLog.timestamp < end)
+            .group_by(bucket, UsageLog.user_id, UsageLog.endpoint)
+        )
+        columns = ["granularity", "bucket_start", "user_id", "endpoint", "request_count", "error_count", "total_ms", "p50_ms", "p95_ms", "p99_ms", "max_ms"]
+        stmt = insert(UsageRollup).from_select(columns, source)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["granularity", "bucket_start", "user_id", "endpoint"],
+            set_={c: stmt.excluded[c] for c in columns[4:]},
+        )
+        res = await self.db.execute(stmt)
+        await self.db.commit()
+        return res.rowcount or 0
+
+    async def list_rollups(self, *, granularity: str, start: datetime, end: datetime, user_id=None, endpoint: str | None = None, limit: int = 5000):
+        q = select(UsageRollup).where(
+            UsageRollup.granularity == granularity,
+            UsageRollup.bucket_start >= start,
+            UsageRollup.bucket_start < end,
+        )
+        if user_id is not None:
+            q = q.where(UsageRollup.user_id == user_id)
+        if endpoint is not None:
+            q = q.where(UsageRollup.endpoint == endpoint)
+        res = await self.db.execute(q.order_by(UsageRollup.bucket_start, UsageRollup.endpoint).limit(limit))
+        return list(res.scalars().all())
+
+    async def purge_rollups(self, granularity: str, before: datetime) -> int:
+        res = await self.db.execute(
+            delete(UsageRollup).where(UsageRollup.granularity == granularity, UsageRollup.bucket_start < before)
+        )
+        await self.db.commit()
+        return res.rowcount or 0
+
+    async def list_partitions(self) -> list[str]:
+        res = await self.db.execute(
+            text(
+                "SELECT c.relname FROM pg_inherits i "
+                "JOIN pg_class c ON c.oid = i.inhrelid JOIN pg_class p ON p.oid = i.inhparent "
+                "WHERE p.relname = 'usage_logs'"
+            )
+        )
+        return [row[0] for row in res.all()]
+
+    async def ensure_partitions(self, first_day: date, days: int) -> list[str]:
+        """Creates missing daily partitions for [first_day, first_day + days)."""
+        existing = set(await self.list_partitions())
+        created = []
+        for offset in range(days):
+            day = first_day + timedelta(days=offset)
+            name = partition_name(day)
+            if name in existing:
+                continue
+            await self.db.execute(
+                text(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF usage_logs "
+                    f"FOR VALUES FROM ('{_day_start(day).isoformat()}') TO ('{_day_start(day + timedelta(days=1)).isoformat()}')"
+                )
+            )
+            created.append(name)
+        await self.db.commit()
+        return created
+
+    async def drop_partitions_before(self, cutoff: date) -> list[str]:
+        """Drops whole daily partitions that end on or before cutoff, and prunes the default partition."""
+        dropped = []
+        for name in await self.list_partitions():
+            m = _PARTITION_RE.match(name)
+            if m and datetime.strptime(m.group(1), "%Y%m%d").date() < cutoff:
+                await self.db.execute(text(f"DROP TABLE IF EXISTS {name}"))
+                dropped.append(name)
+        await self.db.execute(text("DELETE FROM usage_logs_default WHERE timestamp < :cutoff"), {"cutoff": _day_start(cutoff)})
+        await self.db.commit()
+        return dropped
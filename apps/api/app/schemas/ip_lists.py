@@ -0,0 +1,17 @@
+import uuid
+from datetime import datetime
+
+from pydantic import BaseModel, Field
+
+
+class IPListEntryCreate(BaseModel):
+    ip: str = Field(min_length=2, max_length=64, description="Address or CIDR network")
+
+
+class IPListEntryOut(BaseModel):
+    model_config = {"from_attributes": True}
+
+    id: uuid.UUID
+    user_id: uuid.UUID | None
+    ip: str
+    created_at: datetime
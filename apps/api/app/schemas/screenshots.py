@@ -25,3 +25,19 @@ class ScreenshotOut(BaseModel):
   status: str
   created_at: datetime
 
+
+
+class SimilarScreenshotOut(BaseModel):
+  screenshot: ScreenshotOut
+  distance: int  # Hamming distance between the dHashes, 0-64
+
+
+class ImageVariantOut(BaseModel):
+  width: int
+  height: int
+  url: str
+
+
+class ScreenshotSrcsetOut(BaseModel):
+  srcset: str  # ready for <img srcset>: "url 320w, url 720w, ..."
+  images: list[ImageVariantOut]  # narrowest first; the last one is the full-size image
@@ -0,0 +1,19 @@
+import uuid
+from datetime import datetime
+
+from pydantic import BaseModel
+
+
+class UsageBucketOut(BaseModel):
+    model_config = {"from_attributes": True}
+
+    bucket_start: datetime
+    user_id: uuid.UUID
+    endpoint: str
+    request_count: int
+    error_count: int
+    total_ms: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    max_ms: float
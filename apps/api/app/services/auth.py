@@ -1,19 +1,20 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.exceptions import http_error
-from app.core.security import create_access_token, hash_password, verify_password
+from app.core.security import create_access_token, hash_password_async, verify_and_update_password_async
 from app.repositories.users import UsersRepository
 
 
 class AuthService:
     def __init__(self, db: AsyncSession):
+        self.db = db
         self.users = UsersRepository(db)
 
     async def register(self, *, email: str, password: str):
         existing = await self.users.get_by_email(email)
         if existing:
             raise http_error(409, "Email already registered")
-        user = await self.users.create(email=email, password_hash=hash_password(password))
+        user = await self.users.create(email=email, password_hash=await hash_password_async(password))
         token = create_access_token(str(user.id), extra_claims={"role": user.role})
         return user, token
 
@@ -21,8 +22,12 @@ class AuthService:
         user = await self.users.get_by_email(email)
         if not user:
             raise http_error(401, "Invalid credentials")
-        if not verify_password(password, user.password_hash):
+        valid, new_hash = await verify_and_update_password_async(password, user.password_hash)
+        if not valid:
             raise http_error(401, "Invalid credentials")
+        if new_hash:
+            user.password_hash = new_hash
+            await self.db.commit()
         token = create_access_token(str(user.id), extra_claims={"role": user.role})
         return user, token
 
@@ -7,7 +7,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
 from app.core.exceptions import http_error
-from app.core.security import create_access_token, hash_password, verify_password
+from app.core.security import create_access_token, hash_password_async, verify_and_update_password_async
 from app.models.user import User
 from app.repositories.sessions import SessionsRepository
 from app.repositories.tokens import TokensRepository
@@ -32,7 +32,7 @@ class EnterpriseAuthService:
         existing = await self.users.get_by_email(email)
         if existing:
             raise http_error(409, "Email already registered")
-        user = await self.users.create(email=email, password_hash=hash_password(password))
+        user = await self.users.create(email=email, password_hash=await hash_password_async(password))
         # Issue email verification token
         await self.issue_email_verification(user)
         token = create_access_token(str(user.id), extra_claims={"role": user.role})
@@ -76,7 +76,7 @@ class EnterpriseAuthService:
         user = await self.users.get_by_id(t.user_id)
         if not user:
             raise http_error(404, "User not found")
-        user.password_hash = hash_password(new_password)
+        user.password_hash = await hash_password_async(new_password)
         user.failed_login_attempts = 0
         user.locked_until = None
         await self.db.commit()
@@ -99,7 +99,8 @@ class EnterpriseAuthService:
         if user.locked_until and user.locked_until > self._now():
             raise http_error(429, "Account temporarily locked. Try again later.")
 
-        if not verify_password(password, user.password_hash):
+        valid, new_hash = await verify_and_update_password_async(password, user.password_hash)
+        if not valid:
             user.failed_login_attempts += 1
             if user.failed_login_attempts >= settings.LOGIN_MAX_ATTEMPTS:
                 user.locked_until = self._now() + timedelta(minutes=settings.LOGIN_LOCK_MINUTES)
@@ -116,12 +117,11 @@ class EnterpriseAuthService:
             if not totp.verify(totp_code, valid_window=1):
                 raise http_error(401, "Invalid MFA code")
 
+        if new_hash:
+            user.password_hash = new_hash
         user.failed_login_attempts = 0
         user.locked_until = None
         user.last_login_at = self._now()
-        await self.db.commit()
-
-        access = create_access_token(str(user.id), extra_claims={"role": user.role})
 
         refresh_raw = new_token()
         refresh_hash = sha256_hex(refresh_raw)
@@ -132,39 +132,28 @@ class EnterpriseAuthService:
             ip=ip,
             user_agent=user_agent,
             device_fingerprint=device_fingerprint,
+            commit=False,
         )
+        # User update and session insert go out in a single transaction.
+        await self.db.commit()
 
+        access = create_access_token(str(user.id), extra_claims={"role": user.role})
         return user, access, refresh_raw
 
     async def refresh(self, refresh_token: str, device_fingerprint: str | None) -> tuple[str, str]:
-        refresh_hash = sha256_hex(refresh_token)
-        session = await self.sessions.get_by_refresh_hash(refresh_hash)
-        if not session or session.revoked_at is not None or session.expires_at < self._now():
-            raise http_error(401, "Invalid refresh token")
-
-        user = await self.users.get_by_id(session.user_id)
-        if not user:
-            raise http_error(401, "Invalid refresh token")
-
-        # Optional device binding
-        if session.device_fingerprint and device_fingerprint and session.device_fingerprint != device_fingerprint:
-            raise http_error(401, "Invalid refresh token")
-
-        # Rotate refresh token
-        await self.sessions.revoke(session)
-
+        # Rotate refresh token: revoke + reissue in one transaction (optional device binding enforced in SQL).
         new_refresh = new_token()
-        new_refresh_hash = sha256_hex(new_refresh)
-        await self.sessions.create(
-            user_id=user.id,
-            refresh_token_hash=new_refresh_hash,
+        rotated = await self.sessions.rotate(
+            refresh_token_hash=sha256_hex(refresh_token),
+            new_refresh_token_hash=sha256_hex(new_refresh),
             expires_at=self._refresh_exp(),
-            ip=session.ip,
-            user_agent=session.user_agent,
-            device_fingerprint=session.device_fingerprint,
+            device_fingerprint=device_fingerprint,
         )
+        if rotated is None:
+            raise http_error(401, "Invalid refresh token")
+        user_id, role, _ = rotated
 
-        access = create_access_token(str(user.id), extra_claims={"role": user.role})
+        access = create_access_token(str(user_id), extra_claims={"role": role})
         return access, new_refresh
 
     async def logout(self, refresh_token: str) -> None:
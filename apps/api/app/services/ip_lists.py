@@ -0,0 +1,44 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.exceptions import http_error
+from app.middleware.ip_filter import ip_filter, publish_ip_list_change
+from app.repositories.ip_lists import IPListsRepository
+from app.utils.cidr import parse_network
+
+
+class IPListsService:
+    """Writes allow/deny entries and notifies every API process so their filters update in place."""
+
+    def __init__(self, db: AsyncSession):
+        self.repo = IPListsRepository(db)
+
+    def _normalize_list(self, list_name: str) -> None:
+        if list_name not in ("allow", "deny"):
+            raise http_error(400, "Unknown IP list")
+
+    def _normalize(self, list_name: str, ip: str) -> str:
+        self._normalize_list(list_name)
+        try:
+            return str(parse_network(ip))
+        except ValueError:
+            raise http_error(400, "Invalid IP address or CIDR")
+
+    async def entries(self, *, list_name: str, user_id=None):
+        self._normalize_list(list_name)
+        return await self.repo.list_for_owner(list_name, user_id)
+
+    async def add(self, *, list_name: str, ip: str, user_id=None):
+        network = self._normalize(list_name, ip)
+        entry = await self.repo.add(list_name=list_name, ip=network, user_id=user_id)
+        change = {"op": "add", "list": list_name, "ip": network, "user_id": str(user_id) if user_id else None}
+        ip_filter.apply_change(change)
+        await publish_ip_list_change(change)
+        return entry
+
+    async def remove(self, *, list_name: str, ip: str, user_id=None) -> int:
+        network = self._normalize(list_name, ip)
+        removed = await self.repo.remove(list_name=list_name, ip=network, user_id=user_id)
+        change = {"op": "remove", "list": list_name, "ip": network, "user_id": str(user_id) if user_id else None}
+        ip_filter.apply_change(change)
+        await publish_ip_list_change(change)
+        return removed
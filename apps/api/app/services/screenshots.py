@@ -1,8 +1,64 @@
+from __future__ import annotations
+
+import builtins
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core.config import settings
+from app.models.screenshot import Screenshot
+from app.processing.phash import to_unsigned
 from app.repositories.screenshots import ScreenshotsRepository
 
 
+@dataclass
+class ScrapeDiff:
+    """
+    A fresh scrape against the user's current screenshots of the same app and platform.
+    - added: new rows for URLs not seen before (to process)
+    - removed: rows whose URL is gone from the store listing (now SUPERSEDED)
+    - unchanged: rows whose URL is still listed; retried is the subset queued again (FAILED, or
+      stuck in QUEUED/PROCESSING, see is_stale)
+    """
+
+    added: list[Screenshot] = field(default_factory=list)
+    removed: list[Screenshot] = field(default_factory=list)
+    unchanged: list[Screenshot] = field(default_factory=list)
+    retried: list[Screenshot] = field(default_factory=list)
+
+
+def diff_urls(fresh: list[str], current: list[Screenshot]) -> tuple[list[str], list[Screenshot], list[Screenshot]]:
+    """
+    (added URLs in scrape order, removed rows, unchanged rows in scrape order).
+    current is newest first; when a URL has several rows (from before scrapes were incremental),
+    the newest one is kept and the older ones count as removed.
+    """
+    fresh = list(dict.fromkeys(fresh))
+    by_url: dict[str, Screenshot] = {}
+    removed = []
+    for s in current:
+        if s.url in by_url:
+            removed.append(s)
+        else:
+            by_url[s.url] = s
+    listed = set(fresh)
+    removed += [s for url, s in by_url.items() if url not in listed]
+    added = [url for url in fresh if url not in by_url]
+    unchanged = [by_url[url] for url in fresh if url in by_url]
+    return added, removed, unchanged
+
+
+def is_stale(s: Screenshot, now: datetime) -> bool:
+    """QUEUED/PROCESSING without a change for SCREENSHOT_STALE_SECONDS and no retry still pending."""
+    if s.status not in ("QUEUED", "PROCESSING") or s.updated_at is None:
+        return False
+    if s.updated_at > now - timedelta(seconds=settings.SCREENSHOT_STALE_SECONDS):
+        return False
+    next_at = ((s.meta or {}).get("retry") or {}).get("next_at")
+    return next_at is None or next_at <= now.timestamp()
+
+
 class ScreenshotsService:
     def __init__(self, db: AsyncSession):
         self.repo = ScreenshotsRepository(db)
@@ -10,9 +66,31 @@ class ScreenshotsService:
     async def create(self, *, user_id, app_id: str, platform: str, url: str, metadata: dict):
         return await self.repo.create(user_id=user_id, app_id=app_id, platform=platform, url=url, metadata=metadata)
 
+    # Annotations below use builtins.list: inside this class, "list" is this method.
     async def list(self, user_id):
         return await self.repo.list_for_user(user_id)
 
     async def get(self, user_id, screenshot_id):
         return await self.repo.get_for_user(user_id, screenshot_id)
 
+    async def similar(self, user_id, screenshot_id, *, max_distance: int, limit: int) -> builtins.list[tuple[Screenshot, int]] | None:
+        """Near-duplicates of one of the user's screenshots; None when it has no hash (yet)."""
+        s = await self.repo.get_for_user(user_id, screenshot_id)
+        if not s or s.dhash is None:
+            return None
+        return await self.repo.find_similar(user_id, to_unsigned(s.dhash), max_distance=max_distance, limit=limit, exclude_id=s.id)
+
+    async def sync_app(self, *, user_id, app_id: str, platform: str, urls: builtins.list[str], metadata: dict) -> ScrapeDiff:
+        """
+        Applies a scrape incrementally: creates rows only for new URLs, supersedes vanished ones and
+        queues FAILED or stale rows again.
+        """
+        current = await self.repo.list_current_for_app(user_id, app_id, platform)
+        added_urls, removed, unchanged = diff_urls(urls, current)
+        diff = ScrapeDiff(removed=removed, unchanged=unchanged)
+        diff.added = await self.repo.create_many(user_id=user_id, app_id=app_id, platform=platform, urls=added_urls, metadata=metadata)
+        await self.repo.set_status_many([s.id for s in removed], "SUPERSEDED")
+        now = datetime.now(timezone.utc)
+        diff.retried = [s for s in unchanged if s.status == "FAILED" or is_stale(s, now)]
+        await self.repo.set_status_many([s.id for s in diff.retried], "QUEUED")
+        return diff
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import io
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 
 import boto3
@@ -38,6 +39,18 @@ def upload_bytes(key: str, data: bytes, content_type: str) -> UploadResult:
     return UploadResult(key=key, url=url)
 
 
+def get_bytes(key: str) -> bytes | None:
+    """The object's body, or None if the key doesn't exist."""
+    if not settings.STORAGE_BUCKET:
+        raise RuntimeError("Missing STORAGE_BUCKET")
+    c = _client()
+    try:
+        obj = c.get_object(Bucket=settings.STORAGE_BUCKET, Key=key)
+    except c.exceptions.NoSuchKey:
+        return None
+    return obj["Body"].read()
+
+
 def presign_get(key: str) -> str:
     if not settings.STORAGE_BUCKET:
         raise RuntimeError("Missing STORAGE_BUCKET")
@@ -48,3 +61,78 @@ def presign_get(key: str) -> str:
         ExpiresIn=settings.PRESIGN_EXPIRES_SECONDS,
     )
 
+
+def object_urls(keys: list[str]) -> list[str]:
+    """Public URLs when STORAGE_PUBLIC_BASE_URL is set, else presigned GETs (signed with one client)."""
+    if settings.STORAGE_PUBLIC_BASE_URL:
+        base = settings.STORAGE_PUBLIC_BASE_URL.rstrip("/")
+        return [f"{base}/{key}" for key in keys]
+    if not settings.STORAGE_BUCKET:
+        raise RuntimeError("Missing STORAGE_BUCKET")
+    c = _client()
+    return [
+        c.generate_presigned_url(
+            "get_object", Params={"Bucket": settings.STORAGE_BUCKET, "Key": key}, ExpiresIn=settings.PRESIGN_EXPIRES_SECONDS
+        )
+        for key in keys
+    ]
+
+
+def object_url(key: str) -> str:
+    return object_urls([key])[0]
+
+
+def _list(c, prefix: str) -> list[str]:
+    keys: list[str] = []
+    for page in c.get_paginator("list_objects_v2").paginate(Bucket=settings.STORAGE_BUCKET, Prefix=prefix):
+        keys.extend(obj["Key"] for obj in page.get("Contents", []))
+    return keys
+
+
+def list_keys(prefix: str) -> list[str]:
+    """Every key under prefix (paginated ListObjectsV2)."""
+    if not settings.STORAGE_BUCKET:
+        raise RuntimeError("Missing STORAGE_BUCKET")
+    return _list(_client(), prefix)
+
+
+def list_keys_many(prefixes: list[str], max_workers: int) -> dict[str, list[str] | None]:
+    """
+    list_keys for each prefix, with one shared client and at most max_workers listings in flight.
+    A prefix whose listing failed maps to None.
+    """
+    if not settings.STORAGE_BUCKET:
+        raise RuntimeError("Missing STORAGE_BUCKET")
+    prefixes = list(dict.fromkeys(prefixes))
+    if not prefixes:
+        return {}
+    c = _client()
+
+    def one(prefix: str) -> list[str] | None:
+        try:
+            return _list(c, prefix)
+        except Exception:
+            return None
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(prefixes)))) as pool:
+        return dict(zip(prefixes, pool.map(one, prefixes)))
+
+
+# S3 DeleteObjects accepts at most 1000 keys per request.
+DELETE_BATCH_SIZE = 1000
+
+
+def delete_objects(keys: list[str]) -> list[str]:
+    """Deletes keys with batched multi-object deletes; returns the keys S3 reported as failed."""
+    if not settings.STORAGE_BUCKET:
+        raise RuntimeError("Missing STORAGE_BUCKET")
+    c = _client()
+    failed: list[str] = []
+    for i in range(0, len(keys), DELETE_BATCH_SIZE):
+        batch = keys[i : i + DELETE_BATCH_SIZE]
+        res = c.delete_objects(
+            Bucket=settings.STORAGE_BUCKET,
+            Delete={"Objects": [{"Key": k} for k in batch], "Quiet": True},
+        )
+        failed.extend(err["Key"] for err in res.get("Errors", []))
+    return failed
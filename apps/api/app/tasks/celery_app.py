@@ -1,5 +1,6 @@
 from celery import Celery
 from celery.schedules import crontab
+from celery.signals import worker_process_init, worker_process_shutdown
 from kombu import Exchange, Queue
 
 from app.core.config import settings
@@ -7,7 +8,13 @@ from app.core.config import settings
 broker = settings.CELERY_BROKER_URL or settings.REDIS_URL or "redis://localhost:6379/0"
 backend = settings.CELERY_RESULT_BACKEND or settings.REDIS_URL or "redis://localhost:6379/0"
 
-celery_app = Celery("getappshots", broker=broker, backend=backend)
+celery_app = Celery(
+    "getappshots",
+    broker=broker,
+    backend=backend,
+    # Workers are started with -A app.tasks.celery_app.celery_app, so task modules are listed here.
+    include=["app.tasks.screenshot_tasks", "app.tasks.usage_tasks", "app.tasks.maintenance_tasks"],
+)
 celery_app.conf.update(
     task_serializer="json",
     result_serializer="json",
@@ -31,6 +38,52 @@ celery_app.conf.beat_schedule = {
     "cleanup-old-screenshots": {
         "task": "cleanup_old_files",
         "schedule": crontab(minute=0, hour=3),  # daily 03:00
-    }
+        "options": {"queue": "low"},
+    },
+    "usage-rollup-hourly": {
+        "task": "rollup_usage_hourly",
+        "schedule": crontab(minute=5),  # hourly, after the hour closes
+        "options": {"queue": "low"},
+    },
+    "usage-rollup-daily": {
+        "task": "rollup_usage_daily",
+        "schedule": crontab(minute=20, hour=0),
+        "options": {"queue": "low"},
+    },
+    "usage-log-maintenance": {
+        "task": "maintain_usage_logs",
+        "schedule": crontab(minute=40, hour=2),
+        "options": {"queue": "low"},
+    },
+    "dispatch-screenshots": {
+        "task": "dispatch_screenshots",
+        "schedule": settings.SCHEDULER_TICK_SECONDS,
+        # Ahead of any backlog; a tick that can't run promptly is superseded by the next one.
+        "options": {"queue": "urgent", "expires": settings.SCHEDULER_TICK_SECONDS},
+    },
+    "backfill-dhash": {
+        "task": "backfill_dhash",
+        "schedule": crontab(minute=30, hour=4),
+        "options": {"queue": "low"},
+    },
+    "purge-expired-auth-rows": {
+        "task": "purge_expired_auth_rows",
+        "schedule": crontab(minute=15),  # hourly keeps each run short
+        "options": {"queue": "low"},
+    },
 }
 
+
+# Each prefork child shares its metrics (threads don't survive fork, so start after it).
+@worker_process_init.connect
+def _start_metrics_pusher(**_kwargs):
+    from app.monitoring.aggregation import start_metrics_pusher
+
+    start_metrics_pusher()
+
+
+@worker_process_shutdown.connect
+def _stop_metrics_pusher(**_kwargs):
+    from app.monitoring.aggregation import stop_metrics_pusher
+
+    stop_metrics_pusher()
@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+from app.monitoring.metrics import metrics
+
+
+def enqueue_screenshots(items: list[tuple[str, int | None]], *, tenant_id, tier: str | None, batch_id: str | None = None) -> bool:
+    """
+    Queues (screenshot_id, idx) pairs for processing on behalf of one tenant.
+    Queues: urgent (enterprise) | normal (pro) | low (free), released fairly across tenants by
+    app.tasks.scheduler; dead-letter queue: dead (jobs that failed permanently or ran out of
+    retries, see app.processing.retry_policy; no worker consumes it).
+    Sent by task name, so API processes load the Celery app (on first use) but never the task
+    modules and their image/storage dependencies.
+    Returns False (and counts enqueue.failed) when the broker couldn't take the jobs; the rows stay
+    QUEUED, and the next scrape of the app re-queues them once they are stale.
+    """
+    try:
+        from app.tasks.scheduler import scheduler
+
+        scheduler.submit([[sid, batch_id, idx] for sid, idx in items], tenant=str(tenant_id), tier=tier)
+    except Exception:
+        metrics.incr("enqueue.failed", len(items))
+        return False
+    return True
+
+
+def enqueue_screenshot_processing(screenshot_id: str, *, tenant_id, tier: str | None, batch_id: str | None = None, idx: int | None = None) -> bool:
+    return enqueue_screenshots([(screenshot_id, idx)], tenant_id=tenant_id, tier=tier, batch_id=batch_id)
@@ -0,0 +1,57 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.monitoring.metrics import metrics
+from app.repositories.sessions import SessionsRepository
+from app.repositories.tokens import TokensRepository
+from app.tasks.celery_app import celery_app
+
+
+async def _purge_table(name: str, purge_chunk, deadline: float) -> int:
+    """Runs purge_chunk(after_id=...) until the table is exhausted or the time budget is spent."""
+    total, after_id = 0, None
+    while True:
+        start = time.perf_counter()
+        deleted, after_id = await purge_chunk(after_id=after_id)
+        metrics.observe(f"purge.{name}.chunk", (time.perf_counter() - start) * 1000.0, is_error=False)
+        metrics.incr(f"purge.{name}.rows", deleted)
+        total += deleted
+        if after_id is None or time.monotonic() >= deadline:
+            return total
+        await asyncio.sleep(settings.AUTH_PURGE_PAUSE_SECONDS)
+
+
+@celery_app.task(name="purge_expired_auth_rows")
+def purge_expired_auth_rows():
+    """
+    Deletes sessions and one-time tokens that expired, were revoked or were used more than
+    AUTH_PURGE_GRACE_HOURS ago, AUTH_PURGE_CHUNK_SIZE rows per transaction.
+    Stops after AUTH_PURGE_MAX_SECONDS; the next run starts over and picks up the rest.
+    """
+    before = datetime.now(timezone.utc) - timedelta(hours=settings.AUTH_PURGE_GRACE_HOURS)
+    limit = settings.AUTH_PURGE_CHUNK_SIZE
+    deadline = time.monotonic() + settings.AUTH_PURGE_MAX_SECONDS
+
+    async def _run():
+        async with SessionLocal() as db:
+            sessions, tokens = SessionsRepository(db), TokensRepository(db)
+            return {
+                "sessions": await _purge_table(
+                    "sessions", lambda after_id: sessions.purge_chunk(before=before, after_id=after_id, limit=limit), deadline
+                ),
+                "email_verification_tokens": await _purge_table(
+                    "email_verification_tokens",
+                    lambda after_id: tokens.purge_chunk("email_verification", before=before, after_id=after_id, limit=limit),
+                    deadline,
+                ),
+                "password_reset_tokens": await _purge_table(
+                    "password_reset_tokens",
+                    lambda after_id: tokens.purge_chunk("password_reset", before=before, after_id=after_id, limit=limit),
+                    deadline,
+                ),
+            }
+
+    return asyncio.run(_run())
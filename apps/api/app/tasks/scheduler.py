@@ -0,0 +1,257 @@
+from __future__ import annotations
+
+import json
+import time
+
+from app.core.config import settings
+from app.monitoring.metrics import metrics
+
+# Paid tiers get their own queues; workers consume all three.
+TIER_QUEUES = {"enterprise": "urgent", "pro": "normal", "free": "low"}
+# Priority order: higher tiers spend their share of each release round first.
+TIERS = ("enterprise", "pro", "free")
+# Aging promotes a waiting job one step along this path per SCHEDULER_AGING_SECONDS.
+QUEUE_ORDER = ("low", "normal", "urgent")
+PREFIX = "sched"
+# Histograms per tier, all in ms: "staged" (scheduler wait), "queue_wait" (enqueue -> worker start),
+# "latency" (enqueue -> done).
+METRIC_NAMES = ("staged", "queue_wait", "latency")
+
+# ARGV: prefix, tier, tenant, "head"|"tail", job...
+_STAGE_LUA = """
+local prefix, tier, tenant = ARGV[1], ARGV[2], ARGV[3]
+local jobs = prefix .. ':jobs:' .. tier .. ':' .. tenant
+for i = 5, #ARGV do
+  if ARGV[4] == 'head' then redis.call('LPUSH', jobs, ARGV[i]) else redis.call('RPUSH', jobs, ARGV[i]) end
+end
+if redis.call('SADD', prefix .. ':active:' .. tier, tenant) == 1 then
+  redis.call('RPUSH', prefix .. ':ring:' .. tier, tenant)
+end
+return redis.call('LLEN', jobs)
+"""
+
+# Weighted release across tiers (deficit round robin), round-robin across each tier's tenants (one
+# job per tenant per turn), while the queues together hold fewer than the depth limit.
+# Each round grants every tier with staged jobs its weight in credits; tiers spend them in priority
+# order, one credit per job. Credits persist between calls, so single-slot dispatches keep the ratio.
+# ARGV: prefix, now, aging_seconds, max_jobs, depth, n_tiers, (tier, base queue index, weight)..., queue...
+# Returns a flat list of job, queue pairs.
+_DISPATCH_LUA = """
+local prefix, now, aging, max_jobs = ARGV[1], tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+local depth, n_tiers = tonumber(ARGV[5]), tonumber(ARGV[6])
+local tiers = {}
+for t = 0, n_tiers - 1 do
+  local i = 7 + 3 * t
+  table.insert(tiers, {name = ARGV[i], base = tonumber(ARGV[i + 1]), weight = tonumber(ARGV[i + 2])})
+end
+local queues = {}
+local room = depth
+for i = 7 + 3 * n_tiers, #ARGV do
+  table.insert(queues, ARGV[i])
+  room = room - redis.call('LLEN', ARGV[i])
+end
+local credits_key = prefix .. ':credits'
+local function staged(tier)
+  return redis.call('LLEN', prefix .. ':ring:' .. tier.name) > 0
+end
+for _, tier in ipairs(tiers) do
+  tier.credit = tonumber(redis.call('HGET', credits_key, tier.name) or '0')
+  if not staged(tier) then tier.credit = 0 end
+end
+
+-- Next job of the tier's first tenant in line, or nil once the tier has nothing staged.
+local function pop(tier)
+  local ring, active = prefix .. ':ring:' .. tier.name, prefix .. ':active:' .. tier.name
+  while true do
+    local tenant = redis.call('LINDEX', ring, 0)
+    if not tenant then return nil end
+    local jobs = prefix .. ':jobs:' .. tier.name .. ':' .. tenant
+    local raw = redis.call('LPOP', jobs)
+    redis.call('LPOP', ring)
+    if redis.call('LLEN', jobs) > 0 then
+      redis.call('RPUSH', ring, tenant)
+    else
+      redis.call('SREM', active, tenant)
+    end
+    if raw then return raw end
+  end
+end
+
+local out = {}
+while room > 0 and #out < 2 * max_jobs do
+  local pending = false
+  for _, tier in ipairs(tiers) do
+    while tier.credit >= 1 and room > 0 and #out < 2 * max_jobs do
+      local raw = pop(tier)
+      if not raw then
+        tier.credit = 0
+        break
+      end
+      local idx = tier.base
+      if aging > 0 then
+        idx = math.min(#queues, tier.base + math.floor(math.max(0, now - cjson.decode(raw).ts) / aging))
+      end
+      table.insert(out, raw)
+      table.insert(out, queues[idx])
+      tier.credit = tier.credit - 1
+      room = room - 1
+    end
+    if tier.credit >= 1 then pending = true end
+  end
+  if not pending then
+    -- Round over: a new one for every tier that still has staged jobs.
+    local any = false
+    for _, tier in ipairs(tiers) do
+      if staged(tier) then
+        tier.credit = tier.credit + tier.weight
+        any = true
+      end
+    end
+    if not any then break end
+  end
+end
+for _, tier in ipairs(tiers) do
+  redis.call('HSET', credits_key, tier.name, tier.credit)
+end
+return out
+"""
+
+
+def tier_queue(tier: str | None) -> str:
+    return TIER_QUEUES.get((tier or "free").lower(), "low")
+
+
+def tier_weights() -> dict[str, int]:
+    """SCHEDULER_TIER_WEIGHTS as {tier: weight}; unknown tiers are ignored, missing ones weigh 1."""
+    weights = dict.fromkeys(TIERS, 1)
+    for part in settings.SCHEDULER_TIER_WEIGHTS.split(","):
+        tier, _, weight = part.partition(":")
+        tier = tier.strip().lower()
+        if tier in weights and weight.strip().isdigit():
+            weights[tier] = max(1, int(weight))
+    return weights
+
+
+def metric_key(name: str, tier: str | None) -> str:
+    return f"scheduler.{name} {(tier or 'free').lower()}"
+
+
+class FairScheduler:
+    """
+    Tenant-fair release of screenshot jobs into the Celery queues.
+    - jobs are staged per tenant in Redis (the broker's Redis, so queue depth can be read atomically)
+    - dispatch() releases them round-robin across tenants, only while the three queues together hold
+      fewer than SCHEDULER_QUEUE_DEPTH messages; the backlog stays staged, where one tenant's burst
+      can't sit in front of everyone else's jobs
+    - while several tiers have staged jobs, releases are split by SCHEDULER_TIER_WEIGHTS (6:3:1 by
+      default). Workers take from every non-empty queue in turn, so the release ratio is what sets
+      each tier's share of worker time
+    - a job staged for SCHEDULER_AGING_SECONDS moves up one queue per interval, so free-tier work
+      still finishes under sustained paid load
+    dispatch() runs after every submit, after every finished job and on a beat tick. Without a Redis
+    broker, or if Redis fails, jobs go straight to their tier's queue.
+    """
+
+    def __init__(self):
+        self._redis = None
+        self._stage = None
+        self._dispatch = None
+
+    def _client(self):
+        if self._redis is None:
+            from app.tasks.celery_app import broker
+
+            if not settings.SCHEDULER_ENABLED or not broker.startswith(("redis://", "rediss://")):
+                return None
+            import redis
+
+            self._redis = redis.Redis.from_url(broker, decode_responses=True)
+            self._stage = self._redis.register_script(_STAGE_LUA)
+            self._dispatch = self._redis.register_script(_DISPATCH_LUA)
+        return self._redis
+
+    def _send(self, job: dict, queue: str) -> None:
+        from app.tasks.celery_app import celery_app
+
+        celery_app.send_task(
+            "process_screenshot",
+            args=job["args"],
+            kwargs={"tier": job["tier"], "enqueued_at": job["ts"]},
+            queue=queue,
+        )
+
+    def submit(self, args_list: list[list], *, tenant: str, tier: str | None) -> None:
+        """Stages one job per args list ([screenshot_id, batch_id, idx]) for tenant, then dispatches."""
+        tier = (tier or "free").lower()
+        if tier not in TIER_QUEUES:
+            tier = "free"
+        now = time.time()
+        jobs = [{"args": args, "tier": tier, "tenant": tenant, "ts": now} for args in args_list]
+        if not jobs:
+            return
+        try:
+            if self._client() is None:
+                raise LookupError("no scheduler backend")
+            self._stage(args=[PREFIX, tier, tenant, "tail", *(json.dumps(j) for j in jobs)])
+        except Exception:
+            for job in jobs:
+                self._send(job, tier_queue(tier))
+            return
+        self.dispatch()
+
+    def dispatch(self) -> int:
+        """Releases what fits into the queues now; returns the number of jobs sent."""
+        try:
+            if self._client() is None:
+                return 0
+            now = time.time()
+            args = [
+                PREFIX,
+                now,
+                settings.SCHEDULER_AGING_SECONDS,
+                settings.SCHEDULER_DISPATCH_BATCH,
+                settings.SCHEDULER_QUEUE_DEPTH,
+                len(TIERS),
+            ]
+            weights = tier_weights()
+            for tier in TIERS:
+                args += [tier, QUEUE_ORDER.index(TIER_QUEUES[tier]) + 1, weights[tier]]
+            args += QUEUE_ORDER
+            released = self._dispatch(args=args)
+        except Exception:
+            return 0
+        sent = 0
+        for raw, queue in zip(released[::2], released[1::2]):
+            job = json.loads(raw)
+            try:
+                self._send(job, queue)
+            except Exception:
+                # Back to the front of the tenant's line; the next dispatch retries it.
+                try:
+                    self._stage(args=[PREFIX, job["tier"], job["tenant"], "head", raw])
+                except Exception:
+                    pass
+                continue
+            sent += 1
+            metrics.observe(metric_key("staged", job["tier"]), (now - job["ts"]) * 1000.0, is_error=False)
+        return sent
+
+    def backlog(self) -> dict[str, dict[str, int]]:
+        """Staged jobs and tenants with staged jobs, per tier."""
+        out = {tier: {"tenants": 0, "jobs": 0} for tier in TIERS}
+        try:
+            r = self._client()
+            if r is None:
+                return out
+            for tier in TIERS:
+                tenants = r.lrange(f"{PREFIX}:ring:{tier}", 0, -1)
+                pipe = r.pipeline()
+                for tenant in tenants:
+                    pipe.llen(f"{PREFIX}:jobs:{tier}:{tenant}")
+                out[tier] = {"tenants": len(tenants), "jobs": sum(pipe.execute()) if tenants else 0}
+        except Exception:
+            pass
+        return out
+
+
+scheduler = FairScheduler()
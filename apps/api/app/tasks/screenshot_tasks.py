@@ -1,8 +1,11 @@
 import asyncio
 import io
 import json
+import time
+import uuid
 from dataclasses import asdict
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+from typing import Any
 
 import httpx
 from PIL import Image
@@ -11,9 +14,17 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import settings
 from app.db.session import SessionLocal
+from app.monitoring.metrics import metrics
+from app.monitoring.stages import StageTimer, source_host
+from app.processing.circuit_breaker import circuit_breaker
+from app.processing.host_limits import host_limiter
+from app.processing.phash import bands, dhash, to_signed
+from app.processing.retry_policy import PermanentError, decide, is_origin_failure, retry_after_seconds
+from app.processing.transforms import derived_prefix
 from app.repositories.screenshots import ScreenshotsRepository
-from app.storage.s3 import presign_get, upload_bytes
+from app.storage.s3 import delete_objects, get_bytes, list_keys_many, object_url, upload_bytes
 from app.tasks.celery_app import celery_app
+from app.tasks.scheduler import metric_key, scheduler
 
 
 async def _publish_progress(batch_id: str, payload: dict):
@@ -27,66 +38,195 @@ async def _publish_progress(batch_id: str, payload: dict):
         return
 
 
-async def _download(url: str) -> bytes:
-    async with httpx.AsyncClient(timeout=30) as client:
-        r = await client.get(url)
-        r.raise_for_status()
-        ct = r.headers.get("content-type", "")
-        if ct and "image" not in ct:
-            raise RuntimeError("Not an image response")
-        content = r.content
-        if len(content) < 1024:
-            raise RuntimeError("Image too small")
-        return content
+async def _download(url: str, r=None) -> bytes:
+    """
+    Fetches within the source host's circuit breaker and adaptive concurrency limit (both shared
+    through Redis when r is given).
+    """
+    host = source_host(url)
+    await circuit_breaker.check(host, r)
+    try:
+        async with host_limiter.slot(host, r) as slot:
+            async with httpx.AsyncClient(timeout=30) as client:
+                try:
+                    resp = await client.get(url)
+                except httpx.TimeoutException:
+                    slot.throttled()
+                    raise
+            if resp.status_code == 429 or resp.status_code >= 500:
+                slot.throttled(retry_after_seconds(resp.headers.get("retry-after")))
+            resp.raise_for_status()
+            # The origin coped; whether the body is usable doesn't change the host's limit.
+            slot.ok()
+    except (httpx.TransportError, httpx.HTTPStatusError) as e:
+        await circuit_breaker.record(host, not is_origin_failure(e), r)
+        raise
+    await circuit_breaker.record(host, True, r)
+    ct = resp.headers.get("content-type", "")
+    if ct and "image" not in ct:
+        raise PermanentError("Not an image response")
+    content = resp.content
+    if len(content) < 1024:
+        raise PermanentError("Image too small")
+    return content
+
+
+THUMB_BOX = (512, 512)
+
+
+def _thumb_dhash(data: bytes) -> int:
+    """
+    The dHash of an encoded thumbnail. New uploads and the backfill both hash the stored WebP bytes:
+    hashing the pre-encoding pixels instead would differ by a few bits from what the backfill can read.
+    """
+    with Image.open(io.BytesIO(data)) as im:
+        return dhash(im)
+
+
+def _variant_widths() -> list[int]:
+    return [int(w) for w in settings.SCREENSHOT_VARIANT_WIDTHS.split(",") if w.strip()]
+
 
+def _to_webp_and_thumb(
+    image_bytes: bytes, timer: StageTimer | None = None, widths: list[int] | None = None
+) -> tuple[bytes, bytes, dict[str, Any], dict[int, bytes]]:
+    """
+    Everything from one decode: the full-size WebP, a WebP per variant width (SCREENSHOT_VARIANT_WIDTHS
+    by default; only widths narrower than the original), the 512 px thumbnail and the dHash.
+    Each variant is downscaled from the previous, larger one and the thumbnail from the smallest one
+    that still covers it, so no resize reads the full-size image more than once.
+    Returns (webp, thumb, meta, {width: variant webp}); meta["variants"] has each variant's size.
+    """
+    timer = timer or StageTimer()
+    with timer.stage("decode"):
+        im = Image.open(io.BytesIO(image_bytes)).convert("RGBA")
+    meta: dict[str, Any] = {"width": im.width, "height": im.height, "format": "webp"}
 
-def _to_webp_and_thumb(image_bytes: bytes) -> tuple[bytes, bytes, dict]:
-    im = Image.open(io.BytesIO(image_bytes)).convert("RGBA")
-    meta = {"width": im.width, "height": im.height, "format": "webp"}
+    with timer.stage("encode_webp"):
+        out_webp = io.BytesIO()
+        im.save(out_webp, format="WEBP", quality=85, method=6)
 
-    out_webp = io.BytesIO()
-    im.save(out_webp, format="WEBP", quality=85, method=6)
+    scale = min(THUMB_BOX[0] / im.width, THUMB_BOX[1] / im.height, 1.0)
+    thumb_w, thumb_h = round(im.width * scale), round(im.height * scale)
+    source = thumb_source = im
+    variants: dict[int, bytes] = {}
+    meta["variants"] = []
+    with timer.stage("variants"):
+        for width in sorted(set(widths if widths is not None else _variant_widths()), reverse=True):
+            if width >= source.width:
+                continue
+            # Height from the original's aspect ratio, so rounding doesn't drift from step to step.
+            source = source.resize((width, max(1, round(im.height * width / im.width))), Image.Resampling.LANCZOS)
+            out = io.BytesIO()
+            source.save(out, format="WEBP", quality=80, method=6)
+            variants[width] = out.getvalue()
+            meta["variants"].append({"width": source.width, "height": source.height})
+            if source.width >= thumb_w and source.height >= thumb_h:
+                thumb_source = source
 
-    thumb = im.copy()
-    thumb.thumbnail((512, 512))
-    out_thumb = io.BytesIO()
-    thumb.save(out_thumb, format="WEBP", quality=80, method=6)
+    with timer.stage("thumbnail"):
+        thumb = thumb_source.copy()
+        thumb.thumbnail(THUMB_BOX)
+        out_thumb = io.BytesIO()
+        thumb.save(out_thumb, format="WEBP", quality=80, method=6)
 
-    return out_webp.getvalue(), out_thumb.getvalue(), meta
+    # From the thumbnail: the hash only needs 9x8 pixels, and this skips a second full-size pass.
+    with timer.stage("phash"):
+        meta["dhash"] = f"{_thumb_dhash(out_thumb.getvalue()):016x}"
 
+    return out_webp.getvalue(), out_thumb.getvalue(), meta, variants
 
-@celery_app.task(name="process_screenshot", autoretry_for=(Exception,), retry_backoff=True, retry_kwargs={"max_retries": 5})
-def process_screenshot(screenshot_id: str, batch_id: str | None = None, idx: int | None = None):
+
+def _dead_letter(screenshot_id: str, batch_id: str | None, idx: int | None, kwargs: dict, decision, error: str) -> None:
+    """
+    Parks the job on the dead queue with why it gave up, in the message headers; replaying is moving
+    the message back to a live queue. Workers must not consume dead (keep it out of their -Q list),
+    or the job would run, fail and be parked again forever.
+    """
+    metrics.incr(f"retry.dead_lettered.{decision.kind}")
+    try:
+        celery_app.send_task(
+            "process_screenshot",
+            args=[screenshot_id, batch_id, idx],
+            kwargs=kwargs,
+            queue="dead",
+            headers={"dead_letter": {"kind": decision.kind, "reason": decision.reason, "error": error, "ts": time.time()}},
+        )
+    except Exception:
+        # The screenshot is already FAILED with the error in meta; only the replayable copy is lost.
+        return
+
+
+@celery_app.task(name="process_screenshot", max_retries=None)
+def process_screenshot(
+    screenshot_id: str,
+    batch_id: str | None = None,
+    idx: int | None = None,
+    tier: str | None = None,
+    enqueued_at: float | None = None,
+    failures: int = 0,
+):
     """
     Download -> optimize (WebP) -> thumbnail -> upload -> update DB.
     Publishes progress events to Redis pubsub if configured.
+    Stage timings and byte counts go to meta["stages"] and the pipeline.* histograms
+    (the final DB commit is only in the histograms, as it can't record itself).
+    tier/enqueued_at come from the scheduler and feed the per-tier scheduler.* histograms.
+    Failures go through app.processing.retry_policy: transient ones are retried with backoff (the
+    screenshot goes back to QUEUED, meta["retry"] says why), permanent ones and exhausted retries
+    mark it FAILED once and park the job on the dead queue. failures counts transient failures so
+    far; Celery's retry count also includes circuit-breaker deferrals.
     """
+    retries = process_screenshot.request.retries or 0
+    deferrals = max(0, retries - failures)
+    if enqueued_at is not None and retries == 0:
+        metrics.observe(metric_key("queue_wait", tier), (time.time() - enqueued_at) * 1000.0, is_error=False)
+    decision = None
 
-    async def _run():
+    async def _run(r):
+        nonlocal decision
         async with SessionLocal() as db:  # type: AsyncSession
             repo = ScreenshotsRepository(db)
-            s = await repo.update_status(screenshot_id, "PROCESSING")
+            s = await repo.claim_for_processing(screenshot_id)
             if not s:
+                metrics.incr("pipeline.skipped")
                 return
 
+            timer = StageTimer()
+            host = source_host(s.url)
             try:
-                raw = await _download(s.url)
-                webp, thumb, meta = _to_webp_and_thumb(raw)
+                with timer.stage("download"):
+                    raw = await _download(s.url, r)
+                timer.add_bytes("download", len(raw))
+                webp, thumb, meta, variants = _to_webp_and_thumb(raw, timer)
+                timer.add_bytes("webp", len(webp))
+                timer.add_bytes("thumb", len(thumb))
+                timer.add_bytes("variants", sum(len(v) for v in variants.values()))
 
                 prefix = f"screenshots/{s.user_id}/{s.id}"
                 webp_key = f"{prefix}/image.webp"
                 thumb_key = f"{prefix}/thumb.webp"
-                upload_bytes(webp_key, webp, "image/webp")
-                upload_bytes(thumb_key, thumb, "image/webp")
+                with timer.stage("upload"):
+                    upload_bytes(webp_key, webp, "image/webp")
+                    upload_bytes(thumb_key, thumb, "image/webp")
+                    for variant in meta["variants"]:
+                        variant["key"] = f"{prefix}/w{variant['width']}.webp"
+                        upload_bytes(variant["key"], variants[variant["width"]], "image/webp")
 
                 # Presigned URLs for private buckets
-                webp_url = settings.STORAGE_PUBLIC_BASE_URL and f"{settings.STORAGE_PUBLIC_BASE_URL.rstrip('/')}/{webp_key}" or presign_get(webp_key)
-                thumb_url = settings.STORAGE_PUBLIC_BASE_URL and f"{settings.STORAGE_PUBLIC_BASE_URL.rstrip('/')}/{thumb_key}" or presign_get(thumb_key)
+                webp_url = object_url(webp_key)
+                thumb_url = object_url(thumb_key)
 
                 # Persist to metadata column (meta is aliased to "metadata" in DB)
-                s.meta = {**(s.meta or {}), **meta, "webp_key": webp_key, "thumb_key": thumb_key, "webp_url": webp_url, "thumb_url": thumb_url}  # type: ignore[attr-defined]
+                base = {k: v for k, v in (s.meta or {}).items() if k != "retry"}
+                s.meta = {**base, **meta, "webp_key": webp_key, "thumb_key": thumb_key, "webp_url": webp_url, "thumb_url": thumb_url, "stages": timer.compact()}  # type: ignore[attr-defined]
+                h = int(meta["dhash"], 16)
+                s.dhash = to_signed(h)
+                s.dhash_b0, s.dhash_b1, s.dhash_b2, s.dhash_b3 = bands(h)
                 s.status = "COMPLETE"
-                await db.commit()
+                with timer.stage("db_commit"):
+                    await db.commit()
+                timer.report(s.platform, host)
 
                 if batch_id:
                     await _publish_progress(
@@ -99,9 +239,22 @@ def process_screenshot(screenshot_id: str, batch_id: str | None = None, idx: int
                         },
                     )
             except Exception as e:
+                decision = decide(e, failures=failures, deferrals=deferrals)
+                metrics.incr(f"retry.{decision.kind}")
+                if not decision.final:
+                    s.status = "QUEUED"
+                    s.meta = {  # type: ignore[attr-defined]
+                        **(s.meta or {}),
+                        "retry": {"kind": decision.kind, "reason": decision.reason, "error": str(e), "retries": retries + 1, "next_at": time.time() + decision.delay},
+                        "stages": timer.compact(),
+                    }
+                    await db.commit()
+                    timer.report(s.platform, host)
+                    raise
                 s.status = "FAILED"
-                s.meta = {**(s.meta or {}), "error": str(e)}  # type: ignore[attr-defined]
+                s.meta = {**(s.meta or {}), "error": str(e), "retry": {"kind": decision.kind, "reason": decision.reason, "retries": retries}, "stages": timer.compact()}  # type: ignore[attr-defined]
                 await db.commit()
+                timer.report(s.platform, host)
                 if batch_id:
                     await _publish_progress(
                         batch_id,
@@ -115,22 +268,195 @@ def process_screenshot(screenshot_id: str, batch_id: str | None = None, idx: int
                     )
                 raise
 
-    asyncio.run(_run())
+    async def _main():
+        r = redis.from_url(settings.REDIS_URL, encoding="utf-8", decode_responses=True) if settings.REDIS_URL else None
+        try:
+            await _run(r)
+        finally:
+            if r is not None:
+                await r.close()
+
+    kwargs = {"tier": tier, "enqueued_at": enqueued_at, "failures": failures}
+    try:
+        asyncio.run(_main())
+    except Exception as e:
+        # Failures before the screenshot was loaded (e.g. the database) have no decision yet.
+        decision = decision or decide(e, failures=failures, deferrals=deferrals)
+        if not decision.final:
+            if decision.kind == "transient":
+                kwargs["failures"] = failures + 1
+            raise process_screenshot.retry(exc=e, countdown=decision.delay, kwargs=kwargs)
+        if enqueued_at is not None:
+            metrics.observe(metric_key("latency", tier), (time.time() - enqueued_at) * 1000.0, is_error=True)
+        _dead_letter(screenshot_id, batch_id, idx, kwargs, decision, str(e))
+        raise
+    else:
+        if enqueued_at is not None:
+            metrics.observe(metric_key("latency", tier), (time.time() - enqueued_at) * 1000.0, is_error=False)
+    finally:
+        # This worker slot is free again: release the next fair share of staged jobs.
+        scheduler.dispatch()
+
+
+@celery_app.task(name="dispatch_screenshots")
+def dispatch_screenshots():
+    """Beat tick for the scheduler: applies aging and recovers from missed dispatches."""
+    return scheduler.dispatch()
+
+
+CLEANUP_CHECKPOINT_KEY = "cleanup:screenshots:after_id"
+
+
+def retention_days(tier: str) -> int:
+    tier = (tier or "free").lower()
+    if tier == "enterprise":
+        return settings.SCREENSHOT_RETENTION_DAYS_ENTERPRISE
+    if tier == "pro":
+        return settings.SCREENSHOT_RETENTION_DAYS_PRO
+    return settings.SCREENSHOT_RETENTION_DAYS_FREE
+
+
+def _storage_keys(meta: dict | None) -> list[str]:
+    """Every object key recorded in a screenshot's metadata (webp_key, thumb_key, ..., variants[].key)."""
+    meta = meta or {}
+    keys = [v for k, v in meta.items() if k.endswith("_key") and isinstance(v, str)]
+    variants = meta.get("variants")
+    if isinstance(variants, list):
+        keys += [v["key"] for v in variants if isinstance(v, dict) and isinstance(v.get("key"), str)]
+    return keys
+
+
+def _derived_prefix(meta: dict | None) -> str | None:
+    """Folder of the screenshot's cached transforms (see app.processing.transforms), if it has any."""
+    webp_key = (meta or {}).get("webp_key")
+    return derived_prefix(webp_key) if isinstance(webp_key, str) else None
+
+
+async def _derived_keys(rows: list) -> list[list[str] | None]:
+    """Cached transforms of each row, listed with one client and bounded concurrency; None where listing failed."""
+    prefixes = [_derived_prefix(meta) for _, meta in rows]
+    wanted = [p for p in prefixes if p is not None]
+    try:
+        listed = await asyncio.to_thread(list_keys_many, wanted, settings.CLEANUP_LIST_CONCURRENCY) if wanted else {}
+    except Exception:
+        return [None if p is not None else [] for p in prefixes]
+    return [[] if p is None else listed.get(p) for p in prefixes]
+
+
+async def _cleanup_expired(repo: ScreenshotsRepository, cutoffs: dict, *, after_id, r=None) -> dict:
+    """
+    Walks expired screenshots in primary key chunks:
+    storage objects first (batched DeleteObjects), including the cached transforms under the
+    screenshot's derived/ folder, then the rows whose objects are all gone.
+    Rows with a failed listing or object delete stay for the next pass. The cursor is checkpointed in Redis
+    after every chunk, so an interrupted run resumes where it stopped.
+    """
+    totals = {"rows": 0, "objects": 0, "failed_objects": 0, "complete": False}
+    deadline = time.monotonic() + settings.CLEANUP_MAX_SECONDS
+    while True:
+        rows = await repo.list_expired(cutoffs, after_id=after_id, limit=settings.CLEANUP_CHUNK_SIZE)
+        derived = await _derived_keys(rows)
+        row_keys = [_storage_keys(meta) + (extra or []) for (_, meta), extra in zip(rows, derived)]
+        keys = [k for ks in row_keys for k in ks]
+        failed = set(await asyncio.to_thread(delete_objects, keys)) if keys else set()
+        done = [sid for (sid, _), ks, extra in zip(rows, row_keys, derived) if extra is not None and not failed.intersection(ks)]
+        deleted = await repo.delete_many(done)
+
+        totals["rows"] += deleted
+        totals["objects"] += len(keys) - len(failed)
+        totals["failed_objects"] += len(failed)
+        metrics.incr("cleanup.screenshots.rows", deleted)
+        metrics.incr("cleanup.screenshots.objects", len(keys) - len(failed))
+
+        after_id = rows[-1][0] if len(rows) == settings.CLEANUP_CHUNK_SIZE else None
+        if r is not None:
+            try:
+                if after_id is None:
+                    await r.delete(CLEANUP_CHECKPOINT_KEY)
+                else:
+                    await r.set(CLEANUP_CHECKPOINT_KEY, str(after_id), ex=7 * 24 * 3600)
+            except Exception:
+                pass
+        if after_id is None:
+            totals["complete"] = True
+            return totals
+        if time.monotonic() >= deadline:
+            return totals
+        await asyncio.sleep(settings.CLEANUP_PAUSE_SECONDS)
 
 
 @celery_app.task(name="cleanup_old_files")
 def cleanup_old_files():
-    # Placeholder: implement lifecycle rules at bucket level in production.
-    return {"ok": True}
+    """Deletes screenshots (objects and rows) past their owner's tier retention."""
+    if not settings.STORAGE_BUCKET:
+        return {"skipped": "STORAGE_BUCKET not set"}
+    now = datetime.now(timezone.utc)
+    cutoffs = {}
+    for tier in ("free", "pro", "enterprise"):
+        days = retention_days(tier)
+        cutoffs[tier] = now - timedelta(days=days) if days > 0 else None
+
+    async def _run():
+        r = redis.from_url(settings.REDIS_URL, encoding="utf-8", decode_responses=True) if settings.REDIS_URL else None
+        after_id = None
+        try:
+            if r is not None:
+                try:
+                    raw = await r.get(CLEANUP_CHECKPOINT_KEY)
+                    after_id = uuid.UUID(raw) if raw else None
+                except Exception:
+                    after_id = None
+            async with SessionLocal() as db:
+                return await _cleanup_expired(ScreenshotsRepository(db), cutoffs, after_id=after_id, r=r)
+        finally:
+            if r is not None:
+                await r.close()
+
+    return asyncio.run(_run())
 
 
-def enqueue_screenshot_processing(screenshot_id: str, *, batch_id: str | None = None, idx: int | None = None, priority: str = "normal"):
+async def _backfill_dhash(repo: ScreenshotsRepository, *, deadline: float) -> dict:
     """
-    Priority queues: urgent | normal | low
-    Dead-letter queue: dead (handled by Celery retry/max_retries + routing in infra)
+    Hashes the stored thumbnails of COMPLETE screenshots processed before dHashes existed, in
+    primary key chunks. Rows whose thumbnail is missing or unreadable are counted and skipped.
     """
-    try:
-        process_screenshot.apply_async(args=[screenshot_id, batch_id, idx], queue=priority)
-    except Exception:
-        return
+    totals = {"hashed": 0, "skipped": 0, "complete": False}
+    after_id = None
+    while True:
+        rows = await repo.list_unhashed(after_id=after_id, limit=settings.DHASH_BACKFILL_CHUNK_SIZE)
+        hashes = {}
+        for sid, meta in rows:
+            key = (meta or {}).get("thumb_key")
+            try:
+                data = await asyncio.to_thread(get_bytes, key) if key else None
+                if data is not None:
+                    hashes[sid] = await asyncio.to_thread(_thumb_dhash, data)
+            except Exception:
+                pass
+        totals["hashed"] += await repo.set_dhashes(hashes)
+        totals["skipped"] += len(rows) - len(hashes)
+        metrics.incr("backfill.dhash.rows", len(hashes))
+
+        if len(rows) < settings.DHASH_BACKFILL_CHUNK_SIZE:
+            totals["complete"] = True
+            return totals
+        after_id = rows[-1][0]
+        if time.monotonic() >= deadline:
+            return totals
+
+
+@celery_app.task(name="backfill_dhash")
+def backfill_dhash():
+    """
+    Fills dhash for screenshots processed before it was computed (re-scrapes don't reprocess them).
+    Stops after DHASH_BACKFILL_MAX_SECONDS; the next run picks up the rest. Cheap once done.
+    """
+    if not settings.STORAGE_BUCKET:
+        return {"skipped": "STORAGE_BUCKET not set"}
+    deadline = time.monotonic() + settings.DHASH_BACKFILL_MAX_SECONDS
+
+    async def _run():
+        async with SessionLocal() as db:
+            return await _backfill_dhash(ScreenshotsRepository(db), deadline=deadline)
 
+    return asyncio.run(_run())
@@ -0,0 +1,61 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.repositories.usage import UsageRepository
+from app.tasks.celery_app import celery_app
+
+
+def _floor_hour(ts: datetime) -> datetime:
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+
+@celery_app.task(name="rollup_usage_hourly")
+def rollup_usage_hourly():
+    """Recomputes the last USAGE_ROLLUP_LOOKBACK_HOURS complete hours of per-user/endpoint rollups."""
+    end = _floor_hour(datetime.now(timezone.utc))
+    start = end - timedelta(hours=settings.USAGE_ROLLUP_LOOKBACK_HOURS)
+
+    async def _run():
+        async with SessionLocal() as db:
+            return await UsageRepository(db).rollup("hour", start, end)
+
+    return {"buckets": asyncio.run(_run()), "start": start.isoformat(), "end": end.isoformat()}
+
+
+@celery_app.task(name="rollup_usage_daily")
+def rollup_usage_daily():
+    """
+    Daily rollups come from the raw rows (percentiles can't be merged from hourly ones).
+    Yesterday and the day before are recomputed, so a missed run heals itself.
+    """
+    end = _floor_hour(datetime.now(timezone.utc)).replace(hour=0)
+    start = end - timedelta(days=2)
+
+    async def _run():
+        async with SessionLocal() as db:
+            return await UsageRepository(db).rollup("day", start, end)
+
+    return {"buckets": asyncio.run(_run()), "start": start.isoformat(), "end": end.isoformat()}
+
+
+@celery_app.task(name="maintain_usage_logs")
+def maintain_usage_logs():
+    """
+    - creates daily usage_logs partitions USAGE_LOG_PARTITIONS_AHEAD_DAYS ahead
+    - drops raw partitions past USAGE_LOG_RETENTION_DAYS (rollups are kept)
+    - prunes hourly rollups past USAGE_ROLLUP_HOURLY_RETENTION_DAYS
+    """
+    now = datetime.now(timezone.utc)
+    today = now.date()
+
+    async def _run():
+        async with SessionLocal() as db:
+            repo = UsageRepository(db)
+            created = await repo.ensure_partitions(today, settings.USAGE_LOG_PARTITIONS_AHEAD_DAYS + 1)
+            dropped = await repo.drop_partitions_before(today - timedelta(days=settings.USAGE_LOG_RETENTION_DAYS))
+            purged = await repo.purge_rollups("hour", now - timedelta(days=settings.USAGE_ROLLUP_HOURLY_RETENTION_DAYS))
+            return {"created": created, "dropped": dropped, "hourly_rollups_purged": purged}
+
+    return asyncio.run(_run())
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import ipaddress
+
+IPAddress = ipaddress.IPv4Address | ipaddress.IPv6Address
+
+
+def parse_network(value: str) -> ipaddress.IPv4Network | ipaddress.IPv6Network:
+    """Accepts a bare address or CIDR; host bits are masked off (10.0.0.1/8 -> 10.0.0.0/8)."""
+    net = ipaddress.ip_network(value.strip(), strict=False)
+    if isinstance(net, ipaddress.IPv6Network) and net.prefixlen >= 96 and net.network_address.ipv4_mapped is not None:
+        mapped = net.network_address.ipv4_mapped
+        return ipaddress.ip_network(f"{mapped}/{net.prefixlen - 96}")
+    return net
+
+
+def parse_address(value: str) -> IPAddress:
+    addr = ipaddress.ip_address(value)
+    if isinstance(addr, ipaddress.IPv6Address) and addr.ipv4_mapped is not None:
+        return addr.ipv4_mapped
+    return addr
+
+
+class CIDRTrie:
+    """
+    Binary prefix trie over IPv4 and IPv6 networks.
+    - contains() walks at most one node per address bit (32 / 128), however many networks are stored
+    - add()/remove() are incremental, so change notifications don't require a rebuild
+    Nodes are [child0, child1, terminal] lists to keep them small.
+    """
+
+    def __init__(self):
+        self._roots: dict[int, list] = {4: [None, None, False], 6: [None, None, False]}
+        self._size = 0
+
+    def add(self, network: str) -> None:
+        net = parse_network(network)
+        node = self._roots[net.version]
+        bits, width = int(net.network_address), net.max_prefixlen
+        for i in range(net.prefixlen):
+            bit = (bits >> (width - 1 - i)) & 1
+            if node[bit] is None:
+                node[bit] = [None, None, False]
+            node = node[bit]
+        if not node[2]:
+            node[2] = True
+            self._size += 1
+
+    def remove(self, network: str) -> bool:
+        net = parse_network(network)
+        node = self._roots[net.version]
+        bits, width = int(net.network_address), net.max_prefixlen
+        path = []
+        for i in range(net.prefixlen):
+            bit = (bits >> (width - 1 - i)) & 1
+            if node[bit] is None:
+                return False
+            path.append((node, bit))
+            node = node[bit]
+        if not node[2]:
+            return False
+        node[2] = False
+        self._size -= 1
+        # Prune branches that no longer lead to any network.
+        for parent, bit in reversed(path):
+            child = parent[bit]
+            if child[0] is None and child[1] is None and not child[2]:
+                parent[bit] = None
+            else:
+                break
+        return True
+
+    def contains(self, address: IPAddress) -> bool:
+        """True if any stored network covers the address."""
+        node = self._roots[address.version]
+        if node[2]:
+            return True
+        bits, width = int(address), address.max_prefixlen
+        for i in range(width):
+            node = node[(bits >> (width - 1 - i)) & 1]
+            if node is None:
+                return False
+            if node[2]:
+                return True
+        return False
+
+    def __len__(self) -> int:
+        return self._size
@@ -0,0 +1,88 @@
+"""
+Refresh-token rotation throughput against a real Postgres.
+
+Point DATABASE_URL at a scratch database (tables are created if missing), then:
+
+    python -m benchmarks.bench_refresh --clients 50 --seconds 10
+
+Each simulated client holds one refresh token and rotates it in a loop, one DB session
+per refresh (as a request would), and the script reports refreshes/s and latency percentiles.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import math
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from app.db.base import Base
+from app.db.session import SessionLocal, engine
+from app.models.session import Session
+from app.models.user import User
+from app.services.auth_enterprise import EnterpriseAuthService
+from app.utils.tokens import new_token, sha256_hex
+
+
+async def _seed(clients: int) -> tuple[uuid.UUID, list[str]]:
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    user_id = uuid.uuid4()
+    tokens = [new_token() for _ in range(clients)]
+    expires_at = datetime.now(timezone.utc) + timedelta(days=1)
+    async with SessionLocal() as db:
+        db.add(User(id=user_id, email=f"bench-{user_id}@example.com", password_hash="!", email_verified=True))
+        await db.flush()
+        for raw in tokens:
+            db.add(Session(user_id=user_id, refresh_token_hash=sha256_hex(raw), expires_at=expires_at))
+        await db.commit()
+    return user_id, tokens
+
+
+async def _cleanup(user_id: uuid.UUID) -> None:
+    async with SessionLocal() as db:
+        await db.execute(Session.__table__.delete().where(Session.user_id == user_id))
+        await db.execute(User.__table__.delete().where(User.id == user_id))
+        await db.commit()
+
+
+async def _client(token: str, deadline: float, latencies: list[float]) -> None:
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        async with SessionLocal() as db:
+            _, token = await EnterpriseAuthService(db).refresh(token, None)
+        latencies.append((time.perf_counter() - start) * 1000.0)
+
+
+def _pct(sorted_values: list[float], p: float) -> float:
+    idx = max(0, min(len(sorted_values) - 1, int(math.ceil(p * len(sorted_values))) - 1))
+    return sorted_values[idx]
+
+
+async def main(clients: int, seconds: float) -> None:
+    user_id, tokens = await _seed(clients)
+    latencies: list[float] = []
+    try:
+        started = time.perf_counter()
+        deadline = started + seconds
+        await asyncio.gather(*(_client(t, deadline, latencies) for t in tokens))
+        elapsed = time.perf_counter() - started
+    finally:
+        await _cleanup(user_id)
+        await engine.dispose()
+
+    latencies.sort()
+    print(f"clients={clients} refreshes={len(latencies)} elapsed={elapsed:.2f}s")
+    print(f"throughput={len(latencies) / elapsed:.1f} refresh/s")
+    if latencies:
+        print(f"p50={_pct(latencies, 0.50):.2f}ms p95={_pct(latencies, 0.95):.2f}ms p99={_pct(latencies, 0.99):.2f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    args = parser.parse_args()
+    asyncio.run(main(args.clients, args.seconds))
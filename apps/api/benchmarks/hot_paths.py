@@ -0,0 +1,284 @@
+"""
+Offline micro-benchmarks for code that runs on every request or every screenshot.
+
+No network, Redis or Postgres is needed: Redis is forced off (the in-memory fallbacks are measured),
+scrapers parse the recorded fixtures in tests/fixtures, and images are synthesised in memory.
+
+    python -m benchmarks.hot_paths                  # run and print
+    python -m benchmarks.hot_paths --save           # record benchmarks/baseline.json
+    python -m benchmarks.hot_paths --compare        # exit 1 if anything is slower than the baseline allows
+    python -m benchmarks.hot_paths --only image --compare --tolerance 0.15
+
+Each benchmark is timed over several repeats of enough loops to fill --min-time; the best repeat
+is compared against the baseline, since it is the least disturbed by other load on the machine.
+Baselines are only meaningful on the machine (and Python) that recorded them.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable
+
+from app.core.config import settings
+
+# Offline: the Redis-backed paths fall back to their in-process implementations.
+settings.REDIS_URL = None
+settings.METRICS_AGGREGATION = "off"
+
+from app.middleware import api_key_auth  # noqa: E402
+from app.middleware.api_key_auth import token_bucket_allow  # noqa: E402
+from app.middleware.rate_limit import RateLimitMiddleware  # noqa: E402
+from app.monitoring.metrics import MetricsStore  # noqa: E402
+from app.processing.scrapers import parse_app_store_lookup, parse_play_store_html  # noqa: E402
+from app.tasks.screenshot_tasks import _to_webp_and_thumb  # noqa: E402
+from benchmarks.standins import IMAGE_SIZES, screenshot_png  # noqa: E402
+
+HERE = Path(__file__).resolve().parent
+FIXTURES = HERE.parent / "tests" / "fixtures"
+DEFAULT_BASELINE = HERE / "baseline.json"
+
+@dataclass
+class Bench:
+    name: str
+    fn: Callable[[], Any]
+    is_async: bool = False
+    repeat: int = 5
+
+
+def _image_benches() -> list[Bench]:
+    out = []
+    for name, (w, h) in IMAGE_SIZES.items():
+        png = screenshot_png(w, h)
+        # Same work as before srcset variants existed, so older baselines still compare.
+        out.append(Bench(f"image.webp_thumb[{name} {w}x{h}]", lambda png=png: _to_webp_and_thumb(png, widths=[]), repeat=3))
+        out.append(Bench(f"image.webp_variants[{name} {w}x{h}]", lambda png=png: _to_webp_and_thumb(png), repeat=3))
+    return out
+
+
+def _scraper_benches() -> list[Bench]:
+    lookup = (FIXTURES / "appstore_lookup.json").read_text()
+    html = (FIXTURES / "playstore_details.html").read_text()
+    return [
+        Bench("scrapers.parse_app_store_lookup", lambda: parse_app_store_lookup("284882215", json.loads(lookup))),
+        Bench("scrapers.parse_play_store_html", lambda: parse_play_store_html("com.example.notes", html)),
+    ]
+
+
+def _rate_limit_benches() -> list[Bench]:
+    keys = [f"tb:{i}" for i in range(1000)]
+    counter = iter(range(10**12))
+    limiter = RateLimitMiddleware(None, requests_per_minute=10**9)
+    minute = int(time.time() // 60)
+    rl_keys = [f"rl:10.0.{i // 256}.{i % 256}:GET:/api/v1/screenshots:{minute}" for i in range(1000)]
+
+    async def bucket():
+        # Rate high enough that no key ever runs dry, so every call takes the allow path.
+        await token_bucket_allow(keys[next(counter) % 1000], 10**9)
+
+    async def fixed_window():
+        await limiter._allow(rl_keys[next(counter) % 1000])
+
+    api_key_auth._mem.clear()
+    api_key_auth._leases.clear()
+    return [
+        Bench("rate_limit.token_bucket_allow", bucket, is_async=True),
+        Bench("rate_limit.RateLimitMiddleware._allow", fixed_window, is_async=True),
+    ]
+
+
+def _metrics_benches() -> list[Bench]:
+    rnd = random.Random(1)
+    routes = [f"GET /api/v1/route{i}/{{id}} {s}xx" for i in range(50) for s in (2, 4)]
+    latencies = [rnd.lognormvariate(3, 1) for _ in range(4096)]
+    observe_store = MetricsStore(max_series=500)
+    counter = iter(range(10**12))
+
+    def observe():
+        i = next(counter)
+        observe_store.observe(routes[i % len(routes)], latencies[i % 4096], is_error=False)
+
+    snapshot_store = MetricsStore(max_series=500)
+    for i in range(200 * 500):
+        snapshot_store.observe(f"GET /api/v1/route{i % 200}/{{id}} 2xx", latencies[i % 4096], is_error=i % 97 == 0)
+
+    return [
+        Bench("metrics.observe", observe),
+        Bench("metrics.snapshot[200 series]", snapshot_store.snapshot, repeat=3),
+    ]
+
+
+async def _asgi_get(app, path: str) -> int:
+    """Drives one GET through an ASGI app with no client or transport in between."""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"bench")],
+        "client": ("10.0.0.1", 40000),
+        "server": ("bench", 80),
+    }
+    status = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+def _middleware_benches() -> list[Bench]:
+    from fastapi import FastAPI
+
+    from app.main import create_app
+
+    full = create_app()
+    bare = FastAPI()
+
+    @bare.get("/health")
+    def health():
+        return {"ok": True}
+
+    async def full_stack():
+        await _asgi_get(full, "/health")
+
+    async def bare_app():
+        await _asgi_get(bare, "/health")
+
+    # The difference between the two is the middleware stack's per-request overhead.
+    return [
+        Bench("http.health[bare app]", bare_app, is_async=True),
+        Bench("http.health[full middleware stack]", full_stack, is_async=True),
+    ]
+
+
+GROUPS = {
+    "image": _image_benches,
+    "scrapers": _scraper_benches,
+    "rate_limit": _rate_limit_benches,
+    "metrics": _metrics_benches,
+    "http": _middleware_benches,
+}
+
+
+def _time_loops(bench: Bench, loops: int) -> float:
+    if bench.is_async:
+
+        async def run() -> float:
+            fn = bench.fn
+            start = time.perf_counter()
+            for _ in range(loops):
+                await fn()
+            return time.perf_counter() - start
+
+        return asyncio.run(run())
+    fn = bench.fn
+    start = time.perf_counter()
+    for _ in range(loops):
+        fn()
+    return time.perf_counter() - start
+
+
+def measure(bench: Bench, min_time: float) -> dict:
+    """Seconds per call: loops are doubled until one repeat takes min_time, then repeated."""
+    loops = 1
+    while True:
+        elapsed = _time_loops(bench, loops)
+        if elapsed >= min_time or loops >= 1 << 20:
+            break
+        loops *= 2 if elapsed <= 0 else max(2, min(10, int(min_time / elapsed) + 1))
+    per_call = [elapsed / loops] + [_time_loops(bench, loops) / loops for _ in range(bench.repeat - 1)]
+    return {"best_s": min(per_call), "median_s": statistics.median(per_call), "loops": loops, "repeat": len(per_call)}
+
+
+def _fmt(seconds: float) -> str:
+    for unit, scale in (("s", 1.0), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:8.2f} {unit}"
+    return f"{seconds / 1e-9:8.0f} ns"
+
+
+def _environment() -> dict:
+    return {"python": platform.python_version(), "machine": platform.machine(), "system": platform.system()}
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Names of benchmarks whose best time exceeds the baseline's by more than tolerance."""
+    regressions = []
+    for name, res in results.items():
+        base = baseline.get(name)
+        if base and res["best_s"] > base["best_s"] * (1.0 + tolerance):
+            regressions.append(name)
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", action="append", default=[], help="run benchmarks whose name contains this (repeatable)")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per repeat")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save", action="store_true", help="write results as the new baseline")
+    parser.add_argument("--compare", action="store_true", help="fail on regressions against the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown as a fraction (0.25 = 25%%)")
+    args = parser.parse_args()
+
+    baseline: dict = {}
+    if args.compare:
+        if not args.baseline.exists():
+            print(f"no baseline at {args.baseline}; run with --save first", file=sys.stderr)
+            return 2
+        saved = json.loads(args.baseline.read_text())
+        if saved.get("environment") != _environment():
+            print(f"warning: baseline recorded on {saved.get('environment')}, running on {_environment()}", file=sys.stderr)
+        baseline = saved.get("results", {})
+
+    results = {}
+    for group, build in GROUPS.items():
+        benches = [b for b in build() if not args.only or any(o in b.name for o in args.only)]
+        for bench in benches:
+            res = measure(bench, args.min_time)
+            results[bench.name] = res
+            line = f"{bench.name:45} best {_fmt(res['best_s'])}  median {_fmt(res['median_s'])}"
+            base = baseline.get(bench.name)
+            if base:
+                line += f"  {res['best_s'] / base['best_s'] - 1.0:+7.1%} vs baseline"
+            print(line, flush=True)
+
+    if args.save:
+        merged = json.loads(args.baseline.read_text()).get("results", {}) if args.baseline.exists() and args.only else {}
+        merged.update(results)
+        args.baseline.write_text(json.dumps({"environment": _environment(), "results": merged}, indent=2, sort_keys=True) + "\n")
+        print(f"saved {len(results)} results to {args.baseline}")
+
+    if args.compare:
+        regressions = compare(results, baseline, args.tolerance)
+        missing = sorted(set(results) - set(baseline))
+        if missing:
+            print(f"not in baseline: {', '.join(missing)}")
+        if regressions:
+            print(f"REGRESSED (>{args.tolerance:.0%} slower): {', '.join(regressions)}", file=sys.stderr)
+            return 1
+        print("no regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,439 @@
+"""
+End-to-end load test of /pipeline/scrape plus the Celery workers, against local stand-ins.
+
+Needs a local Postgres and Redis (DATABASE_URL / REDIS_URL, as for the app; the schema is migrated
+to head). The stores and S3 are replaced by benchmarks.standins running in this process; the API
+(uvicorn) and a Celery worker are started as subprocesses pointed at them.
+
+    python -m benchmarks.pipeline_load --rate 2 --duration 60 --mix appstore=3,playstore=1 --concurrency 8
+
+Requests are sent open-loop at --rate (they don't wait for each other), then the run drains until
+every enqueued screenshot finished or --drain-timeout passes. Reported:
+- scrape requests: throughput, status codes, latency
+- screenshots: completed/s, end-to-end latency (request sent -> completion event)
+- queue lag: end-to-end minus the worker's own stage time, and the sampled broker queue depth
+- per-stage latency from each screenshot's meta["stages"]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+
+import httpx
+
+from app.core.config import settings
+from app.monitoring.histogram import LogLinearHistogram
+from benchmarks.standins import IMAGE_SIZES, MemoryS3, _free_port, screenshot_png, serve, store_app
+
+API_DIR = Path(__file__).resolve().parent.parent
+QUEUES = ("urgent", "normal", "low")
+# Enterprise keys are capped at 6000 requests/min each; spread load so the harness isn't what throttles.
+KEY_RPS = 50
+
+
+def parse_mix(value: str) -> dict[str, float]:
+    """'appstore=3,playstore=1' -> normalised weights."""
+    weights = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ("appstore", "playstore"):
+            raise argparse.ArgumentTypeError(f"unknown platform {name!r}")
+        weights[name] = float(weight or 1)
+    total = sum(weights.values())
+    if total <= 0:
+        raise argparse.ArgumentTypeError("mix weights must be positive")
+    return {k: v / total for k, v in weights.items()}
+
+
+def _summary(h: LogLinearHistogram) -> dict:
+    if not h.count:
+        return {"count": 0}
+    return {
+        "count": h.count,
+        "p50_ms": h.percentile(0.50),
+        "p95_ms": h.percentile(0.95),
+        "p99_ms": h.percentile(0.99),
+        "max_ms": h.max_us / 1000.0,
+    }
+
+
+async def _check_services() -> None:
+    import redis.asyncio as redis
+    from sqlalchemy import text
+
+    from app.db.session import engine
+
+    if not settings.REDIS_URL:
+        raise SystemExit("REDIS_URL must point at a local Redis")
+    r = redis.from_url(settings.REDIS_URL)
+    try:
+        await r.ping()
+    finally:
+        await r.close()
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+    await engine.dispose()
+
+
+def _migrate() -> None:
+    from alembic import command
+    from alembic.config import Config
+
+    command.upgrade(Config(str(API_DIR / "alembic.ini")), "head")
+
+
+async def _seed_keys(count: int) -> list[str]:
+    """One enterprise user with `count` API keys; returns the raw keys."""
+    from app.db.session import SessionLocal, engine
+    from app.models.api_key import APIKey
+    from app.models.user import User
+    from app.utils.tokens import new_token, sha256_hex
+
+    raw = [new_token() for _ in range(count)]
+    async with SessionLocal() as db:
+        user = User(
+            email=f"loadtest-{uuid.uuid4()}@example.com",
+            password_hash="!",
+            email_verified=True,
+            subscription_tier="enterprise",
+        )
+        db.add(user)
+        await db.flush()
+        for key in raw:
+            db.add(APIKey(user_id=user.id, key_hash=sha256_hex(key), key_last4=key[-4:], rate_limit=10**6, name="loadtest"))
+        await db.commit()
+    await engine.dispose()
+    return raw
+
+
+def _child_env(store_url: str, s3_url: str) -> dict:
+    env = dict(os.environ)
+    env.update(
+        {
+            "APP_STORE_LOOKUP_URL": f"{store_url}/lookup",
+            "PLAY_STORE_DETAILS_URL": f"{store_url}/store/apps/details",
+            "PLAY_STORE_IMAGE_BASE_URL": f"{store_url}/play-lh/",
+            "STORAGE_ENDPOINT_URL": s3_url,
+            "STORAGE_BUCKET": "loadtest",
+            "STORAGE_REGION": "us-east-1",
+            "STORAGE_ACCESS_KEY_ID": "loadtest",
+            "STORAGE_SECRET_ACCESS_KEY": "loadtest",
+            "STORAGE_PUBLIC_BASE_URL": f"{s3_url}/loadtest",
+            # The per-IP limiter would otherwise throttle the single client address.
+            "DEFAULT_RATE_LIMIT_PER_MINUTE": str(10**7),
+            "PYTHONPATH": str(API_DIR),
+        }
+    )
+    return env
+
+
+def _start_processes(args, env: dict) -> tuple[subprocess.Popen, subprocess.Popen, str]:
+    port = _free_port()
+    api = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(args.api_workers), "--log-level", "warning", "--no-access-log"],
+        cwd=API_DIR,
+        env=env,
+    )
+    worker = subprocess.Popen(
+        [sys.executable, "-m", "celery", "-A", "app.tasks.celery_app.celery_app", "worker",
+         "-Q", ",".join(QUEUES), "-c", str(args.concurrency), "--loglevel", "WARNING", "--without-gossip", "--without-mingle"],
+        cwd=API_DIR,
+        env={**env, "DB_POOL_PROFILE": "worker"},
+    )
+    return api, worker, f"http://127.0.0.1:{port}"
+
+
+async def _wait_healthy(url: str, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(f"{url}/health")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError("API did not become healthy")
+
+
+class Run:
+    """Everything observed during one run, on the harness's monotonic clock."""
+
+    def __init__(self):
+        self.sent = 0
+        self.statuses: Counter = Counter()
+        self.request_latency = LogLinearHistogram()
+        self.submitted: dict[str, float] = {}  # screenshot id -> request start
+        self.finished: dict[str, tuple[str, float]] = {}  # screenshot id -> (complete|failed, time)
+        self.queue_depth: dict[str, list[int]] = {q: [] for q in QUEUES}
+        self.started = 0.0
+        self.done_sending = 0.0
+
+
+async def _listen_progress(run: Run, ready: asyncio.Event) -> None:
+    import redis.asyncio as redis
+
+    r = redis.from_url(settings.REDIS_URL, decode_responses=True)
+    pubsub = r.pubsub()
+    await pubsub.psubscribe("progress:*")
+    ready.set()
+    try:
+        while True:
+            msg = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+            if not msg:
+                continue
+            try:
+                event = json.loads(msg["data"])
+            except (TypeError, ValueError):
+                continue
+            kind = {"screenshot.complete": "complete", "screenshot.failed": "failed"}.get(event.get("type"))
+            if kind and event.get("screenshotId"):
+                # Failed attempts are retried by Celery; the last event wins.
+                run.finished[event["screenshotId"]] = (kind, time.monotonic())
+    finally:
+        await pubsub.close()
+        await r.close()
+
+
+async def _sample_queues(run: Run, interval: float) -> None:
+    import redis.asyncio as redis
+
+    # With the Redis broker each Celery queue is a list named after the queue.
+    r = redis.from_url(settings.CELERY_BROKER_URL or settings.REDIS_URL)
+    try:
+        while True:
+            pipe = r.pipeline()
+            for q in QUEUES:
+                pipe.llen(q)
+            for q, depth in zip(QUEUES, await pipe.execute()):
+                run.queue_depth[q].append(int(depth))
+            await asyncio.sleep(interval)
+    finally:
+        await r.close()
+
+
+async def _scrape(client: httpx.AsyncClient, run: Run, key: str, platform: str, app_id: str) -> None:
+    start = time.monotonic()
+    run.sent += 1
+    try:
+        resp = await client.post(
+            f"{settings.API_V1_PREFIX}/pipeline/scrape",
+            json={"platform": platform, "app_id": app_id},
+            headers={"x-api-key": key},
+        )
+    except httpx.HTTPError as e:
+        run.statuses[type(e).__name__] += 1
+        return
+    run.request_latency.record((time.monotonic() - start) * 1000.0)
+    run.statuses[resp.status_code] += 1
+    if resp.status_code == 200:
+        for sid in resp.json().get("screenshotIds", []):
+            run.submitted[sid] = start
+
+
+async def _drive(args, api_url: str, keys: list[str], run: Run) -> None:
+    rnd = random.Random(args.seed)
+    platforms, weights = zip(*args.mix.items())
+    interval = 1.0 / args.rate
+    tasks = []
+    limits = httpx.Limits(max_connections=args.max_in_flight, max_keepalive_connections=args.max_in_flight)
+    async with httpx.AsyncClient(base_url=api_url, timeout=args.request_timeout, limits=limits) as client:
+        run.started = time.monotonic()
+        i = 0
+        while True:
+            due = run.started + i * interval
+            if due - run.started >= args.duration:
+                break
+            await asyncio.sleep(max(0.0, due - time.monotonic()))
+            platform = rnd.choices(platforms, weights)[0]
+            app_id = f"com.loadtest.app{rnd.randrange(args.apps)}" if platform == "playstore" else str(100000 + rnd.randrange(args.apps))
+            tasks.append(asyncio.create_task(_scrape(client, run, keys[i % len(keys)], platform, app_id)))
+            i += 1
+        await asyncio.gather(*tasks)
+        run.done_sending = time.monotonic()
+
+
+async def _drain(run: Run, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if all(sid in run.finished for sid in run.submitted):
+            return
+        await asyncio.sleep(0.5)
+
+
+async def _stage_timings(ids: list[str]) -> tuple[dict[str, LogLinearHistogram], dict[str, float]]:
+    """Per-stage histograms from meta["stages"], and each screenshot's total worker time."""
+    from sqlalchemy import select
+
+    from app.db.session import SessionLocal, engine
+    from app.models.screenshot import Screenshot
+
+    stages: dict[str, LogLinearHistogram] = {}
+    work_ms: dict[str, float] = {}
+    async with SessionLocal() as db:
+        for i in range(0, len(ids), 1000):
+            chunk = [uuid.UUID(x) for x in ids[i : i + 1000]]
+            res = await db.execute(select(Screenshot.id, Screenshot.meta).where(Screenshot.id.in_(chunk)))
+            for sid, meta in res.all():
+                timings = ((meta or {}).get("stages") or {}).get("ms") or {}
+                for stage, ms in timings.items():
+                    stages.setdefault(stage, LogLinearHistogram()).record(float(ms))
+                work_ms[str(sid)] = sum(float(ms) for ms in timings.values())
+    await engine.dispose()
+    return stages, work_ms
+
+
+def report(run: Run, stages: dict[str, LogLinearHistogram], work_ms: dict[str, float]) -> dict:
+    send_seconds = max(1e-9, run.done_sending - run.started)
+    done = {sid: (kind, t) for sid, (kind, t) in run.finished.items() if sid in run.submitted}
+    completed = [(sid, t) for sid, (kind, t) in done.items() if kind == "complete"]
+    e2e = LogLinearHistogram()
+    # Time not spent in any worker stage: broker wait, task pickup and retries' backoff.
+    lag = LogLinearHistogram()
+    for sid, t in completed:
+        total_ms = (t - run.submitted[sid]) * 1000.0
+        e2e.record(total_ms)
+        if sid in work_ms:
+            lag.record(max(0.0, total_ms - work_ms[sid]))
+    last = max((t for _sid, t in completed), default=run.started)
+    return {
+        "requests": {
+            "sent": run.sent,
+            "per_second": run.sent / send_seconds,
+            "statuses": {str(k): v for k, v in sorted(run.statuses.items(), key=lambda kv: str(kv[0]))},
+            "latency": _summary(run.request_latency),
+        },
+        "screenshots": {
+            "enqueued": len(run.submitted),
+            "completed": len(completed),
+            "failed": sum(1 for kind, _t in done.values() if kind == "failed"),
+            "unfinished": len(run.submitted) - len(done),
+            "per_second": len(completed) / max(1e-9, last - run.started),
+            "end_to_end": _summary(e2e),
+            "queue_lag": _summary(lag),
+        },
+        "queue_depth": {
+            q: {"max": max(d, default=0), "mean": sum(d) / len(d) if d else 0.0} for q, d in run.queue_depth.items()
+        },
+        "stages": {stage: _summary(h) for stage, h in sorted(stages.items())},
+    }
+
+
+def _print_report(rep: dict) -> None:
+    def lat(s: dict) -> str:
+        if not s.get("count"):
+            return "n/a"
+        return f"p50 {s['p50_ms']:.0f} ms  p95 {s['p95_ms']:.0f} ms  p99 {s['p99_ms']:.0f} ms  max {s['max_ms']:.0f} ms"
+
+    req, shots = rep["requests"], rep["screenshots"]
+    print(f"scrape requests   {req['sent']} sent, {req['per_second']:.2f}/s, statuses {req['statuses']}")
+    print(f"  latency         {lat(req['latency'])}")
+    print(
+        f"screenshots       {shots['completed']}/{shots['enqueued']} completed, {shots['failed']} failed, "
+        f"{shots['unfinished']} unfinished, {shots['per_second']:.2f}/s"
+    )
+    print(f"  end to end      {lat(shots['end_to_end'])}")
+    print(f"  queue lag       {lat(shots['queue_lag'])}")
+    for q, d in rep["queue_depth"].items():
+        print(f"queue {q:11} depth max {d['max']}, mean {d['mean']:.1f}")
+    for stage, s in rep["stages"].items():
+        print(f"stage {stage:11} {lat(s)}")
+
+
+async def _run(args) -> dict:
+    await _check_services()
+    _migrate()
+    keys = await _seed_keys(max(1, -(-int(args.rate) // KEY_RPS)))
+
+    sizes = list(IMAGE_SIZES.values()) if args.image_size == "mixed" else [IMAGE_SIZES[args.image_size]]
+    images = [screenshot_png(w, h, seed=i) for i, (w, h) in enumerate(sizes * 2)]
+    store_port = _free_port()
+    store_url = f"http://127.0.0.1:{store_port}"
+    stores = store_app(
+        store_url,
+        images,
+        screenshots_per_app=args.screenshots_per_app,
+        changed_per_scrape=args.changed_per_scrape,
+        latency_ms=args.store_latency_ms,
+    )
+    store = serve(stores, store_port)
+    s3 = MemoryS3()
+    s3_server = serve(s3.app)
+
+    api, worker, api_url = _start_processes(args, _child_env(store_url, s3_server.url))
+    background: list[asyncio.Task] = []
+    try:
+        await _wait_healthy(api_url)
+        run = Run()
+        ready = asyncio.Event()
+        background.append(asyncio.create_task(_listen_progress(run, ready)))
+        background.append(asyncio.create_task(_sample_queues(run, args.sample_seconds)))
+        await asyncio.wait_for(ready.wait(), timeout=10)
+
+        await _drive(args, api_url, keys, run)
+        await _drain(run, args.drain_timeout)
+        stages, work_ms = await _stage_timings(list(run.submitted))
+        rep = report(run, stages, work_ms)
+        rep["s3"] = {"puts": s3.puts, "bytes": s3.bytes_in}
+        return rep
+    finally:
+        for task in background:
+            task.cancel()
+        await asyncio.gather(*background, return_exceptions=True)
+        for proc in (api, worker):
+            proc.terminate()
+        for proc in (api, worker):
+            try:
+                proc.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        store.stop()
+        s3_server.stop()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rate", type=float, default=1.0, help="scrape requests per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to send for")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix("appstore=1,playstore=1"))
+    parser.add_argument("--apps", type=int, default=50, help="distinct app ids to draw from")
+    parser.add_argument("--screenshots-per-app", type=int, default=8)
+    parser.add_argument(
+        "--changed-per-scrape",
+        type=int,
+        default=None,
+        help="screenshot URLs the fake store replaces on each repeat scrape of an app (default: all, so every "
+        "request queues --screenshots-per-app jobs; 0 measures no-op incremental re-scrapes)",
+    )
+    parser.add_argument("--image-size", choices=[*IMAGE_SIZES, "mixed"], default="mixed")
+    parser.add_argument("--store-latency-ms", type=float, default=0.0, help="added to every fake store response")
+    parser.add_argument("--concurrency", type=int, default=4, help="Celery worker processes")
+    parser.add_argument("--api-workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--max-in-flight", type=int, default=100, help="concurrent scrape requests")
+    parser.add_argument("--request-timeout", type=float, default=60.0)
+    parser.add_argument("--drain-timeout", type=float, default=300.0, help="seconds to wait for the queue to empty")
+    parser.add_argument("--sample-seconds", type=float, default=1.0, help="queue depth sampling interval")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", type=Path, help="also write the report here")
+    args = parser.parse_args()
+
+    rep = asyncio.run(_run(args))
+    _print_report(rep)
+    if args.json:
+        args.json.write_text(json.dumps(rep, indent=2) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,242 @@
+"""
+Local stand-ins for the pipeline's external services, for load tests and benchmarks:
+- a fake App Store lookup API / Play Store details page server that hands out fixture pages and images
+- an in-memory S3-compatible object store (just the calls app.storage.s3 makes)
+
+Both are plain ASGI apps served by uvicorn on a background thread; see serve().
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import io
+import json
+import random
+import re
+import socket
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from xml.etree import ElementTree
+
+import uvicorn
+from PIL import Image, ImageDraw
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+FIXTURES = Path(__file__).resolve().parent.parent / "tests" / "fixtures"
+PLAY_IMAGE_BASE = "https://play-lh.googleusercontent.com/"
+
+# Store screenshot sizes: iPhone 6.7", Android phone, iPad 12.9".
+IMAGE_SIZES = {"phone": (1290, 2796), "android": (1080, 2400), "tablet": (2048, 2732)}
+
+
+def screenshot_png(width: int, height: int, seed: int = 0) -> bytes:
+    """A screenshot-like PNG: gradient background, flat UI blocks and noisy 'text' rows."""
+    rnd = random.Random(seed)
+    im = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    draw = ImageDraw.Draw(im)
+    y = height // 10
+    while y < height - 200:
+        block = rnd.randint(120, 400)
+        color = tuple(rnd.randint(0, 255) for _ in range(3))
+        draw.rounded_rectangle((40, y, width - 40, y + block), radius=24, fill=color)
+        for row in range(y + 30, y + block - 20, 36):
+            for x in range(80, width - 120, rnd.randint(14, 22)):
+                if rnd.random() < 0.8:
+                    draw.rectangle((x, row, x + rnd.randint(6, 12), row + 18), fill=(20, 20, 20))
+        y += block + 40
+    buf = io.BytesIO()
+    im.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _stable_index(value: str, n: int) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=4).digest(), "big") % n
+
+
+def store_app(
+    base_url: str,
+    images: list[bytes],
+    *,
+    screenshots_per_app: int = 8,
+    changed_per_scrape: int | None = None,
+    latency_ms: float = 0.0,
+) -> Starlette:
+    """
+    Fake stores rooted at base_url:
+    - GET /lookup?id=...                 iTunes lookup JSON (tests/fixtures/appstore_lookup.json shape)
+    - GET /store/apps/details?id=...     Play Store page (tests/fixtures/playstore_details.html, image URLs rewritten)
+    - GET /img/{name}, /play-lh/{name}   image bytes, picked deterministically from `images` by name
+    Any app id exists; each gets screenshots_per_app distinct screenshot URLs. Every later fetch of
+    the same app replaces changed_per_scrape of them with new URLs (None: all, 0: none), as if the
+    listing was updated in between, so incremental re-scrapes still find work.
+    latency_ms is added to every response, to mimic store round trips.
+    """
+    base_url = base_url.rstrip("/")
+    lookup = json.loads((FIXTURES / "appstore_lookup.json").read_text())
+    page = (FIXTURES / "playstore_details.html").read_text()
+    # The fixture's own screenshot tokens are dropped; each app gets fresh ones below.
+    page_shell = re.sub(re.escape(PLAY_IMAGE_BASE) + r"[A-Za-z0-9_-]+(?:=[^\"\\s<]*)?", "", page)
+
+    fetches: Counter[str] = Counter()
+
+    def _names(app_id: str) -> list[str]:
+        n = fetches[app_id]
+        fetches[app_id] += 1
+        changed = screenshots_per_app if changed_per_scrape is None else min(changed_per_scrape, screenshots_per_app)
+        return [f"{app_id}-{i}-v{n if i < changed else 0}" for i in range(screenshots_per_app)]
+
+    async def _delay():
+        if latency_ms > 0:
+            await asyncio.sleep(latency_ms / 1000.0)
+
+    async def lookup_endpoint(request: Request):
+        await _delay()
+        app_id = request.query_params.get("id", "")
+        item = dict(lookup["results"][0], trackId=app_id, trackName=f"App {app_id}")
+        item["screenshotUrls"] = [f"{base_url}/img/{name}.png" for name in _names(app_id)]
+        item["ipadScreenshotUrls"] = []
+        return JSONResponse({"resultCount": 1, "results": [item]})
+
+    async def details_endpoint(request: Request):
+        await _delay()
+        package = request.query_params.get("id", "")
+        token = re.sub(r"[^A-Za-z0-9_-]", "_", package)
+        imgs = "".join(
+            f'<img src="{base_url}/play-lh/{name}=w526-h296-rw" alt="Screenshot image">' for name in _names(token)
+        )
+        html = page_shell.replace('<div id="root">', f'<div id="root">{imgs}', 1)
+        return Response(html, media_type="text/html")
+
+    async def image_endpoint(request: Request):
+        await _delay()
+        name = request.path_params["name"]
+        return Response(images[_stable_index(name, len(images))], media_type="image/png")
+
+    return Starlette(
+        routes=[
+            Route("/lookup", lookup_endpoint),
+            Route("/store/apps/details", details_endpoint),
+            Route("/img/{name}", image_endpoint),
+            Route("/play-lh/{name}", image_endpoint),
+        ]
+    )
+
+
+_S3_NS = "http://s3.amazonaws.com/doc/2006-03-01/"
+
+
+def _s3_error(status: int, code: str, key: str = "") -> Response:
+    body = f'<?xml version="1.0" encoding="UTF-8"?><Error><Code>{code}</Code><Key>{key}</Key></Error>'
+    return Response(body, status_code=status, media_type="application/xml")
+
+
+def _decode_aws_chunked(body: bytes) -> bytes:
+    """Strips aws-chunked framing (size;ext CRLF data CRLF ... 0 CRLF trailers)."""
+    out = bytearray()
+    pos = 0
+    while True:
+        end = body.index(b"\r\n", pos)
+        size = int(body[pos:end].split(b";", 1)[0], 16)
+        if size == 0:
+            return bytes(out)
+        out += body[end + 2 : end + 2 + size]
+        pos = end + 2 + size + 2
+
+
+class MemoryS3:
+    """
+    In-memory S3: PutObject, GetObject, HeadObject, DeleteObject and DeleteObjects, path-style,
+    any bucket name. Signatures are not checked. Thread-safe; objects live for the process.
+    """
+
+    def __init__(self):
+        self.objects: dict[tuple[str, str], tuple[bytes, str]] = {}
+        self.puts = 0
+        self.bytes_in = 0
+        self._lock = threading.Lock()
+        self.app = Starlette(
+            routes=[
+                Route("/{bucket}", self._bucket, methods=["PUT", "POST", "HEAD"]),
+                Route("/{bucket}/{key:path}", self._object, methods=["PUT", "GET", "HEAD", "DELETE"]),
+            ]
+        )
+
+    async def _bucket(self, request: Request):
+        if request.method == "POST" and "delete" in request.query_params:
+            return await self._delete_many(request)
+        return Response(status_code=200)
+
+    async def _object(self, request: Request):
+        bucket, key = request.path_params["bucket"], request.path_params["key"]
+        if request.method == "PUT":
+            body = await request.body()
+            if "aws-chunked" in request.headers.get("content-encoding", ""):
+                body = _decode_aws_chunked(body)
+            content_type = request.headers.get("content-type", "application/octet-stream")
+            with self._lock:
+                self.objects[(bucket, key)] = (body, content_type)
+                self.puts += 1
+                self.bytes_in += len(body)
+            return Response(status_code=200, headers={"ETag": f'"{hashlib.md5(body).hexdigest()}"'})
+        if request.method == "DELETE":
+            with self._lock:
+                self.objects.pop((bucket, key), None)
+            return Response(status_code=204)
+        obj = self.objects.get((bucket, key))
+        if obj is None:
+            return _s3_error(404, "NoSuchKey", key)
+        body, content_type = obj
+        if request.method == "HEAD":
+            return Response(status_code=200, headers={"Content-Length": str(len(body)), "Content-Type": content_type})
+        return Response(body, media_type=content_type)
+
+    async def _delete_many(self, request: Request):
+        bucket = request.path_params["bucket"]
+        root = ElementTree.fromstring(await request.body())
+        keys = [el.text or "" for el in root.iter() if el.tag.rsplit("}", 1)[-1] == "Key"]
+        with self._lock:
+            for key in keys:
+                self.objects.pop((bucket, key), None)
+        quiet = any(el.tag.rsplit("}", 1)[-1] == "Quiet" and (el.text or "").lower() == "true" for el in root.iter())
+        deleted = "" if quiet else "".join(f"<Deleted><Key>{k}</Key></Deleted>" for k in keys)
+        body = f'<?xml version="1.0" encoding="UTF-8"?><DeleteResult xmlns="{_S3_NS}">{deleted}</DeleteResult>'
+        return Response(body, media_type="application/xml")
+
+
+class ServerThread:
+    """Runs an ASGI app with uvicorn on 127.0.0.1 in a daemon thread."""
+
+    def __init__(self, app, port: int = 0):
+        self.port = port or _free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        config = uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning", access_log=False, lifespan="off")
+        self.server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self.server.run, name=f"standin-{self.port}", daemon=True)
+
+    def start(self, timeout: float = 10.0) -> ServerThread:
+        self._thread.start()
+        deadline = time.monotonic() + timeout
+        while not self.server.started:
+            if time.monotonic() > deadline or not self._thread.is_alive():
+                raise RuntimeError(f"stand-in on port {self.port} failed to start")
+            time.sleep(0.02)
+        return self
+
+    def stop(self) -> None:
+        self.server.should_exit = True
+        self._thread.join(timeout=5)
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def serve(app, port: int = 0) -> ServerThread:
+    return ServerThread(app, port).start()
@@ -0,0 +1,222 @@
+"""
+Shared test backends:
+- FakeDB / FakeScreenshotsRepo (fixtures fake_db, fake_screenshots): in-memory stand-ins for an
+  AsyncSession and ScreenshotsRepository, for unit tests of the code around the queries
+- Redis for the tests that run Lua scripts: TEST_REDIS_URL (a scratch database; it is flushed) or,
+  without it, fakeredis with Lua support. Skipped when neither is available.
+- Postgres for the tests that need real data and plans: TEST_DATABASE_URL (postgresql+asyncpg://...)
+  to a scratch database; its public schema is recreated and migrated for every test. Skipped without it.
+"""
+
+import os
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+import pytest_asyncio
+from sqlalchemy.dialects import postgresql
+
+REDIS_URL = os.getenv("TEST_REDIS_URL")
+DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+
+
+class FakeResult:
+    """What AsyncSession.execute returns, over canned rows."""
+
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+        self.rowcount = len(self.rows)
+
+    def all(self):
+        return self.rows
+
+    def first(self):
+        return self.rows[0] if self.rows else None
+
+    def scalar_one_or_none(self):
+        return self.first()
+
+    def scalars(self):
+        return self
+
+
+class FakeDB:
+    """
+    Stands in for an AsyncSession (also as its own context manager). Every statement is compiled
+    for Postgres and recorded; respond(sql) supplies the rows execute() returns (none by default)
+    and on_commit runs at each commit.
+    """
+
+    def __init__(self, respond=None, on_commit=None):
+        self.respond = respond or (lambda sql: [])
+        self.on_commit = on_commit
+        self.statements = []
+        self.added = []
+        self.refreshed = []
+        self.commits = 0
+        self.rollbacks = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, stmt, params=None):
+        sql = str(stmt.compile(dialect=postgresql.dialect()))
+        self.statements.append(sql)
+        return FakeResult(self.respond(sql))
+
+    def add(self, obj):
+        self.added.append(obj)
+
+    async def commit(self):
+        self.commits += 1
+        if self.on_commit is not None:
+            self.on_commit()
+
+    async def rollback(self):
+        self.rollbacks += 1
+
+    async def refresh(self, obj):
+        self.refreshed.append(obj)
+
+
+class FakeScreenshotsRepo:
+    """
+    ScreenshotsRepository over in-memory screenshot rows (see row()), for the services and tasks
+    that call it. Which rows a query should select is tested on Postgres; here list_expired treats
+    every row as expired and list_current_for_app returns live rows in the given order.
+    """
+
+    def __init__(self, rows=()):
+        self.rows = {r.id: r for r in rows}
+        self.status_changes: dict = {}
+        self.deleted: list = []
+
+    @staticmethod
+    def row(**fields) -> SimpleNamespace:
+        now = datetime.now(timezone.utc)
+        defaults = dict(
+            id=uuid.uuid4(),
+            user_id=uuid.uuid4(),
+            app_id="123",
+            platform="appstore",
+            url="https://is1-ssl.mzstatic.com/a.png",
+            meta={},
+            status="COMPLETE",
+            dhash=None,
+            created_at=now,
+            updated_at=now,
+        )
+        return SimpleNamespace(**{**defaults, **fields})
+
+    def _after(self, after_id):
+        return sorted((r for r in self.rows.values() if after_id is None or r.id > after_id), key=lambda r: r.id)
+
+    async def list_current_for_app(self, user_id, app_id, platform):
+        return [r for r in self.rows.values() if r.status != "SUPERSEDED"]
+
+    async def create_many(self, *, user_id, app_id, platform, urls, metadata):
+        created = [self.row(user_id=user_id, app_id=app_id, platform=platform, url=url, meta=dict(metadata), status="QUEUED") for url in urls]
+        self.rows.update((r.id, r) for r in created)
+        return created
+
+    async def set_status_many(self, ids, status):
+        for sid in ids:
+            self.rows[sid].status = self.status_changes[sid] = status
+        return len(ids)
+
+    async def list_expired(self, cutoffs, *, after_id=None, limit):
+        return [(r.id, r.meta) for r in self._after(after_id)][:limit]
+
+    async def delete_many(self, ids):
+        for sid in ids:
+            del self.rows[sid]
+        self.deleted.extend(ids)
+        return len(ids)
+
+    async def list_unhashed(self, *, after_id=None, limit):
+        return [(r.id, r.meta) for r in self._after(after_id) if r.status == "COMPLETE" and r.dhash is None][:limit]
+
+    async def set_dhashes(self, hashes):
+        for sid, h in hashes.items():
+            self.rows[sid].dhash = h
+        return len(hashes)
+
+
+@pytest.fixture
+def fake_db():
+    """The FakeDB class: fake_db(respond=lambda sql: rows, on_commit=callback)."""
+    return FakeDB
+
+
+@pytest.fixture
+def fake_screenshots():
+    """The FakeScreenshotsRepo class: fake_screenshots([fake_screenshots.row(...), ...])."""
+    return FakeScreenshotsRepo
+
+
+def _fake_server():
+    fakeredis = pytest.importorskip("fakeredis", reason="TEST_REDIS_URL not set and fakeredis not installed")
+    pytest.importorskip("lupa", reason="TEST_REDIS_URL not set and fakeredis has no Lua support (fakeredis[lua])")
+    return fakeredis, fakeredis.FakeServer()
+
+
+@pytest.fixture
+def redis_sync():
+    if REDIS_URL:
+        import redis
+
+        r = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+    else:
+        fakeredis, server = _fake_server()
+        r = fakeredis.FakeRedis(server=server, decode_responses=True)
+    r.flushdb()
+    yield r
+    r.flushdb()
+    r.close()
+
+
+@pytest_asyncio.fixture
+async def redis_async():
+    if REDIS_URL:
+        import redis.asyncio
+
+        r = redis.asyncio.Redis.from_url(REDIS_URL, decode_responses=True)
+    else:
+        fakeredis, server = _fake_server()
+        r = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+    await r.flushdb()
+    yield r
+    await r.flushdb()
+    await r.aclose()
+
+
+def _upgrade(sync_conn) -> None:
+    from alembic import command
+    from alembic.config import Config
+
+    cfg = Config(str(Path(__file__).resolve().parents[1] / "alembic.ini"))
+    cfg.attributes["connection"] = sync_conn
+    command.upgrade(cfg, "head")
+
+
+@pytest_asyncio.fixture
+async def pg_engine():
+    """An engine on a freshly migrated TEST_DATABASE_URL."""
+    if not DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL not set")
+    from sqlalchemy import text
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlalchemy.pool import NullPool
+
+    engine = create_async_engine(DATABASE_URL, poolclass=NullPool)
+    async with engine.begin() as conn:
+        await conn.execute(text("DROP SCHEMA public CASCADE"))
+        await conn.execute(text("CREATE SCHEMA public"))
+        await conn.run_sync(_upgrade)
+    yield engine
+    await engine.dispose()
@@ -0,0 +1,63 @@
+import time
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+
+from app.core.config import settings
+from app.monitoring.metrics import metrics
+from app.repositories.sessions import SessionsRepository
+from app.tasks.maintenance_tasks import _purge_table
+
+
+def _deleting(fake_db, ids):
+    return fake_db(respond=lambda sql: [(i,) for i in ids])
+
+
+@pytest.mark.asyncio
+async def test_chunk_is_one_keyset_delete_per_transaction(fake_db):
+    ids = sorted(uuid.uuid4() for _ in range(3))
+    db = _deleting(fake_db, ids)
+    deleted, last = await SessionsRepository(db).purge_chunk(before=datetime.now(timezone.utc), after_id=ids[0], limit=3)
+
+    assert (deleted, last, db.commits) == (3, ids[-1], 1)
+    [sql] = db.statements
+    assert sql.startswith("DELETE FROM sessions WHERE sessions.id IN (SELECT sessions.id")
+    assert "sessions.id > " in sql
+    assert "ORDER BY sessions.id" in sql
+    assert "FOR UPDATE SKIP LOCKED" in sql
+
+
+@pytest.mark.asyncio
+async def test_short_chunk_ends_the_pass(fake_db):
+    db = _deleting(fake_db, [uuid.uuid4()])
+    assert (await SessionsRepository(db).purge_chunk(before=datetime.now(timezone.utc), limit=10))[1] is None
+
+
+@pytest.mark.asyncio
+async def test_purge_loop_pauses_between_chunks_and_counts_rows(monkeypatch):
+    monkeypatch.setattr(settings, "AUTH_PURGE_PAUSE_SECONDS", 0)
+    chunks = [(500, 1), (500, 2), (120, None)]
+    seen = []
+
+    async def purge_chunk(after_id):
+        seen.append(after_id)
+        return chunks.pop(0)
+
+    before = metrics.snapshot()["counters"].get("purge.test.rows", 0)
+    total = await _purge_table("test", purge_chunk, deadline=time.monotonic() + 60)
+    assert total == 1120
+    assert seen == [None, 1, 2]
+    assert metrics.snapshot()["counters"]["purge.test.rows"] - before == 1120
+
+
+@pytest.mark.asyncio
+async def test_purge_loop_stops_at_deadline():
+    calls = []
+
+    async def purge_chunk(after_id):
+        calls.append(after_id)
+        return 500, len(calls)
+
+    assert await _purge_table("test_deadline", purge_chunk, deadline=time.monotonic() - 1) == 500
+    assert calls == [None]
@@ -0,0 +1,153 @@
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+
+from app.core.config import settings
+from app.storage import s3
+from app.tasks import screenshot_tasks
+
+
+@pytest.fixture(autouse=True)
+def _no_derived(monkeypatch):
+    monkeypatch.setattr(screenshot_tasks, "list_keys_many", lambda prefixes, max_workers: {p: [] for p in prefixes})
+
+
+def _meta(n):
+    return {"webp_key": f"s/{n}/image.webp", "thumb_key": f"s/{n}/thumb.webp", "width": 10}
+
+
+def _repo(fake_screenshots, ns, meta=_meta):
+    return fake_screenshots(fake_screenshots.row(id=uuid.UUID(int=n), meta=meta(n)) for n in ns)
+
+
+@pytest.mark.asyncio
+async def test_cleanup_keeps_rows_whose_objects_failed(monkeypatch, fake_screenshots, redis_async):
+    monkeypatch.setattr(settings, "CLEANUP_CHUNK_SIZE", 2)
+    monkeypatch.setattr(settings, "CLEANUP_PAUSE_SECONDS", 0)
+    batches = []
+
+    def fake_delete(keys):
+        batches.append(keys)
+        return ["s/3/thumb.webp"] if "s/3/thumb.webp" in keys else []
+
+    monkeypatch.setattr(screenshot_tasks, "delete_objects", fake_delete)
+    repo = _repo(fake_screenshots, range(1, 6))
+
+    totals = await screenshot_tasks._cleanup_expired(repo, {"free": datetime.now(timezone.utc)}, after_id=None, r=redis_async)
+
+    assert [len(b) for b in batches] == [4, 4, 2]
+    assert uuid.UUID(int=3) not in repo.deleted
+    assert totals == {"rows": 4, "objects": 9, "failed_objects": 1, "complete": True}
+    assert await redis_async.get(screenshot_tasks.CLEANUP_CHECKPOINT_KEY) is None
+
+
+@pytest.mark.asyncio
+async def test_cleanup_checkpoints_when_out_of_time(monkeypatch, fake_screenshots, redis_async):
+    monkeypatch.setattr(settings, "CLEANUP_CHUNK_SIZE", 2)
+    monkeypatch.setattr(settings, "CLEANUP_MAX_SECONDS", 0)
+    monkeypatch.setattr(screenshot_tasks, "delete_objects", lambda keys: [])
+    repo = _repo(fake_screenshots, range(1, 6))
+
+    totals = await screenshot_tasks._cleanup_expired(repo, {"free": datetime.now(timezone.utc)}, after_id=None, r=redis_async)
+    assert totals["complete"] is False
+    assert await redis_async.get(screenshot_tasks.CLEANUP_CHECKPOINT_KEY) == str(uuid.UUID(int=2))
+
+    await screenshot_tasks._cleanup_expired(repo, {}, after_id=uuid.UUID(int=2), r=redis_async)
+    assert repo.deleted == [uuid.UUID(int=n) for n in (1, 2, 3, 4)]
+
+
+class ListingClient:
+    def __init__(self, contents):
+        self.contents = contents
+
+    def get_paginator(self, name):
+        assert name == "list_objects_v2"
+        return self
+
+    def paginate(self, Bucket, Prefix):
+        if Prefix not in self.contents:
+            raise ConnectionError("list failed")
+        return [{"Contents": [{"Key": k} for k in self.contents[Prefix]]}]
+
+
+@pytest.mark.asyncio
+async def test_cleanup_deletes_cached_transforms(monkeypatch, fake_screenshots):
+    monkeypatch.setattr(settings, "TRANSFORM_CACHE_PREFIX", "derived/")
+    monkeypatch.setattr(settings, "STORAGE_BUCKET", "bucket")
+    derived = {"derived/s/1/": ["derived/s/1/100x0-contain.webp", "derived/s/1/0x50-cover.png"], "derived/s/2/": []}
+    clients = []
+    monkeypatch.setattr(s3, "_client", lambda: clients.append(ListingClient(derived)) or clients[-1])
+    monkeypatch.setattr(screenshot_tasks, "list_keys_many", s3.list_keys_many)
+    batches = []
+    monkeypatch.setattr(screenshot_tasks, "delete_objects", lambda keys: batches.append(keys) or [])
+    repo = _repo(fake_screenshots, (1, 2, 3, 4), meta=lambda n: _meta(n) if n < 4 else {})
+
+    totals = await screenshot_tasks._cleanup_expired(repo, {"free": datetime.now(timezone.utc)}, after_id=None)
+
+    assert len(clients) == 1
+    assert "derived/s/1/100x0-contain.webp" in batches[0] and "derived/s/1/0x50-cover.png" in batches[0]
+    # Its renditions couldn't be listed: the row stays, so the next pass retries them.
+    assert repo.deleted == [uuid.UUID(int=1), uuid.UUID(int=2), uuid.UUID(int=4)]
+    assert totals["objects"] == 8
+
+
+def test_list_keys_many_bounds_concurrency(monkeypatch):
+    import threading
+    import time
+
+    active, peak, lock = [0], [0], threading.Lock()
+
+    class Client(ListingClient):
+        def paginate(self, Bucket, Prefix):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.01)
+            with lock:
+                active[0] -= 1
+            return super().paginate(Bucket, Prefix)
+
+    prefixes = [f"p{i}/" for i in range(20)]
+    monkeypatch.setattr(settings, "STORAGE_BUCKET", "bucket")
+    monkeypatch.setattr(s3, "_client", lambda: Client({p: [p + "a"] for p in prefixes[:-1]}))
+    listed = s3.list_keys_many(prefixes + prefixes[:3], max_workers=4)
+    assert peak[0] <= 4
+    assert listed["p0/"] == ["p0/a"] and listed["p19/"] is None and len(listed) == 20
+
+
+def test_list_keys_paginates(monkeypatch):
+    class Paginator:
+        def paginate(self, Bucket, Prefix):
+            assert Prefix == "derived/s/1/"
+            return [{"Contents": [{"Key": "a"}, {"Key": "b"}]}, {"Contents": [{"Key": "c"}]}, {}]
+
+    class Client:
+        def get_paginator(self, name):
+            assert name == "list_objects_v2"
+            return Paginator()
+
+    monkeypatch.setattr(settings, "STORAGE_BUCKET", "bucket")
+    monkeypatch.setattr(s3, "_client", lambda: Client())
+    assert s3.list_keys("derived/s/1/") == ["a", "b", "c"]
+
+
+def test_delete_objects_batches_of_1000(monkeypatch):
+    calls = []
+
+    class Client:
+        def delete_objects(self, Bucket, Delete):
+            calls.append(len(Delete["Objects"]))
+            return {"Errors": [{"Key": Delete["Objects"][0]["Key"]}]}
+
+    monkeypatch.setattr(settings, "STORAGE_BUCKET", "bucket")
+    monkeypatch.setattr(s3, "_client", lambda: Client())
+    failed = s3.delete_objects([f"k{i}" for i in range(2500)])
+    assert calls == [1000, 1000, 500]
+    assert failed == ["k0", "k1000", "k2000"]
+
+
+def test_storage_keys_include_variants():
+    meta = {"webp_key": "a/image.webp", "thumb_key": "a/thumb.webp", "variants": [{"width": 320, "height": 694, "key": "a/w320.webp"}, {"width": 720}]}
+    assert screenshot_tasks._storage_keys(meta) == ["a/image.webp", "a/thumb.webp", "a/w320.webp"]
+    assert screenshot_tasks._storage_keys(None) == []
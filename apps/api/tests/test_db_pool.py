@@ -0,0 +1,45 @@
+import re
+from pathlib import Path
+
+import pytest
+from sqlalchemy.pool import NullPool
+
+from app.db.session import InstrumentedQueuePool, engine, engine_options
+from app.monitoring.metrics import metrics
+
+URL = "postgresql+asyncpg://u:p@localhost/db"
+
+
+def test_api_profile_uses_tuned_queue_pool():
+    opts = engine_options(URL, "api")
+    assert opts["poolclass"] is InstrumentedQueuePool
+    assert opts["pool_size"] > 0
+    assert "pool_recycle" in opts
+    assert opts["connect_args"]["prepared_statement_cache_size"] == opts["connect_args"]["statement_cache_size"]
+
+
+def test_worker_profile_defaults_to_no_pooling():
+    opts = engine_options(URL, "worker")
+    assert opts["poolclass"] is NullPool
+    assert "pool_size" not in opts
+
+
+def test_pool_occupancy_is_reported_as_gauge():
+    assert engine.sync_engine.pool.__class__ is InstrumentedQueuePool
+    stats = metrics.snapshot()["gauges"]["db.pool.primary"]
+    assert stats["checked_out"] == 0
+    assert stats["size"] > 0
+
+
+def test_celery_deployments_use_the_worker_profile():
+    """Each Celery task runs its own event loop, which a pooled connection cannot outlive."""
+    infra = Path(__file__).resolve().parents[3] / "infrastructure"
+    files = [infra / "k8s/apps/celery.yaml", infra / "docker/docker-compose.dev.yml", infra / "docker/docker-compose.staging.yml"]
+    if not all(f.exists() for f in files):
+        pytest.skip("infrastructure/ not checked out")
+    for f in files:
+        # k8s documents, or compose services
+        units = [u for u in re.split(r"\n---\n|\n  (?=\S)", f.read_text()) if '"celery"' in u]
+        assert len(units) == 2, f
+        for unit in units:
+            assert re.search(r"DB_POOL_PROFILE\W+(value: )?worker\b", unit), f
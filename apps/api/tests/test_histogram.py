@@ -0,0 +1,59 @@
+import random
+
+from app.monitoring.histogram import BUCKET_COUNT, LogLinearHistogram, bucket_bounds, bucket_index
+from app.monitoring.metrics import MetricsStore
+from app.monitoring.prometheus import render_prometheus
+
+
+def test_bucket_layout_is_contiguous():
+    prev_high = -1
+    for idx in range(BUCKET_COUNT):
+        low, high = bucket_bounds(idx)
+        assert low == prev_high + 1
+        assert bucket_index(low) == idx and bucket_index(high) == idx
+        prev_high = high
+
+
+def test_percentiles_within_relative_error():
+    rng = random.Random(7)
+    values = sorted(rng.lognormvariate(3, 1.2) for _ in range(20000))
+    h = LogLinearHistogram()
+    for v in values:
+        h.record(v)
+    for p in (0.5, 0.95, 0.99):
+        exact = values[int(p * len(values)) - 1]
+        assert abs(h.percentile(p) - exact) / exact < 0.04
+    assert h.count == 20000
+
+
+def test_merged_histograms_match_a_single_one():
+    a, b, both = LogLinearHistogram(), LogLinearHistogram(), LogLinearHistogram()
+    for i in range(1, 500):
+        (a if i % 2 else b).record(i * 0.7)
+        both.record(i * 0.7)
+    a.merge(LogLinearHistogram.from_dict(b.to_dict()))
+    assert list(a.counts) == list(both.counts)
+    assert (a.count, a.sum_us, a.min_us, a.max_us) == (both.count, both.sum_us, both.min_us, both.max_us)
+
+
+def test_memory_is_constant_per_series():
+    h = LogLinearHistogram()
+    size = h.nbytes()
+    for i in range(100000):
+        h.record(i % 5000)
+    assert h.nbytes() == size
+
+
+def test_prometheus_exposition():
+    store = MetricsStore()
+    store.observe('GET /x"y', 3.0, is_error=False)
+    store.observe('GET /x"y', 40.0, is_error=True)
+    store.incr("purge.sessions.rows", 5)
+    store.register_gauge("db.pool.primary", lambda: {"pool": "QueuePool", "checked_out": 2})
+    text = render_prometheus(store.histograms(), store.counters(), store.gauges())
+    assert 'app_latency_ms_bucket{series="GET /x\\"y",le="5"} 1' in text
+    assert 'app_latency_ms_bucket{series="GET /x\\"y",le="+Inf"} 2' in text
+    assert 'app_errors_total{series="GET /x\\"y"} 1' in text
+    assert 'app_events_total{name="purge.sessions.rows"} 5' in text
+    assert 'app_gauge{name="db.pool.primary",field="checked_out"} 2' in text
+    assert "QueuePool" not in text
@@ -0,0 +1,159 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+
+from app.core.config import settings
+from app.processing.host_limits import HostLimiter, HostLimitTimeout, adjust
+from app.processing.retry_policy import retry_after_seconds
+
+HOST = "play-lh.googleusercontent.com"
+
+
+@pytest.fixture(autouse=True)
+def _limits(monkeypatch):
+    monkeypatch.setattr(settings, "HOST_LIMIT_INITIAL", 2)
+    monkeypatch.setattr(settings, "HOST_LIMIT_MIN", 1)
+    monkeypatch.setattr(settings, "HOST_LIMIT_MAX", 8)
+    monkeypatch.setattr(settings, "HOST_LIMIT_COOLDOWN_SECONDS", 60.0)
+    monkeypatch.setattr(settings, "HOST_LIMIT_MAX_WAIT_SECONDS", 0.2)
+
+
+def test_additive_increase_multiplicative_decrease():
+    limit = 2.0
+    for _ in range(2):
+        limit = adjust(limit, "ok")
+    assert 2.8 < limit < 3.0
+    assert adjust(6.0, "throttle") == 3.0
+    assert adjust(1.0, "throttle") == 1.0
+    assert adjust(8.0, "ok") == 8.0
+    assert adjust(5.0, "neutral") == 5.0
+
+
+@pytest.mark.asyncio
+async def test_waits_for_a_slot_and_times_out():
+    limiter = HostLimiter()
+    async with limiter.slot(HOST):
+        async with limiter.slot(HOST):
+            with pytest.raises(HostLimitTimeout):
+                async with limiter.slot(HOST):
+                    pass
+    assert limiter._mem[HOST].in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_waiting_fetch_gets_the_released_slot(monkeypatch):
+    monkeypatch.setattr(settings, "HOST_LIMIT_INITIAL", 1)
+    limiter = HostLimiter()
+    order = []
+
+    async def fetch(name, hold):
+        async with limiter.slot(HOST) as slot:
+            order.append(name)
+            await asyncio.sleep(hold)
+            slot.ok()
+
+    await asyncio.gather(fetch("a", 0.05), fetch("b", 0.0))
+    assert order == ["a", "b"]
+    # 1 -> 2 -> 2.5: +1 per limit's worth of successes
+    assert limiter._mem[HOST].limit == 2.5
+
+
+@pytest.mark.asyncio
+async def test_throttling_backs_off_once_per_cooldown_and_honours_retry_after():
+    limiter = HostLimiter()
+    limiter._mem_state(HOST).limit = 8.0
+    for _ in range(3):
+        async with limiter.slot(HOST) as slot:
+            slot.throttled()
+    assert limiter._mem[HOST].limit == 4.0
+
+    async with limiter.slot(HOST) as slot:
+        slot.throttled(retry_after=30)
+    with pytest.raises(HostLimitTimeout):
+        async with limiter.slot(HOST):
+            pass
+    snap = await limiter.snapshot()
+    assert snap[HOST]["blocked_until"] is not None
+
+
+@pytest.mark.asyncio
+async def test_failed_fetch_without_outcome_leaves_limit_unchanged():
+    limiter = HostLimiter()
+    with pytest.raises(ValueError):
+        async with limiter.slot(HOST):
+            raise ValueError("404")
+    assert limiter._mem[HOST].limit == 2.0
+    assert limiter._mem[HOST].in_flight == 0
+
+
+class BrokenRedis:
+    def register_script(self, _source):
+        async def script(keys=None, args=None):
+            raise ConnectionError("redis down")
+
+        script.registered_client = self
+        return script
+
+
+@pytest.mark.asyncio
+async def test_redis_failure_falls_back_to_process_limits():
+    limiter = HostLimiter()
+    async with limiter.slot(HOST, BrokenRedis()) as slot:
+        assert limiter._mem[HOST].in_flight == 1
+        slot.ok()
+    assert limiter._mem[HOST].in_flight == 0
+
+
+def test_retry_after_forms():
+    assert retry_after_seconds("120") == 120.0
+    assert retry_after_seconds(None) is None
+    assert retry_after_seconds("soon") is None
+    in_a_minute = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=60), usegmt=True)
+    assert 55 <= retry_after_seconds(in_a_minute) <= 60
+
+
+@pytest.mark.asyncio
+async def test_redis_limit_is_shared_adapted_and_leased(monkeypatch, redis_async):
+    """Runs _ACQUIRE_LUA/_RELEASE_LUA: two workers' limiters see one limit for the host."""
+    now = [1000.0]
+    monkeypatch.setattr("app.processing.host_limits.time.time", lambda: now[0])
+    monkeypatch.setattr(settings, "HOST_LIMIT_LEASE_SECONDS", 60.0)
+    a, b = HostLimiter(), HostLimiter()
+
+    async with a.slot(HOST, redis_async):
+        async with b.slot(HOST, redis_async) as slot:
+            with pytest.raises(HostLimitTimeout):
+                async with a.slot(HOST, redis_async):
+                    pass
+            slot.ok()
+    assert a._mem == {} and b._mem == {}
+    # 2 -> 2.5 on one success; a neutral release leaves it alone.
+    assert (await a.snapshot(redis_async))[HOST] == {"limit": 2.5, "in_flight": 0, "blocked_until": None}
+
+    for _ in range(2):
+        async with b.slot(HOST, redis_async) as slot:
+            slot.throttled()
+    assert (await a.snapshot(redis_async))[HOST]["limit"] == 1.25  # one cut per cooldown
+    now[0] += 61
+    async with b.slot(HOST, redis_async) as slot:
+        slot.throttled(retry_after=30)
+    snap = (await a.snapshot(redis_async))[HOST]
+    assert snap["limit"] == 1.0 and snap["blocked_until"] == now[0] + 30
+    with pytest.raises(HostLimitTimeout):
+        async with a.slot(HOST, redis_async):
+            pass
+
+    # A worker that dies holding a slot blocks the host only until its lease expires.
+    now[0] += 31
+    granted, via_redis = await a._try_acquire(HOST, "crashed-worker", redis_async)
+    assert granted and via_redis
+    assert (await b.snapshot(redis_async))[HOST]["in_flight"] == 1
+    with pytest.raises(HostLimitTimeout):
+        async with b.slot(HOST, redis_async):
+            pass
+    now[0] += 61
+    async with b.slot(HOST, redis_async) as slot:
+        assert (await a.snapshot(redis_async))[HOST]["in_flight"] == 1
+        slot.ok()
@@ -0,0 +1,43 @@
+"""
+Cold-start budget for the API process: `import app.main` in a fresh interpreter.
+Worker-only dependencies must stay out of it; they're imported on first use instead.
+Override the time budget with IMPORT_BUDGET_SECONDS on unusually slow machines.
+"""
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+API_DIR = Path(__file__).resolve().parents[1]
+
+MODULE_BUDGET = 900
+SECONDS_BUDGET = float(os.getenv("IMPORT_BUDGET_SECONDS", "2.5"))
+WORKER_ONLY = ("celery", "kombu", "boto3", "botocore", "PIL", "bs4", "lxml", "httpx", "app.tasks.screenshot_tasks")
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app.main
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "modules": len(sys.modules), "loaded": sorted(sys.modules)}))
+"""
+
+
+def _probe() -> dict:
+    out = subprocess.run(
+        [sys.executable, "-c", _PROBE], cwd=API_DIR, capture_output=True, text=True, check=True, timeout=60
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def test_api_startup_skips_worker_only_dependencies():
+    loaded = set(_probe()["loaded"])
+    assert not [m for m in WORKER_ONLY if m in loaded]
+
+
+def test_api_import_within_budget():
+    # Best of three: the first run also pays for cold .pyc and filesystem caches.
+    runs = [_probe() for _ in range(3)]
+    assert min(r["modules"] for r in runs) <= MODULE_BUDGET
+    assert min(r["seconds"] for r in runs) <= SECONDS_BUDGET
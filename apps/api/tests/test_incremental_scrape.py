@@ -0,0 +1,92 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.config import settings
+from app.monitoring.metrics import metrics
+from app.services.screenshots import ScreenshotsService, diff_urls, is_stale
+from app.tasks.enqueue import enqueue_screenshots
+
+
+def _row(url, status="COMPLETE", age=0.0, meta=None):
+    updated_at = datetime.now(timezone.utc) - timedelta(seconds=age)
+    return SimpleNamespace(id=uuid.uuid4(), url=url, status=status, updated_at=updated_at, meta=meta or {})
+
+
+def test_diff_urls():
+    current = [_row("b"), _row("c"), _row("x")]
+    added, removed, unchanged = diff_urls(["a", "b", "c", "a"], current)
+    assert added == ["a"]
+    assert [s.url for s in removed] == ["x"]
+    assert [s.url for s in unchanged] == ["b", "c"]
+
+
+def test_diff_urls_keeps_newest_duplicate():
+    newest, older = _row("a"), _row("a")
+    added, removed, unchanged = diff_urls(["a"], [newest, older])
+    assert added == []
+    assert removed == [older]
+    assert unchanged == [newest]
+
+
+@pytest.mark.asyncio
+async def test_sync_app_only_creates_new_and_supersedes_removed(fake_screenshots):
+    kept, failed, gone = _row("a"), _row("b", "FAILED"), _row("c")
+    svc = ScreenshotsService(None)
+    svc.repo = fake_screenshots([kept, failed, gone])
+
+    diff = await svc.sync_app(user_id=uuid.uuid4(), app_id="123", platform="appstore", urls=["a", "b", "d"], metadata={})
+
+    assert [s.url for s in diff.added] == ["d"]
+    assert diff.removed == [gone]
+    assert diff.unchanged == [kept, failed]
+    assert diff.retried == [failed]
+    assert svc.repo.status_changes == {gone.id: "SUPERSEDED", failed.id: "QUEUED"}
+
+
+@pytest.mark.asyncio
+async def test_sync_app_with_nothing_changed_creates_nothing(fake_screenshots):
+    svc = ScreenshotsService(None)
+    svc.repo = fake_screenshots([_row("a"), _row("b")])
+    diff = await svc.sync_app(user_id=uuid.uuid4(), app_id="123", platform="appstore", urls=["a", "b"], metadata={})
+    assert diff.added == [] and diff.removed == [] and diff.retried == []
+    assert svc.repo.status_changes == {}
+
+
+def test_stale_means_stuck_without_a_pending_retry(monkeypatch):
+    monkeypatch.setattr(settings, "SCREENSHOT_STALE_SECONDS", 600)
+    now = datetime.now(timezone.utc)
+    assert is_stale(_row("a", "QUEUED", age=601), now)
+    assert is_stale(_row("a", "PROCESSING", age=601), now)
+    assert not is_stale(_row("a", "QUEUED", age=599), now)
+    assert not is_stale(_row("a", "COMPLETE", age=6000), now)
+    waiting = _row("a", "QUEUED", age=601, meta={"retry": {"next_at": now.timestamp() + 60}})
+    assert not is_stale(waiting, now)
+
+
+@pytest.mark.asyncio
+async def test_sync_app_requeues_stale_rows(monkeypatch, fake_screenshots):
+    monkeypatch.setattr(settings, "SCREENSHOT_STALE_SECONDS", 600)
+    lost, busy, stuck = _row("a", "QUEUED", age=3600), _row("b", "PROCESSING", age=30), _row("c", "PROCESSING", age=3600)
+    svc = ScreenshotsService(None)
+    svc.repo = fake_screenshots([lost, busy, stuck])
+    diff = await svc.sync_app(user_id=uuid.uuid4(), app_id="123", platform="appstore", urls=["a", "b", "c"], metadata={})
+    assert diff.retried == [lost, stuck]
+    assert svc.repo.status_changes == {lost.id: "QUEUED", stuck.id: "QUEUED"}
+
+
+def test_enqueue_failure_is_reported(monkeypatch):
+    from app.tasks.scheduler import scheduler
+
+    def submit(*_args, **_kwargs):
+        raise ConnectionError("broker down")
+
+    monkeypatch.setattr(scheduler, "submit", submit)
+    before = metrics.counters().get("enqueue.failed", 0)
+    assert enqueue_screenshots([("a", 0), ("b", 1)], tenant_id="t1", tier="free") is False
+    assert metrics.counters()["enqueue.failed"] == before + 2
+
+    monkeypatch.setattr(scheduler, "submit", lambda *_args, **_kwargs: None)
+    assert enqueue_screenshots([("a", 0)], tenant_id="t1", tier="free") is True
@@ -0,0 +1,197 @@
+import asyncio
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+
+from app.api.deps import get_principal
+from app.core.config import settings
+from app.db.session import get_db
+from app.main import create_app
+from app.middleware.ip_filter import IPFilter, client_address
+from app.utils.cidr import CIDRTrie, parse_address
+
+
+def test_trie_matches_ipv4_and_ipv6_prefixes():
+    trie = CIDRTrie()
+    trie.add("10.0.0.0/8")
+    trie.add("2001:db8::/32")
+    trie.add("192.168.1.7")
+
+    assert trie.contains(parse_address("10.20.30.40"))
+    assert trie.contains(parse_address("192.168.1.7"))
+    assert not trie.contains(parse_address("192.168.1.8"))
+    assert trie.contains(parse_address("2001:db8:1::1"))
+    assert not trie.contains(parse_address("2001:db9::1"))
+    # IPv4-mapped IPv6 addresses are matched against IPv4 networks.
+    assert trie.contains(parse_address("::ffff:10.1.2.3"))
+
+
+def test_trie_remove_prunes_and_keeps_siblings():
+    trie = CIDRTrie()
+    trie.add("10.0.0.0/8")
+    trie.add("10.1.0.0/16")
+    assert trie.remove("10.0.0.0/8")
+    assert not trie.remove("10.0.0.0/8")
+    assert len(trie) == 1
+    assert trie.contains(parse_address("10.1.2.3"))
+    assert not trie.contains(parse_address("10.2.0.1"))
+
+
+def test_filter_applies_global_and_per_user_rules():
+    f = IPFilter()
+    user_id = uuid.uuid4()
+    addr = parse_address("203.0.113.5")
+
+    assert f.global_allowed(addr)
+    f.apply_change({"op": "add", "list": "deny", "ip": "203.0.113.0/24", "user_id": None})
+    assert not f.global_allowed(addr)
+    f.apply_change({"op": "remove", "list": "deny", "ip": "203.0.113.0/24", "user_id": None})
+    assert f.global_allowed(addr)
+
+    f.apply_change({"op": "add", "list": "allow", "ip": "198.51.100.0/24", "user_id": str(user_id)})
+    assert not f.user_allowed(addr, user_id)
+    assert f.user_allowed(parse_address("198.51.100.9"), user_id)
+    assert f.user_allowed(addr, uuid.uuid4())
+
+
+def test_non_empty_global_allowlist_is_exclusive():
+    f = IPFilter()
+    f.apply_change({"op": "add", "list": "allow", "ip": "10.0.0.0/8", "user_id": None})
+    assert f.global_allowed(parse_address("10.9.9.9"))
+    assert not f.global_allowed(parse_address("8.8.8.8"))
+
+
+@pytest.mark.asyncio
+async def test_reloads_run_in_the_background(monkeypatch):
+    f = IPFilter()
+    calls = []
+
+    async def reload():
+        calls.append(1)
+        if len(calls) == 1:
+            raise ConnectionError("db down")
+
+    monkeypatch.setattr(f, "reload", reload)
+    monkeypatch.setattr(settings, "IP_FILTER_RETRY_SECONDS", 0)
+    monkeypatch.setattr(settings, "IP_FILTER_RELOAD_SECONDS", 3600)
+    f.ensure_running()
+    # Never waits for a load: the request path only reads the tries.
+    assert calls == []
+    for _ in range(5):
+        await asyncio.sleep(0)
+    assert len(calls) == 2  # a failed load is retried, then the loop waits for the next period
+    reloader = f._reloader
+    f.ensure_running()
+    assert f._reloader is reloader
+    await f.stop()
+    assert reloader.cancelled()
+
+
+def _denying(monkeypatch, ip: str) -> IPFilter:
+    f = IPFilter()
+    f.apply_change({"op": "add", "list": "deny", "ip": ip, "user_id": None})
+    monkeypatch.setattr(settings, "IP_FILTER_ENABLED", True)
+    monkeypatch.setattr(f, "ensure_running", lambda: None)
+    monkeypatch.setattr("app.middleware.ip_filter.ip_filter", f)
+    monkeypatch.setattr("app.services.ip_lists.ip_filter", f)
+    return f
+
+
+def test_globally_denied_address_never_reaches_api_key_lookup(monkeypatch):
+    _denying(monkeypatch, "203.0.113.0/24")
+    lookups = []
+
+    def session_local():
+        lookups.append(1)
+        raise RuntimeError("key lookup")
+
+    monkeypatch.setattr("app.middleware.api_key_auth.SessionLocal", session_local)
+    app = create_app()
+
+    denied = TestClient(app, client=("203.0.113.5", 50000))
+    res = denied.get("/api/v1/screenshots", headers={"x-api-key": "sk_live_x"})
+    assert res.status_code == 403
+    assert lookups == []
+
+    allowed = TestClient(app, client=("198.51.100.5", 50000))
+    with pytest.raises(RuntimeError, match="key lookup"):
+        allowed.get("/api/v1/screenshots", headers={"x-api-key": "sk_live_x"})
+    assert lookups == [1]
+
+
+def _request(peer: str, *forwarded: str):
+    headers = [(b"x-forwarded-for", value.encode()) for value in forwarded]
+    return Request({"type": "http", "client": (peer, 50000), "headers": headers})
+
+
+def test_client_address_reads_forwarded_for_only_behind_trusted_proxies(monkeypatch):
+    monkeypatch.setattr(settings, "IP_FILTER_TRUSTED_PROXIES", "10.0.0.0/8, 172.16.0.1")
+
+    assert client_address(_request("198.51.100.5", "203.0.113.9")) == parse_address("198.51.100.5")
+    assert client_address(_request("10.1.2.3", "203.0.113.9")) == parse_address("203.0.113.9")
+    # Spoofed hops left of the real caller are ignored; chained proxies are skipped.
+    assert client_address(_request("10.1.2.3", "192.0.2.66, 203.0.113.9", "172.16.0.1")) == parse_address("203.0.113.9")
+    assert client_address(_request("10.1.2.3")) == parse_address("10.1.2.3")
+    assert client_address(_request("10.1.2.3", "nonsense, 10.0.0.7")) == parse_address("10.0.0.7")
+
+    monkeypatch.setattr(settings, "IP_FILTER_TRUSTED_PROXIES", "")
+    assert client_address(_request("10.1.2.3", "203.0.113.9")) == parse_address("10.1.2.3")
+
+
+def test_disabled_filter_admits_everyone(monkeypatch):
+    _denying(monkeypatch, "203.0.113.0/24")
+    monkeypatch.setattr(settings, "IP_FILTER_ENABLED", False)
+
+    def session_local():
+        raise RuntimeError("key lookup")
+
+    monkeypatch.setattr("app.middleware.api_key_auth.SessionLocal", session_local)
+    client = TestClient(create_app(), client=("203.0.113.5", 50000))
+    with pytest.raises(RuntimeError, match="key lookup"):
+        client.get("/api/v1/screenshots", headers={"x-api-key": "sk_live_x"})
+
+
+class FakeIPListsRepo:
+    entries: list = []
+
+    def __init__(self, db):
+        pass
+
+    async def list_for_owner(self, list_name, user_id=None):
+        return [e for e in self.entries if e.user_id == user_id]
+
+    async def add(self, *, list_name, ip, user_id=None):
+        entry = SimpleNamespace(id=uuid.uuid4(), user_id=user_id, ip=ip, created_at="2026-01-01T00:00:00Z")
+        self.entries.append(entry)
+        return entry
+
+    async def remove(self, *, list_name, ip, user_id=None):
+        before = len(self.entries)
+        self.entries[:] = [e for e in self.entries if not (e.ip == ip and e.user_id == user_id)]
+        return before - len(self.entries)
+
+
+def test_list_endpoints_update_the_running_filter(monkeypatch):
+    f = _denying(monkeypatch, "192.0.2.1")
+    monkeypatch.setattr(FakeIPListsRepo, "entries", [])
+    monkeypatch.setattr("app.services.ip_lists.IPListsRepository", FakeIPListsRepo)
+    app = create_app()
+    app.dependency_overrides[get_principal] = lambda: SimpleNamespace(role="admin", id=uuid.uuid4())
+    app.dependency_overrides[get_db] = lambda: None
+    client = TestClient(app)
+
+    res = client.post("/api/v1/admin/ip-lists/deny", json={"ip": "203.0.113.9/24"})
+    assert res.status_code == 201
+    assert res.json()["ip"] == "203.0.113.0/24" and res.json()["user_id"] is None
+    assert not f.global_allowed(parse_address("203.0.113.77"))
+    assert [e["ip"] for e in client.get("/api/v1/admin/ip-lists/deny").json()] == ["203.0.113.0/24"]
+
+    assert client.post("/api/v1/admin/ip-lists/deny", json={"ip": "not-an-ip"}).status_code == 400
+    assert client.get("/api/v1/admin/ip-lists/other").status_code == 422
+
+    res = client.delete("/api/v1/admin/ip-lists/deny", params={"ip": "203.0.113.0/24"})
+    assert res.json() == {"removed": 1}
+    assert f.global_allowed(parse_address("203.0.113.77"))
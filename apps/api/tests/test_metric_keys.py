@@ -0,0 +1,31 @@
+import uuid
+
+from fastapi.testclient import TestClient
+
+from app.main import create_app
+from app.monitoring.metrics import OVERFLOW_KEY, MetricsStore, metrics
+
+
+def test_requests_are_keyed_by_route_template_and_status_class():
+    client = TestClient(create_app())
+    for _ in range(3):
+        client.get(f"/api/v1/screenshots/{uuid.uuid4()}")
+    client.get(f"/definitely-not-a-route/{uuid.uuid4()}")
+
+    routes = metrics.snapshot()["routes"]
+    assert routes["GET /api/v1/screenshots/{screenshot_id} 4xx"]["count"] >= 3
+    assert "GET <unmatched> 4xx" in routes
+    assert not any("definitely-not-a-route" in key for key in routes)
+
+
+def test_series_count_is_capped_with_overflow_bucket():
+    store = MetricsStore(max_series=3)
+    for i in range(10):
+        store.observe(f"key-{i}", 1.0, is_error=i == 9)
+    snap = store.snapshot()
+    assert set(snap["routes"]) == {"key-0", "key-1", "key-2", OVERFLOW_KEY}
+    assert snap["routes"][OVERFLOW_KEY]["count"] == 7
+    assert snap["routes"][OVERFLOW_KEY]["errors"] == 1
+    assert snap["series"]["overflowed_observations"] == 7
+    assert snap["series"]["bytes"] == sum(r["bytes"] for r in snap["routes"].values())
+    assert all(r["bytes"] > 7000 for r in snap["routes"].values())
@@ -0,0 +1,142 @@
+import json
+
+import pytest
+
+from app.core.config import settings
+from app.monitoring import aggregation
+from app.monitoring.aggregation import MetricsPusher, read_shm_view
+from app.monitoring.histogram import LogLinearHistogram
+from app.monitoring.metrics import MetricsStore
+
+
+def _apply(total: dict, delta: dict) -> None:
+    """Python mirror of the Redis script, for checking delta bookkeeping."""
+    for key, s in delta["series"].items():
+        h = total.setdefault(key, {"counts": {}, "count": 0, "sum_us": 0, "errors": 0})
+        for idx, n in s["b"].items():
+            h["counts"][idx] = h["counts"].get(idx, 0) + n
+        h["count"] += s["count"]
+        h["sum_us"] += s["sum_us"]
+        h["errors"] += s["errors"]
+
+
+def test_deltas_sum_to_the_cumulative_histogram():
+    store = MetricsStore()
+    pusher = MetricsPusher(store, "redis")
+    total = {}
+    for round_ in range(3):
+        for i in range(50):
+            store.observe("GET /a 2xx", i * (round_ + 1) * 0.3, is_error=i == 0)
+        _apply(total, json.loads(json.dumps(pusher.delta())))
+
+    h, errors = store.histograms()["GET /a 2xx"]
+    expected = {str(i): n for i, n in enumerate(h.counts) if n}
+    assert total["GET /a 2xx"]["counts"] == expected
+    assert total["GET /a 2xx"]["count"] == 150
+    assert total["GET /a 2xx"]["errors"] == errors == 3
+    assert pusher.delta() == {"series": {}, "counters": {}}
+
+
+def test_failed_redis_push_keeps_changes_for_next_delta():
+    store = MetricsStore()
+    pusher = MetricsPusher(store, "redis")
+
+    def failing_script(**_kwargs):
+        raise ConnectionError("down")
+
+    pusher._redis, pusher._script = object(), failing_script
+    store.observe("k", 1.0, is_error=False)
+    store.incr("c", 2)
+    with pytest.raises(ConnectionError):
+        pusher._push_redis()
+    d = pusher.delta()
+    assert d["series"]["k"]["count"] == 1
+    assert d["counters"] == {"c": 2}
+
+
+def test_redis_push_without_redis_url_keeps_changes(monkeypatch):
+    monkeypatch.setattr(settings, "REDIS_URL", None)
+    store = MetricsStore()
+    pusher = MetricsPusher(store, "redis")
+    store.observe("k", 1.0, is_error=False)
+    with pytest.raises(RuntimeError, match="REDIS_URL"):
+        pusher._push_redis()
+    pusher.push()
+    assert pusher.delta()["series"]["k"]["count"] == 1
+
+
+def test_shm_files_merge_into_one_view(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_SHM_DIR", str(tmp_path))
+    expected = LogLinearHistogram()
+    for pid, values in ((101, [1.0, 2.0]), (102, [3.0, 400.0])):
+        h = LogLinearHistogram()
+        for v in values:
+            h.record(v)
+            expected.record(v)
+        state = {"series": {"GET /x 2xx": {**h.to_dict(), "errors": 1}}, "counters": {"jobs": 2}}
+        (tmp_path / f"{pid}.json").write_text(json.dumps(state))
+    (tmp_path / "junk.json").write_text("{not json")
+
+    histograms, counters = read_shm_view()
+    h, errors = histograms["GET /x 2xx"]
+    assert list(h.counts) == list(expected.counts)
+    assert (h.count, h.max_us, errors) == (4, 400000, 2)
+    assert counters == {"jobs": 4}
+
+
+def test_shm_pusher_writes_process_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_SHM_DIR", str(tmp_path))
+    store = MetricsStore()
+    store.observe("k", 5.0, is_error=False)
+    MetricsPusher(store, "shm").push()
+    histograms, _ = read_shm_view()
+    assert histograms["k"][0].count == 1
+
+
+@pytest.mark.asyncio
+async def test_cluster_view_is_none_when_off(monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_AGGREGATION", "off")
+    assert await aggregation.cluster_view() is None
+
+
+@pytest.mark.asyncio
+async def test_redis_view_covers_only_recent_windows(monkeypatch, redis_async):
+    monkeypatch.setattr(settings, "METRICS_WINDOW_SECONDS", 60)
+    monkeypatch.setattr(settings, "METRICS_WINDOWS", 2)
+    script = redis_async.register_script(aggregation._APPLY_DELTA_LUA)
+    store = MetricsStore()
+    pusher = MetricsPusher(store, "redis")
+    now = 6000.0
+
+    for window, values in ((97, [5000.0]), (99, [1.0, 2.0]), (100, [3.0])):
+        for v in values:
+            store.observe("GET /a 2xx", v, is_error=False)
+        store.incr("jobs")
+        await script(keys=[aggregation.REDIS_PREFIX], args=[json.dumps(pusher.delta()), window, 180])
+
+    histograms, counters = await aggregation.read_redis_view(redis_async, now=now)
+    h, _errors = histograms["GET /a 2xx"]
+    # Window 97 is outside the newest two (99, 100): its 5 s outlier no longer counts, not even as max.
+    assert h.count == 3 and h.max_us <= 3100 and h.min_us >= 1000
+    assert counters == {"jobs": 3}
+    assert 0 < await redis_async.ttl(f"{aggregation.REDIS_PREFIX}:w:100:h:GET /a 2xx") <= 180
+
+
+def test_stale_shm_files_are_deleted(tmp_path, monkeypatch):
+    import os
+    import time
+
+    monkeypatch.setattr(settings, "METRICS_SHM_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "METRICS_SHM_STALE_SECONDS", 60)
+    dead = tmp_path / "101.json"
+    dead.write_text("{}")
+    os.utime(dead, (time.time() - 120, time.time() - 120))
+    store = MetricsStore()
+    store.observe("k", 5.0, is_error=False)
+    pusher = MetricsPusher(store, "shm")
+
+    pusher.push()
+    assert not dead.exists()
+    assert (tmp_path / f"{os.getpid()}.json").exists()
+    pusher.stop()
+    assert list(tmp_path.iterdir()) == []
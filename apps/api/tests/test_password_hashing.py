@@ -0,0 +1,42 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+from app.core import security
+from app.monitoring.metrics import metrics
+
+
+@pytest.mark.asyncio
+async def test_hashing_runs_off_the_event_loop():
+    loop_thread = threading.get_ident()
+    worker_thread = await security._run_hashing(threading.get_ident)
+    assert worker_thread != loop_thread
+    assert metrics.snapshot()["routes"]["auth.password_hash"]["count"] >= 1
+
+
+@pytest.mark.asyncio
+async def test_full_wait_queue_fails_fast(monkeypatch):
+    monkeypatch.setattr(security.settings, "PASSWORD_HASH_WORKERS", 1)
+    monkeypatch.setattr(security.settings, "PASSWORD_HASH_MAX_QUEUE", 1)
+    release = threading.Event()
+
+    first = asyncio.create_task(security._run_hashing(release.wait, 5))
+    second = asyncio.create_task(security._run_hashing(release.wait, 5))
+    await asyncio.sleep(0)
+    try:
+        with pytest.raises(HTTPException) as exc:
+            await security._run_hashing(release.wait, 5)
+        assert exc.value.status_code == 503
+    finally:
+        release.set()
+        await asyncio.gather(first, second)
+
+
+def test_outdated_cost_needs_rehash():
+    rounds = security.settings.PASSWORD_BCRYPT_ROUNDS
+    weak = f"$2b${rounds - 2:02d}${'.' * 53}"
+    current = f"$2b${rounds:02d}${'.' * 53}"
+    assert security.pwd_context.needs_update(weak)
+    assert not security.pwd_context.needs_update(current)
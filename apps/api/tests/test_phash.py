@@ -0,0 +1,90 @@
+import io
+import random
+import uuid
+
+import pytest
+from PIL import Image, ImageDraw
+
+from app.processing.phash import MAX_DISTANCE, band_probes, bands, dhash, hamming, probe_radius, to_signed, to_unsigned
+from app.repositories.screenshots import ScreenshotsRepository
+
+
+def _image(seed: int) -> Image.Image:
+    """Gradient plus random flat blocks, like a store screenshot's layout."""
+    rnd = random.Random(seed)
+    im = Image.linear_gradient("L").resize((300, 650)).convert("RGBA")
+    draw = ImageDraw.Draw(im)
+    for _ in range(12):
+        x, y = rnd.randrange(0, 250), rnd.randrange(0, 600)
+        draw.rectangle((x, y, x + rnd.randrange(20, 120), y + rnd.randrange(20, 120)), fill=tuple(rnd.randrange(256) for _ in range(3)))
+    return im
+
+
+def test_dhash_survives_rescaling_and_separates_layouts():
+    a = _image(1)
+    assert hamming(dhash(a), dhash(a.resize((150, 325)))) <= 4
+    assert hamming(dhash(a), dhash(_image(2))) > MAX_DISTANCE
+
+
+def test_signed_round_trip_and_bands():
+    for h in (0, 1, (1 << 63) - 1, 1 << 63, (1 << 64) - 1, 0x0123456789ABCDEF):
+        assert -(1 << 63) <= to_signed(h) < 1 << 63
+        assert to_unsigned(to_signed(h)) == h
+    assert bands(0x0123456789ABCDEF) == (0x0123, 0x4567, 0x89AB, 0xCDEF)
+
+
+def test_band_probes_never_miss_within_max_distance():
+    rnd = random.Random(7)
+    for max_distance in range(MAX_DISTANCE + 1):
+        radius = probe_radius(max_distance)
+        for _ in range(50):
+            h = rnd.getrandbits(64)
+            other = h
+            for bit in rnd.sample(range(64), max_distance):
+                other ^= 1 << bit
+            probes = [set(band_probes(b, radius)) for b in bands(h)]
+            assert any(b in p for b, p in zip(bands(other), probes))
+    assert len(band_probes(0, 2)) == 1 + 16 + 120
+
+
+@pytest.mark.asyncio
+async def test_find_similar_probes_band_indexes_then_filters_by_distance(fake_db):
+    db = fake_db()
+    await ScreenshotsRepository(db).find_similar(uuid.uuid4(), 0xFFFF000000000000, max_distance=3, limit=10, exclude_id=uuid.uuid4())
+    (sql,) = db.statements
+    for i in range(4):
+        assert f"screenshots.dhash_b{i} IN" in sql
+    assert "bit_count(CAST(screenshots.dhash # " in sql
+    assert "ORDER BY bit_count" in sql
+
+
+@pytest.mark.asyncio
+async def test_list_unhashed_walks_complete_rows_by_primary_key(fake_db):
+    db = fake_db()
+    await ScreenshotsRepository(db).list_unhashed(after_id=uuid.uuid4(), limit=50)
+    (sql,) = db.statements
+    assert "screenshots.status = " in sql and "screenshots.dhash IS NULL" in sql
+    assert "screenshots.id > " in sql and "ORDER BY screenshots.id" in sql
+
+
+@pytest.mark.asyncio
+async def test_backfill_matches_the_hash_of_a_fresh_upload(monkeypatch, fake_screenshots):
+    from app.core.config import settings
+    from app.tasks import screenshot_tasks
+
+    thumbs, fresh = {}, {}
+    for i in range(5):
+        buf = io.BytesIO()
+        _image(i).save(buf, format="PNG")
+        _, thumbs[f"t{i}"], meta, _ = screenshot_tasks._to_webp_and_thumb(buf.getvalue(), widths=[])
+        fresh[uuid.UUID(int=i + 1)] = int(meta["dhash"], 16)
+    thumbs["bad"] = b"not an image"
+    metas = [{"thumb_key": f"t{i}"} for i in range(5)] + [{"thumb_key": "gone"}, {"thumb_key": "bad"}, {}]
+    repo = fake_screenshots(fake_screenshots.row(id=uuid.UUID(int=i + 1), meta=meta) for i, meta in enumerate(metas))
+    monkeypatch.setattr(screenshot_tasks, "get_bytes", thumbs.get)
+    monkeypatch.setattr(settings, "DHASH_BACKFILL_CHUNK_SIZE", 3)
+
+    totals = await screenshot_tasks._backfill_dhash(repo, deadline=float("inf"))
+
+    assert totals == {"hashed": 5, "skipped": 3, "complete": True}
+    assert {sid: repo.rows[sid].dhash for sid in fresh} == fresh
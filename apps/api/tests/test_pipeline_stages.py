@@ -0,0 +1,77 @@
+import io
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app.api.deps import get_principal
+from app.main import create_app
+from app.monitoring.metrics import metrics
+from app.monitoring.stages import StageTimer, parse_stage_key, source_host, stage_key
+from app.tasks.screenshot_tasks import _to_webp_and_thumb
+
+
+def _png(size=(600, 1200)) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", size, (200, 30, 90)).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def test_conversion_is_timed_per_stage():
+    timer = StageTimer()
+    webp, thumb, meta, _variants = _to_webp_and_thumb(_png(), timer)
+    assert set(timer.ms) == {"decode", "encode_webp", "variants", "thumbnail", "phash"}
+    assert meta["width"] == 600 and webp and thumb
+
+
+def test_variants_are_narrower_than_the_original_and_largest_first():
+    webp, thumb, meta, variants = _to_webp_and_thumb(_png((1290, 2796)), widths=[320, 2000, 720, 1080])
+    assert list(variants) == [1080, 720, 320]
+    assert meta["variants"] == [
+        {"width": 1080, "height": 2341},
+        {"width": 720, "height": 1561},
+        {"width": 320, "height": 694},
+    ]
+    assert Image.open(io.BytesIO(thumb)).size == (236, 512)
+    assert all(Image.open(io.BytesIO(v)).format == "WEBP" for v in variants.values())
+
+
+def test_failed_stage_is_recorded_and_compact():
+    timer = StageTimer()
+    timer.add_bytes("download", 2048)
+    with pytest.raises(RuntimeError):
+        with timer.stage("upload"):
+            raise RuntimeError("boom")
+    c = timer.compact()
+    assert c["failed"] == "upload"
+    assert c["bytes"] == {"download": 2048}
+    assert set(c["ms"]) == {"upload"}
+
+
+def test_stage_keys_round_trip():
+    assert source_host("https://IS1-ssl.mzstatic.com/image/thumb/x.png") == "is1-ssl.mzstatic.com"
+    assert parse_stage_key(stage_key("download", "appstore", "is1-ssl.mzstatic.com")) == (
+        "download",
+        "appstore",
+        "is1-ssl.mzstatic.com",
+    )
+    assert parse_stage_key("GET /health 2xx") is None
+
+
+def test_admin_breakdown_by_platform_and_host():
+    timer = StageTimer()
+    with timer.stage("download"):
+        pass
+    timer.add_bytes("download", 4096)
+    timer.report("playstore", "play-lh.googleusercontent.com")
+
+    app = create_app()
+    app.dependency_overrides[get_principal] = lambda: type("U", (), {"role": "admin", "id": None})()
+    res = TestClient(app).get("/api/v1/admin/pipeline/stages", params={"scope": "process"})
+    assert res.status_code == 200
+    body = res.json()
+    host = body["stages"]["playstore"]["play-lh.googleusercontent.com"]
+    assert host["download"]["count"] >= 1
+    assert host["total"]["count"] >= 1
+    assert body["bytes"]["download"] >= 4096
+    assert metrics.counters()["pipeline.bytes.download"] >= 4096
@@ -0,0 +1,239 @@
+"""
+Repository behaviour on real data (TEST_DATABASE_URL, see conftest.pg_engine).
+"""
+import asyncio
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import EmailVerificationToken, PasswordResetToken, Screenshot, Session, UsageLog, User
+from app.repositories.screenshots import ScreenshotsRepository
+from app.repositories.sessions import SessionsRepository
+from app.repositories.tokens import TokensRepository
+from app.repositories.usage import UsageRepository
+
+NOW = datetime.now(timezone.utc)
+
+
+async def _users(db: AsyncSession, n: int, **fields) -> list[User]:
+    users = [User(email=f"u{i}@example.com", password_hash="x", **fields) for i in range(n)]
+    db.add_all(users)
+    await db.commit()
+    return users
+
+
+@pytest.mark.asyncio
+async def test_purge_deletes_dead_sessions_and_tokens_only(pg_engine):
+    day = timedelta(days=1)
+    async with AsyncSession(pg_engine, expire_on_commit=False) as db:
+        (user,) = await _users(db, 1)
+        # (expires_at, revoked/used_at): dead = expired or used/revoked before the cutoff.
+        states = {
+            "expired": (NOW - day, None),
+            "revoked": (NOW + day, NOW - day),
+            "live": (NOW + day, None),
+            "revoked_after_cutoff": (NOW + day, NOW + timedelta(minutes=1)),
+        }
+        for i in range(3):
+            for name, (expires_at, ended_at) in states.items():
+                h = f"{name}-{i}"
+                db.add(Session(user_id=user.id, refresh_token_hash=h, expires_at=expires_at, revoked_at=ended_at))
+                db.add(EmailVerificationToken(user_id=user.id, token_hash=h, expires_at=expires_at, used_at=ended_at))
+                db.add(PasswordResetToken(user_id=user.id, token_hash=h, expires_at=expires_at, used_at=ended_at))
+        await db.commit()
+
+        sessions, tokens = SessionsRepository(db), TokensRepository(db)
+        chunks = [
+            lambda after_id: sessions.purge_chunk(before=NOW, after_id=after_id, limit=2),
+            lambda after_id: tokens.purge_chunk("email_verification", before=NOW, after_id=after_id, limit=2),
+            lambda after_id: tokens.purge_chunk("password_reset", before=NOW, after_id=after_id, limit=2),
+        ]
+        for purge_chunk in chunks:
+            total, after_id = 0, None
+            while True:
+                deleted, after_id = await purge_chunk(after_id)
+                total += deleted
+                if after_id is None:
+                    break
+            assert total == 6
+
+        kept = sorted(f"{name}-{i}" for name in ("live", "revoked_after_cutoff") for i in range(3))
+        for column in (Session.refresh_token_hash, EmailVerificationToken.token_hash, PasswordResetToken.token_hash):
+            assert sorted((await db.execute(select(column))).scalars().all()) == kept, column
+
+
+def _rotate(db: AsyncSession, old: str, new: str, fingerprint: str | None = None):
+    return SessionsRepository(db).rotate(
+        refresh_token_hash=old, new_refresh_token_hash=new, expires_at=NOW + timedelta(days=30), device_fingerprint=fingerprint
+    )
+
+
+@pytest.mark.asyncio
+async def test_rotate_rejects_dead_tokens_and_wins_once(pg_engine):
+    async with AsyncSession(pg_engine, expire_on_commit=False) as db:
+        (user,) = await _users(db, 1, role="admin")
+        owner = user.id
+        db.add_all(
+            [
+                Session(user_id=owner, refresh_token_hash="live", expires_at=NOW + timedelta(days=1), device_fingerprint="fp"),
+                Session(user_id=owner, refresh_token_hash="revoked", expires_at=NOW + timedelta(days=1), revoked_at=NOW),
+                Session(user_id=owner, refresh_token_hash="expired", expires_at=NOW - timedelta(seconds=1)),
+            ]
+        )
+        await db.commit()
+        assert await _rotate(db, "revoked", "n1") is None
+        assert await _rotate(db, "expired", "n2") is None
+        assert await _rotate(db, "live", "n3", fingerprint="other-device") is None
+
+    # Concurrent refreshes of the same token: exactly one rotates it.
+    sessions = [AsyncSession(pg_engine, expire_on_commit=False) for _ in range(5)]
+    try:
+        results = await asyncio.gather(*(_rotate(db, "live", f"new-{i}", fingerprint="fp") for i, db in enumerate(sessions)))
+    finally:
+        for db in sessions:
+            await db.close()
+    winners = [r for r in results if r is not None]
+    assert len(winners) == 1
+    user_id, role, new_session = winners[0]
+    assert (user_id, role, new_session.device_fingerprint) == (owner, "admin", "fp")
+
+    async with AsyncSession(pg_engine) as db:
+        rows = {s.refresh_token_hash: s for s in (await db.execute(select(Session))).scalars()}
+    assert set(rows) == {"live", "revoked", "expired", new_session.refresh_token_hash}
+    assert rows["live"].revoked_at is not None
+    assert rows[new_session.refresh_token_hash].revoked_at is None
+    # The replacement rotates in turn; the revoked original never again.
+    async with AsyncSession(pg_engine, expire_on_commit=False) as db:
+        assert await _rotate(db, "live", "again", fingerprint="fp") is None
+        assert await _rotate(db, new_session.refresh_token_hash, "next", fingerprint="fp") is not None
+
+
+def _at(day: int, hour: int = 0, minute: int = 0, second: int = 0) -> datetime:
+    return datetime(2026, 1, day, hour, minute, second, tzinfo=timezone.utc)
+
+
+@pytest.mark.asyncio
+async def test_usage_logs_route_to_daily_partitions_and_expire_with_them(pg_engine):
+    async with AsyncSession(pg_engine, expire_on_commit=False) as db:
+        (user,) = await _users(db, 1)
+        repo = UsageRepository(db)
+        assert await repo.ensure_partitions(date(2026, 1, 1), 2) == ["usage_logs_p20260101", "usage_logs_p20260102"]
+        assert await repo.ensure_partitions(date(2026, 1, 1), 2) == []
+        stamps = {
+            "last_second_of_day_1": _at(1, 23, 59, 59),
+            "start_of_day_2": _at(2),
+            "no_partition": _at(3, 12),
+            "before_partitions": _at(1) - timedelta(seconds=1),
+        }
+        db.add_all(UsageLog(user_id=user.id, endpoint=name, timestamp=ts, response_time=1.0) for name, ts in stamps.items())
+        await db.commit()
+
+        async def placement() -> dict[str, str]:
+            rows = await db.execute(text("SELECT endpoint, tableoid::regclass::text FROM usage_logs"))
+            return dict(rows.all())
+
+        assert await placement() == {
+            "last_second_of_day_1": "usage_logs_p20260101",
+            "start_of_day_2": "usage_logs_p20260102",
+            "no_partition": "usage_logs_default",
+            "before_partitions": "usage_logs_default",
+        }
+        assert await repo.drop_partitions_before(date(2026, 1, 2)) == ["usage_logs_p20260101"]
+        assert await placement() == {"start_of_day_2": "usage_logs_p20260102", "no_partition": "usage_logs_default"}
+
+
+@pytest.mark.asyncio
+async def test_rollup_aggregates_buckets_and_overwrites_on_rerun(pg_engine):
+    async with AsyncSession(pg_engine, expire_on_commit=False) as db:
+        (user,) = await _users(db, 1)
+
+        def log(endpoint: str, ts: datetime, ms: float, status: int | None = 200) -> UsageLog:
+            return UsageLog(user_id=user.id, endpoint=endpoint, timestamp=ts, response_time=ms, status_code=status)
+
+        db.add_all(
+            [
+                log("/a", _at(5, 10, 0), 10, 200),
+                log("/a", _at(5, 10, 20), 20, 404),
+                log("/a", _at(5, 10, 40), 30, 500),
+                log("/a", _at(5, 10, 59, 59), 40, None),
+                log("/b", _at(5, 10, 5), 7, 200),
+                log("/a", _at(5, 11, 0), 5, 200),
+                log("/a", _at(5, 12, 0), 1000, 500),  # outside [10:00, 12:00)
+            ]
+        )
+        await db.commit()
+        repo = UsageRepository(db)
+
+        async def buckets() -> dict:
+            rows = await repo.list_rollups(granularity="hour", start=_at(5), end=_at(6))
+            return {(r.bucket_start.hour, r.endpoint): (r.request_count, r.error_count, r.total_ms, r.p50_ms, r.max_ms) for r in rows}
+
+        assert await repo.rollup("hour", _at(5, 10), _at(5, 12)) == 3
+        assert await buckets() == {
+            (10, "/a"): (4, 2, 100.0, 25.0, 40.0),
+            (10, "/b"): (1, 0, 7.0, 7.0, 7.0),
+            (11, "/a"): (1, 0, 5.0, 5.0, 5.0),
+        }
+
+        # A late row for an already rolled-up hour: the rerun replaces the bucket, it does not add to it.
+        db.add(log("/a", _at(5, 10, 30), 50, 503))
+        await db.commit()
+        assert await repo.rollup("hour", _at(5, 10), _at(5, 12)) == 3
+        assert (await buckets())[(10, "/a")] == (5, 3, 150.0, 30.0, 50.0)
+
+        assert await repo.rollup("day", _at(5), _at(6)) == 2
+        days = await repo.list_rollups(granularity="day", start=_at(5), end=_at(6), endpoint="/a")
+        assert [(r.bucket_start, r.request_count, r.error_count, r.max_ms) for r in days] == [(_at(5), 7, 4, 1000.0)]
+
+
+@pytest.mark.asyncio
+async def test_list_expired_applies_each_tiers_cutoff(pg_engine):
+    cutoffs = {"free": NOW - timedelta(days=30), "pro": NOW - timedelta(days=365), "enterprise": None}
+    async with AsyncSession(pg_engine, expire_on_commit=False) as db:
+        # "legacy" is not in cutoffs: it falls back to the free cutoff.
+        users = {tier: User(email=f"{tier}@example.com", password_hash="x", subscription_tier=tier) for tier in ("free", "pro", "enterprise", "legacy")}
+        db.add_all(users.values())
+        await db.commit()
+        ages = {"recent": 1, "older_than_free": 31, "older_than_pro": 400}
+        shots = {
+            (tier, age): Screenshot(
+                user_id=user.id, app_id="123", platform="appstore", url=f"https://example.com/{tier}/{age}.png", meta={"age": age}, created_at=NOW - timedelta(days=days)
+            )
+            for tier, user in users.items()
+            for age, days in ages.items()
+        }
+        db.add_all(shots.values())
+        await db.commit()
+        expected = {("free", "older_than_free"), ("free", "older_than_pro"), ("legacy", "older_than_free"), ("legacy", "older_than_pro"), ("pro", "older_than_pro")}
+
+        repo = ScreenshotsRepository(db)
+        rows, after_id = [], None
+        while page := await repo.list_expired(cutoffs, after_id=after_id, limit=2):
+            rows += page
+            after_id = page[-1][0]
+        assert [sid for sid, _ in rows] == sorted(shots[key].id for key in expected)
+        assert {(sid, meta["age"]) for sid, meta in rows} == {(shots[key].id, key[1]) for key in expected}
+
+        assert await repo.list_expired({"enterprise": None}, limit=10) == []
+
+
+@pytest.mark.asyncio
+async def test_find_similar_ranks_the_users_screenshots_by_hamming_distance(pg_engine):
+    base = 0xF0F0_0000_FFFF_1234  # high bit set: stored as a negative bigint
+    async with AsyncSession(pg_engine, expire_on_commit=False) as db:
+        owner, other = await _users(db, 2)
+        flips = {"same": 0, "near": 0b11, "edge": 0b11_1111 << 40, "far": 0b111_1111}
+
+        def shot(user: User, name: str) -> Screenshot:
+            return Screenshot(user_id=user.id, app_id="123", platform="appstore", url=f"https://example.com/{name}.png", status="COMPLETE")
+
+        shots = {name: shot(owner, name) for name in flips} | {"query": shot(owner, "query"), "foreign": shot(other, "foreign")}
+        db.add_all(shots.values())
+        await db.commit()
+        repo = ScreenshotsRepository(db)
+        await repo.set_dhashes({shots[name].id: base ^ f for name, f in flips.items()} | {shots["query"].id: base, shots["foreign"].id: base})
+
+        found = await repo.find_similar(owner.id, base, max_distance=6, limit=10, exclude_id=shots["query"].id)
+        assert [(s.url.rsplit("/", 1)[1], d) for s, d in found] == [("same.png", 0), ("near.png", 2), ("edge.png", 6)]
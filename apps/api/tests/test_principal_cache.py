@@ -0,0 +1,135 @@
+import asyncio
+import time
+import uuid
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import create_engine, update
+from sqlalchemy.orm import Session
+
+from app.cache.principals import ALL_USERS, INVALIDATE_CHANNEL, PrincipalCache, principal_cache
+from app.core.security import create_access_token, decode_token
+from app.models.user import User
+
+
+def _user(**overrides) -> User:
+    fields = dict(
+        id=uuid.uuid4(),
+        email="user@example.com",
+        password_hash="x",
+        role="user",
+        subscription_tier="free",
+        email_verified=True,
+        mfa_enabled=False,
+        locked_until=None,
+        created_at=datetime.now(timezone.utc),
+    )
+    fields.update(overrides)
+    return User(**fields)
+
+
+def test_access_tokens_carry_unique_ids():
+    a = decode_token(create_access_token("abc"))
+    b = decode_token(create_access_token("abc"))
+    assert a["jti"] != b["jti"]
+    assert "iat" in a
+
+
+def test_claims_are_not_cached_past_token_expiry():
+    cache = PrincipalCache(max_entries=10, ttl_seconds=30)
+    cache.remember_claims("live", {"sub": "x", "exp": time.time() + 60})
+    cache.remember_claims("expired", {"sub": "x", "exp": time.time() - 1})
+    assert cache.get_claims("live")["sub"] == "x"
+    assert cache.get_claims("expired") is None
+
+
+def test_principal_snapshot_is_reused_per_token():
+    cache = PrincipalCache(max_entries=10, ttl_seconds=30)
+    user = _user()
+    claims = {"exp": time.time() + 60}
+    cache.remember(user, "jti-1", claims)
+    assert cache.get(user.id, "jti-1").role == "user"
+    assert cache.get(user.id, "jti-2") is None
+
+
+def test_role_tier_and_lockout_changes_invalidate():
+    user = _user()
+    claims = {"exp": time.time() + 60}
+    try:
+        for attr, value in (
+            ("role", "admin"),
+            ("subscription_tier", "pro"),
+            ("locked_until", datetime.now(timezone.utc)),
+        ):
+            principal_cache.remember(user, "jti", claims)
+            setattr(user, attr, value)
+            assert principal_cache.get(user.id, "jti") is None, attr
+    finally:
+        principal_cache.clear()
+
+
+def _session():
+    engine = create_engine("sqlite://")
+    User.__table__.create(engine)
+    return Session(engine)
+
+
+def test_bulk_user_updates_drop_every_snapshot_on_commit(monkeypatch):
+    published = []
+    monkeypatch.setattr(principal_cache, "publish", published.append)
+    user = _user()
+    claims = {"exp": time.time() + 60}
+    try:
+        with _session() as db:
+            db.execute(update(User).values(role="admin"))
+            principal_cache.remember(user, "jti", claims)
+            db.rollback()
+            assert principal_cache.get(user.id, "jti") is not None
+            assert published == []
+
+            db.execute(update(User).where(User.id == user.id).values(locked_until=datetime.now(timezone.utc)))
+            db.commit()
+        assert principal_cache.get(user.id, "jti") is None
+        assert published == [{ALL_USERS}]
+    finally:
+        principal_cache.clear()
+
+
+def test_orm_changes_are_published_on_commit(monkeypatch):
+    published = []
+    monkeypatch.setattr(principal_cache, "publish", published.append)
+    user = _user()
+    user_id = user.id
+    with _session() as db:
+        db.add(user)
+        db.commit()
+        published.clear()
+        user.role = "admin"
+        user.email = "other@example.com"
+        db.commit()
+    assert published == [{user_id}]
+
+
+@pytest.mark.asyncio
+async def test_invalidations_from_other_processes_apply(monkeypatch, redis_async):
+    monkeypatch.setattr("app.cache.principals.get_redis_client", lambda: redis_async)
+    cache = PrincipalCache(max_entries=10, ttl_seconds=30)
+    a, b = _user(), _user()
+    claims = {"exp": time.time() + 60}
+    await cache.start()
+    try:
+        for _ in range(50):
+            if await redis_async.pubsub_numsub(INVALIDATE_CHANNEL) != [(INVALIDATE_CHANNEL, 0)]:
+                break
+            await asyncio.sleep(0.01)
+        cache.remember(a, "jti", claims)
+        cache.remember(b, "jti", claims)
+        cache.publish({a.id})
+        for _ in range(100):
+            if cache.get(a.id, "jti") is None:
+                break
+            await asyncio.sleep(0.01)
+        assert cache.get(a.id, "jti") is None
+        assert cache.get(b.id, "jti") is not None
+    finally:
+        await cache.stop()
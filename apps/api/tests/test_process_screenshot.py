@@ -0,0 +1,127 @@
+import uuid
+from pathlib import Path
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from app.core.config import settings
+from app.processing.circuit_breaker import CircuitOpen
+from app.processing.retry_policy import PermanentError
+from app.tasks import screenshot_tasks
+from app.tasks.screenshot_tasks import process_screenshot
+
+URL = "https://is1-ssl.mzstatic.com/image/thumb/a.png"
+
+
+class Retried(Exception):
+    pass
+
+
+@pytest.fixture
+def task(monkeypatch, fake_db):
+    """Runs process_screenshot eagerly with downloads, the database, the broker and retries faked."""
+    monkeypatch.setattr(settings, "REDIS_URL", None)
+    monkeypatch.setattr(settings, "RETRY_MAX_RETRIES", 3)
+    monkeypatch.setattr(settings, "CIRCUIT_MAX_DEFERRALS", 5)
+    row = SimpleNamespace(id=uuid.uuid4(), user_id=uuid.uuid4(), url=URL, platform="appstore", status="QUEUED", meta={})
+    state = SimpleNamespace(row=row, commits=[], sent=[], retries=[], error=None)
+
+    def respond(sql):
+        if sql.startswith("UPDATE"):
+            # claim_for_processing: SET status = 'PROCESSING' unless SUPERSEDED/COMPLETE
+            if row.status in ("SUPERSEDED", "COMPLETE"):
+                return []
+            row.status = "PROCESSING"
+        return [row]
+
+    async def download(url, r=None):
+        raise state.error
+
+    def send_task(name, **options):
+        state.sent.append((name, options))
+
+    def retry(exc=None, countdown=None, kwargs=None, **_options):
+        state.retries.append({"countdown": countdown, "kwargs": kwargs})
+        return Retried(type(exc).__name__)
+
+    monkeypatch.setattr(screenshot_tasks, "_download", download)
+    monkeypatch.setattr(screenshot_tasks, "SessionLocal", lambda: fake_db(respond, on_commit=lambda: state.commits.append(row.status)))
+    monkeypatch.setattr(screenshot_tasks.celery_app, "send_task", send_task)
+    monkeypatch.setattr(screenshot_tasks.scheduler, "dispatch", lambda: 0)
+    monkeypatch.setattr(process_screenshot, "retry", retry)
+
+    def run(error, *, failures=0, retries=0):
+        state.error = error
+        kwargs = {"tier": "pro", "enqueued_at": None, "failures": failures}
+        return process_screenshot.apply(args=[str(row.id), "batch", 2], kwargs=kwargs, retries=retries).result
+
+    state.run = run
+    return state
+
+
+def test_transient_failure_requeues_and_counts_a_failure(task):
+    result = task.run(httpx.ConnectError("refused"), failures=1, retries=1)
+
+    assert isinstance(result, Retried)
+    assert task.commits == ["PROCESSING", "QUEUED"]
+    assert task.row.meta["retry"]["kind"] == "transient"
+    (retry,) = task.retries
+    assert retry["kwargs"] == {"tier": "pro", "enqueued_at": None, "failures": 2}
+    assert retry["countdown"] > 0
+    assert task.sent == []
+
+
+def test_circuit_deferral_does_not_use_up_retries(task):
+    # As many failures as allowed: another transient one would be final, a deferral is not.
+    result = task.run(CircuitOpen("is1-ssl.mzstatic.com", 12.0), failures=3, retries=4)
+
+    assert isinstance(result, Retried)
+    assert task.commits[-1] == "QUEUED"
+    (retry,) = task.retries
+    assert retry["kwargs"]["failures"] == 3
+    assert retry["countdown"] >= 12.0
+    assert task.sent == []
+
+
+def test_permanent_failure_fails_once_and_dead_letters_once(task):
+    result = task.run(PermanentError("Not an image response"))
+
+    assert isinstance(result, PermanentError)
+    assert task.commits == ["PROCESSING", "FAILED"]
+    assert task.row.meta["error"] == "Not an image response"
+    assert task.retries == []
+    ((name, options),) = task.sent
+    assert name == "process_screenshot" and options["queue"] == "dead"
+    assert options["args"] == [str(task.row.id), "batch", 2]
+    assert options["headers"]["dead_letter"]["kind"] == "permanent"
+
+
+def test_exhausted_retries_dead_letter_once(task):
+    task.run(httpx.ReadTimeout("slow"), failures=3, retries=3)
+
+    assert task.commits == ["PROCESSING", "FAILED"]
+    assert task.retries == []
+    assert [options["queue"] for _, options in task.sent] == ["dead"]
+
+
+@pytest.mark.parametrize("status", ["SUPERSEDED", "COMPLETE"])
+def test_superseded_or_complete_rows_are_not_processed_again(task, status):
+    task.row.status = status
+    assert task.run(AssertionError("downloaded")) is None
+    assert task.row.status == status
+    assert task.retries == [] and task.sent == []
+
+
+def test_no_worker_consumes_the_dead_queue():
+    """A consumed dead letter would run the failed job again, and fail again, forever."""
+    infra = Path(__file__).resolve().parents[3] / "infrastructure"
+    files = [infra / "k8s/apps/celery.yaml", infra / "docker/docker-compose.dev.yml", infra / "docker/docker-compose.staging.yml"]
+    if not all(f.exists() for f in files):
+        pytest.skip("infrastructure/ not checked out")
+    for f in files:
+        commands = [line for line in f.read_text().splitlines() if '"worker"' in line and '"-Q"' in line]
+        assert commands, f
+        for line in commands:
+            queues = line.split('"-Q", "')[1].split('"')[0].split(",")
+            assert "dead" not in queues, f
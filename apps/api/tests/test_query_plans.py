@@ -0,0 +1,121 @@
+"""
+Plan regression checks against a real Postgres (TEST_DATABASE_URL, see conftest.pg_engine).
+"""
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.base import Base
+from app.models import APIKey, EmailVerificationToken, IPDenylist, PasswordResetToken, Screenshot, Session, User
+from app.repositories.api_keys import APIKeysRepository
+from app.repositories.ip_lists import IPListsRepository
+from app.repositories.screenshots import ScreenshotsRepository
+from app.repositories.sessions import SessionsRepository
+from app.repositories.tokens import TokensRepository
+from app.repositories.usage import UsageRepository, is_usage_partition
+from app.repositories.users import UsersRepository
+
+# Queries that read a whole table by design.
+FULL_SCANS = ("FROM ip_allowlist", "FROM ip_denylist")
+
+
+def _include_object(_obj, name, type_, reflected, _compare_to) -> bool:
+    return not (type_ == "table" and reflected and is_usage_partition(name))
+
+
+async def _seed(engine) -> dict:
+    now = datetime.now(timezone.utc)
+    users = [User(email=f"u{i}@example.com", password_hash="x") for i in range(200)]
+    async with AsyncSession(engine, expire_on_commit=False) as db:
+        db.add_all(users)
+        await db.flush()
+        for i, u in enumerate(users):
+            db.add_all(
+                [Screenshot(user_id=u.id, app_id=f"app{j}", platform="appstore", url="https://x", meta={}) for j in range(5)]
+            )
+            db.add(APIKey(user_id=u.id, key_hash=f"key{i}", permissions={}))
+            db.add(Session(user_id=u.id, refresh_token_hash=f"rt{i}", expires_at=now + timedelta(days=30)))
+            db.add(EmailVerificationToken(user_id=u.id, token_hash=f"ev{i}", expires_at=now + timedelta(days=1)))
+            db.add(PasswordResetToken(user_id=u.id, token_hash=f"pr{i}", expires_at=now + timedelta(days=1)))
+            db.add(IPDenylist(user_id=u.id, ip=f"10.0.{i // 256}.{i % 256}/32"))
+        await db.commit()
+        shot = (await ScreenshotsRepository(db).list_for_user(users[0].id))[0]
+        key = (await APIKeysRepository(db).list_for_user(users[0].id))[0]
+    async with engine.connect() as conn:
+        await conn.execute(text("ANALYZE"))
+    return {"user": users[0], "shot": shot, "key": key}
+
+
+async def _repository_calls(engine, seeded) -> None:
+    user, shot, key = seeded["user"], seeded["shot"], seeded["key"]
+    async with AsyncSession(engine, expire_on_commit=False) as db:
+        await UsersRepository(db).get_by_email(user.email)
+        await UsersRepository(db).get_by_id(user.id)
+        await ScreenshotsRepository(db).list_for_user(user.id)
+        await ScreenshotsRepository(db).get_for_user(user.id, shot.id)
+        await ScreenshotsRepository(db).claim_for_processing(shot.id)
+        await ScreenshotsRepository(db).update_status(shot.id, "DONE")
+        await ScreenshotsRepository(db).list_current_for_app(user.id, shot.app_id, shot.platform)
+        await ScreenshotsRepository(db).find_similar(user.id, 0x0123456789ABCDEF, max_distance=6, limit=20, exclude_id=shot.id)
+        await APIKeysRepository(db).list_for_user(user.id)
+        await APIKeysRepository(db).get_for_user(user.id, key.id)
+        await APIKeysRepository(db).get_by_hash("key0")
+        await SessionsRepository(db).get_by_refresh_hash("rt0")
+        await SessionsRepository(db).rotate(
+            refresh_token_hash="rt1",
+            new_refresh_token_hash=f"rt-{uuid.uuid4()}",
+            expires_at=datetime.now(timezone.utc) + timedelta(days=30),
+            device_fingerprint=None,
+        )
+        await TokensRepository(db).get_email_verification("ev0")
+        await TokensRepository(db).get_password_reset("pr0")
+        await IPListsRepository(db).list_all("deny")
+        await IPListsRepository(db).remove(list_name="deny", ip="10.0.0.0/32", user_id=user.id)
+        now = datetime.now(timezone.utc)
+        await SessionsRepository(db).purge_chunk(before=now, limit=100)
+        await ScreenshotsRepository(db).list_expired({"free": now, "pro": None}, limit=100)
+        await ScreenshotsRepository(db).list_unhashed(after_id=shot.id, limit=100)
+        await TokensRepository(db).purge_chunk("password_reset", before=now, limit=100)
+        await UsageRepository(db).list_rollups(granularity="hour", start=now - timedelta(days=1), end=now, user_id=user.id)
+
+
+@pytest.mark.asyncio
+async def test_migrations_match_models(pg_engine):
+    async with pg_engine.connect() as conn:
+        diff = await conn.run_sync(
+            lambda c: compare_metadata(
+                MigrationContext.configure(c, opts={"compare_type": True, "include_object": _include_object}),
+                Base.metadata,
+            )
+        )
+    assert diff == []
+
+
+@pytest.mark.asyncio
+async def test_repository_queries_use_indexes(pg_engine):
+    seeded = await _seed(pg_engine)
+    captured = []
+
+    @event.listens_for(pg_engine.sync_engine, "before_cursor_execute")
+    def _capture(_conn, _cursor, statement, parameters, _context, _executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "UPDATE", "DELETE")):
+            captured.append((statement, parameters))
+
+    await _repository_calls(pg_engine, seeded)
+    event.remove(pg_engine.sync_engine, "before_cursor_execute", _capture)
+    assert captured
+
+    async with pg_engine.connect() as conn:
+        # Small tables make seq scans cheapest; only fail when no index could serve the query.
+        await conn.execute(text("SET enable_seqscan = off"))
+        for statement, parameters in captured:
+            if any(marker in statement for marker in FULL_SCANS) and "WHERE" not in statement:
+                continue
+            res = await conn.exec_driver_sql("EXPLAIN " + statement, parameters)
+            plan = "\n".join(row[0] for row in res)
+            assert "Seq Scan" not in plan, f"{statement}\n{plan}"
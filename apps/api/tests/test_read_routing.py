@@ -0,0 +1,55 @@
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+from app.db import session as db_session
+
+
+def _request(principal_id=None):
+    return SimpleNamespace(state=SimpleNamespace(principal_id=principal_id))
+
+
+@pytest.fixture
+def replica(monkeypatch):
+    # A second sessionmaker stands in for the replica; only its session class differs.
+    monkeypatch.setattr(db_session, "ReadSessionLocal", db_session.async_sessionmaker(db_session.engine))
+    monkeypatch.setattr(db_session, "get_redis_client", lambda: None)
+    db_session._recent_writers.clear()
+
+
+async def _session_kind(request):
+    gen = db_session.get_read_db(request)
+    session = await gen.__anext__()
+    kind = "primary" if isinstance(session.sync_session, db_session.PrimarySession) else "replica"
+    await gen.aclose()
+    return kind
+
+
+@pytest.mark.asyncio
+async def test_reads_go_to_replica_until_the_caller_writes(replica):
+    user_id = uuid.uuid4()
+    assert await _session_kind(_request(user_id)) == "replica"
+
+    await db_session.mark_recent_write(user_id)
+    assert await _session_kind(_request(user_id)) == "primary"
+    assert await _session_kind(_request(uuid.uuid4())) == "replica"
+    assert await _session_kind(_request()) == "replica"
+
+
+@pytest.mark.asyncio
+async def test_commits_mark_the_caller_as_recent_writer(replica):
+    user_id = uuid.uuid4()
+    gen = db_session.get_db(_request(user_id))
+    session = await gen.__anext__()
+    db_session._remember_commit(session.sync_session)
+    await gen.aclose()
+    assert await db_session.wrote_recently(user_id)
+
+
+@pytest.mark.asyncio
+async def test_no_replica_configured_keeps_single_pool(monkeypatch):
+    monkeypatch.setattr(db_session, "get_redis_client", lambda: None)
+    user_id = uuid.uuid4()
+    await db_session.mark_recent_write(user_id)
+    assert not await db_session.wrote_recently(user_id)
@@ -0,0 +1,127 @@
+import httpx
+import pytest
+
+from app.core.config import settings
+from app.processing.circuit_breaker import CircuitBreaker, CircuitOpen
+from app.processing.host_limits import HostLimitTimeout
+from app.processing.retry_policy import PermanentError, backoff_seconds, classify, decide, is_origin_failure
+
+HOST = "is1-ssl.mzstatic.com"
+
+
+def _status_error(status: int, headers: dict | None = None) -> httpx.HTTPStatusError:
+    request = httpx.Request("GET", f"https://{HOST}/a.png")
+    response = httpx.Response(status, headers=headers, request=request)
+    return httpx.HTTPStatusError(f"{status}", request=request, response=response)
+
+
+@pytest.fixture(autouse=True)
+def _policy(monkeypatch):
+    monkeypatch.setattr(settings, "RETRY_MAX_RETRIES", 3)
+    monkeypatch.setattr(settings, "RETRY_BACKOFF_BASE_SECONDS", 2.0)
+    monkeypatch.setattr(settings, "RETRY_BACKOFF_MAX_SECONDS", 60.0)
+    monkeypatch.setattr(settings, "CIRCUIT_WINDOW_SECONDS", 60.0)
+    monkeypatch.setattr(settings, "CIRCUIT_MIN_FAILURES", 3)
+    monkeypatch.setattr(settings, "CIRCUIT_FAILURE_RATIO", 0.5)
+    monkeypatch.setattr(settings, "CIRCUIT_OPEN_SECONDS", 30.0)
+    monkeypatch.setattr(settings, "CIRCUIT_MAX_DEFERRALS", 2)
+
+
+def test_classify():
+    assert classify(_status_error(404))[0] == "permanent"
+    assert classify(_status_error(403))[0] == "permanent"
+    assert classify(_status_error(429)) == ("transient", "http 429")
+    assert classify(_status_error(503))[0] == "transient"
+    assert classify(PermanentError("Not an image response")) == ("permanent", "Not an image response")
+    assert classify(httpx.ReadTimeout("slow"))[0] == "transient"
+    assert classify(httpx.ConnectError("refused"))[0] == "transient"
+    assert classify(CircuitOpen(HOST, 5.0))[0] == "deferred"
+    assert classify(HostLimitTimeout("busy"))[0] == "deferred"
+    assert classify(ValueError("?"))[0] == "transient"
+
+
+def test_origin_failures():
+    assert is_origin_failure(_status_error(502))
+    assert is_origin_failure(httpx.ConnectTimeout("slow"))
+    assert not is_origin_failure(_status_error(404))
+
+
+def test_permanent_is_final_at_once():
+    d = decide(_status_error(404), failures=0, deferrals=0)
+    assert d.final and d.kind == "permanent"
+
+
+def test_transient_retries_until_exhausted():
+    assert not decide(_status_error(503), failures=2, deferrals=0).final
+    assert decide(_status_error(503), failures=3, deferrals=0).final
+
+
+def test_retry_after_sets_the_floor():
+    d = decide(_status_error(429, {"retry-after": "45"}), failures=0, deferrals=0)
+    assert d.delay >= 45
+
+
+def test_backoff_is_jittered_exponential_and_capped():
+    for attempt in range(8):
+        ceiling = min(60.0, 2.0 * 2**attempt)
+        assert ceiling / 2 <= backoff_seconds(attempt) <= ceiling
+
+
+def test_deferrals_do_not_use_up_retries():
+    d = decide(CircuitOpen(HOST, 10.0), failures=3, deferrals=0)
+    assert not d.final and d.delay >= 10.0
+    assert decide(CircuitOpen(HOST, 10.0), failures=0, deferrals=2).final
+
+
+@pytest.mark.asyncio
+async def test_breaker_opens_on_failure_spike_and_half_opens(monkeypatch):
+    breaker = CircuitBreaker()
+    now = [1000.0]
+    monkeypatch.setattr("app.processing.circuit_breaker.time.time", lambda: now[0])
+
+    for _ in range(3):
+        await breaker.check(HOST)
+        assert await breaker.record(HOST, True) == "closed"
+    # 3 failures out of 6 fetches: at the threshold.
+    assert await breaker.record(HOST, False) == "closed"
+    assert await breaker.record(HOST, False) == "closed"
+    assert await breaker.record(HOST, False) == "opened"
+
+    with pytest.raises(CircuitOpen) as info:
+        await breaker.check(HOST)
+    assert info.value.retry_after == pytest.approx(30.0)
+    assert (await breaker.snapshot())[HOST]["state"] == "open"
+
+    # Half-open: one probe goes through, everyone else keeps waiting.
+    now[0] += 31
+    await breaker.check(HOST)
+    with pytest.raises(CircuitOpen):
+        await breaker.check(HOST)
+    assert await breaker.record(HOST, False) == "opened"
+    with pytest.raises(CircuitOpen):
+        await breaker.check(HOST)
+
+    now[0] += 31
+    await breaker.check(HOST)
+    assert await breaker.record(HOST, True) == "closed"
+    await breaker.check(HOST)
+    assert await breaker.snapshot() == {}
+
+
+@pytest.mark.asyncio
+async def test_breaker_ignores_failures_below_ratio_and_old_windows(monkeypatch):
+    breaker = CircuitBreaker()
+    now = [1000.0]
+    monkeypatch.setattr("app.processing.circuit_breaker.time.time", lambda: now[0])
+
+    for _ in range(10):
+        await breaker.record(HOST, True)
+    for _ in range(3):
+        assert await breaker.record(HOST, False) == "closed"
+
+    now[0] += 61
+    await breaker.record(HOST, False)
+    await breaker.record(HOST, False)
+    now[0] += 61
+    assert await breaker.record(HOST, False) == "closed"
+    await breaker.check(HOST)
@@ -0,0 +1,175 @@
+import json
+import time
+
+from fastapi.testclient import TestClient
+
+from app.api.deps import get_principal
+from app.core.config import settings
+from app.main import create_app
+from app.monitoring.metrics import metrics
+from app.tasks.scheduler import _DISPATCH_LUA, _STAGE_LUA, PREFIX, FairScheduler, metric_key, tier_queue, tier_weights
+
+
+class FakeScript:
+    def __init__(self, result=None):
+        self.calls = []
+        self.result = result or []
+
+    def __call__(self, keys=None, args=None):
+        self.calls.append(list(args))
+        return self.result
+
+
+def _scheduler(monkeypatch, sent, fail_ids=()):
+    sched = FairScheduler()
+
+    def send(job, queue):
+        if job["args"][0] in fail_ids:
+            raise ConnectionError("broker down")
+        sent.append((job["args"][0], queue))
+
+    monkeypatch.setattr(sched, "_send", send)
+    return sched
+
+
+def test_tiers_map_to_queues():
+    assert tier_queue("enterprise") == "urgent"
+    assert tier_queue("Pro") == "normal"
+    assert tier_queue("free") == "low"
+    assert tier_queue(None) == "low"
+    assert tier_queue("unknown") == "low"
+
+
+def test_tier_weights(monkeypatch):
+    assert tier_weights() == {"enterprise": 6, "pro": 3, "free": 1}
+    monkeypatch.setattr(settings, "SCHEDULER_TIER_WEIGHTS", "Pro:4, bogus:9, free:x")
+    assert tier_weights() == {"enterprise": 1, "pro": 4, "free": 1}
+
+
+def test_without_redis_jobs_go_straight_to_tier_queue(monkeypatch):
+    monkeypatch.setattr(settings, "SCHEDULER_ENABLED", False)
+    sent = []
+    sched = _scheduler(monkeypatch, sent)
+    sched.submit([["a", None, 0], ["b", None, 1]], tenant="t1", tier="pro")
+    assert sent == [("a", "normal"), ("b", "normal")]
+    assert sched.dispatch() == 0
+
+
+def test_submit_stages_per_tenant_then_dispatches(monkeypatch):
+    sent = []
+    sched = _scheduler(monkeypatch, sent)
+    sched._redis, sched._stage, sched._dispatch = object(), FakeScript(), FakeScript()
+    sched.submit([["a", "batch", 0]], tenant="t1", tier="Enterprise")
+
+    prefix, tier, tenant, end, raw = sched._stage.calls[0]
+    assert (tier, tenant, end) == ("enterprise", "t1", "tail")
+    assert json.loads(raw)["args"] == ["a", "batch", 0]
+    # Depth shared by all queues, then tiers in priority order with their base queue (1-based index
+    # into low, normal, urgent) and weight, then the queues.
+    args = sched._dispatch.calls[0]
+    assert args[4:6] == [settings.SCHEDULER_QUEUE_DEPTH, 3]
+    assert args[6:15] == ["enterprise", 3, 6, "pro", 2, 3, "free", 1, 1]
+    assert args[15:] == ["low", "normal", "urgent"]
+
+
+def test_dispatch_sends_released_jobs_and_restages_failures(monkeypatch):
+    sent = []
+    sched = _scheduler(monkeypatch, sent, fail_ids=("b",))
+    jobs = [{"args": [sid, None, i], "tier": "free", "tenant": "t1", "ts": 0.0} for i, sid in enumerate("abc")]
+    released = []
+    for job, queue in zip(jobs, ("low", "low", "normal")):
+        released += [json.dumps(job), queue]
+    sched._redis, sched._stage, sched._dispatch = object(), FakeScript(), FakeScript(released)
+    before = metrics.histograms().get(metric_key("staged", "free"), (None, 0))[0]
+    before = before.count if before else 0
+
+    assert sched.dispatch() == 2
+    assert sent == [("a", "low"), ("c", "normal")]
+    assert sched._stage.calls == [["sched", "free", "t1", "head", json.dumps(jobs[1])]]
+    assert metrics.histograms()[metric_key("staged", "free")][0].count == before + 2
+
+
+def test_admin_scheduler_report(monkeypatch):
+    metrics.observe(metric_key("latency", "pro"), 1500.0, is_error=False)
+    monkeypatch.setattr(settings, "SCHEDULER_ENABLED", False)
+    app = create_app()
+    app.dependency_overrides[get_principal] = lambda: type("U", (), {"role": "admin", "id": None})()
+    res = TestClient(app).get("/api/v1/admin/scheduler", params={"scope": "process"})
+    assert res.status_code == 200
+    tiers = res.json()["tiers"]
+    assert set(tiers) == {"enterprise", "pro", "free"}
+    assert tiers["pro"]["queue"] == "normal"
+    assert tiers["pro"]["latency_ms"]["count"] >= 1
+    assert tiers["free"]["staged"] == {"tenants": 0, "jobs": 0}
+
+
+def _redis_scheduler(monkeypatch, r):
+    """Scheduler running the real scripts; "sent" jobs are pushed onto the queue lists like the broker would."""
+    sched = FairScheduler()
+    sched._redis, sched._stage, sched._dispatch = r, r.register_script(_STAGE_LUA), r.register_script(_DISPATCH_LUA)
+    sent = []
+
+    def send(job, queue):
+        r.rpush(queue, json.dumps(job))
+        sent.append((job["tenant"], job["tier"], queue))
+
+    monkeypatch.setattr(sched, "_send", send)
+    return sched, sent
+
+
+def _stage(sched, tenant, tier, n, ts):
+    jobs = [json.dumps({"args": [f"{tenant}-{i}", None, i], "tier": tier, "tenant": tenant, "ts": ts}) for i in range(n)]
+    sched._stage(args=[PREFIX, tier, tenant, "tail", *jobs])
+
+
+def test_lua_interleaves_a_burst_with_other_tenants(monkeypatch, redis_sync):
+    monkeypatch.setattr(settings, "SCHEDULER_QUEUE_DEPTH", 100)
+    sched, sent = _redis_scheduler(monkeypatch, redis_sync)
+    now = time.time()
+    _stage(sched, "burst", "free", 20, now)
+    _stage(sched, "b", "free", 2, now)
+    _stage(sched, "c", "free", 2, now)
+
+    assert sched.dispatch() == 24
+    assert [tenant for tenant, _, _ in sent[:7]] == ["burst", "b", "c", "burst", "b", "c", "burst"]
+    assert sched.backlog()["free"] == {"tenants": 0, "jobs": 0}
+    assert not redis_sync.exists(f"{PREFIX}:active:free")
+
+
+def test_lua_promotes_old_jobs(monkeypatch, redis_sync):
+    monkeypatch.setattr(settings, "SCHEDULER_AGING_SECONDS", 60.0)
+    sched, sent = _redis_scheduler(monkeypatch, redis_sync)
+    now = time.time()
+    _stage(sched, "old", "free", 1, now - 130)
+    _stage(sched, "mid", "free", 1, now - 70)
+    _stage(sched, "new", "free", 1, now)
+    _stage(sched, "paid", "pro", 1, now - 500)
+
+    sched.dispatch()
+    assert sorted((tenant, queue) for tenant, _, queue in sent) == [
+        ("mid", "normal"),
+        ("new", "low"),
+        ("old", "urgent"),
+        ("paid", "urgent"),
+    ]
+
+
+def test_lua_splits_releases_by_tier_weight_within_depth(monkeypatch, redis_sync):
+    monkeypatch.setattr(settings, "SCHEDULER_QUEUE_DEPTH", 10)
+    monkeypatch.setattr(settings, "SCHEDULER_AGING_SECONDS", 0.0)
+    sched, sent = _redis_scheduler(monkeypatch, redis_sync)
+    now = time.time()
+    for tier in ("free", "pro", "enterprise"):
+        _stage(sched, f"{tier}-tenant", tier, 40, now)
+
+    assert sched.dispatch() == 10
+    assert sum(redis_sync.llen(q) for q in ("low", "normal", "urgent")) == 10
+    assert sched.dispatch() == 0
+
+    # Workers finish one job at a time; each finish releases one. The 6:3:1 split still holds.
+    sent.clear()
+    for _ in range(20):
+        next(q for q in ("low", "normal", "urgent") if redis_sync.lpop(q))
+        assert sched.dispatch() == 1
+    counts = {tier: sum(1 for _, t, _ in sent if t == tier) for tier in ("enterprise", "pro", "free")}
+    assert counts == {"enterprise": 12, "pro": 6, "free": 2}
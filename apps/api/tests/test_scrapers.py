@@ -0,0 +1,36 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from app.processing.scrapers import parse_app_store_lookup, parse_play_store_html
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def test_parse_app_store_lookup_dedupes_phone_and_ipad_screenshots():
+    data = json.loads((FIXTURES / "appstore_lookup.json").read_text())
+    result = parse_app_store_lookup("284882215", data)
+    assert result.platform == "appstore"
+    assert result.title == "Example Notes - Docs & Tasks"
+    assert result.developer == "Example Labs, Inc."
+    assert len(result.screenshots) == 18
+    assert len(set(result.screenshots)) == len(result.screenshots)
+
+
+def test_parse_app_store_lookup_without_results():
+    with pytest.raises(RuntimeError):
+        parse_app_store_lookup("1", {"resultCount": 0, "results": []})
+
+
+def test_parse_play_store_html_skips_icon_and_unescapes():
+    html = (FIXTURES / "playstore_details.html").read_text()
+    result = parse_play_store_html("com.example.notes", html)
+    assert result.platform == "playstore"
+    assert result.title.startswith("Example Notes")
+    assert result.screenshots
+    assert len(set(result.screenshots)) == len(result.screenshots)
+    icon = html.split('property="og:image" content="')[1].split('"')[0]
+    assert icon not in result.screenshots
+    assert not any("\\u003d" in u for u in result.screenshots)
+    assert all(u.startswith("https://play-lh.googleusercontent.com/") for u in result.screenshots)
@@ -0,0 +1,129 @@
+import io
+import uuid
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app.api.deps import get_principal
+from app.db.session import get_read_db
+from app.main import create_app
+from app.processing.transforms import Transformer
+from app.storage import s3
+
+OWNER, OTHER = uuid.uuid4(), uuid.uuid4()
+DONE, PENDING, FOREIGN = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+PREFIX = f"screenshots/{OWNER}/{DONE}"
+
+
+def _shot(sid, user_id, status="COMPLETE", meta=None, dhash=None):
+    return SimpleNamespace(
+        id=sid,
+        user_id=user_id,
+        app_id="123",
+        platform="appstore",
+        url=f"https://is1-ssl.mzstatic.com/{sid}.png",
+        meta=meta or {},
+        status=status,
+        created_at=datetime(2026, 1, 1, tzinfo=timezone.utc),
+        dhash=dhash,
+    )
+
+
+ROWS = {
+    DONE: _shot(
+        DONE,
+        OWNER,
+        meta={
+            "width": 1290,
+            "height": 2796,
+            "webp_key": f"{PREFIX}/image.webp",
+            "variants": [
+                {"width": 720, "height": 1561, "key": f"{PREFIX}/w720.webp"},
+                {"width": 320, "height": 694, "key": f"{PREFIX}/w320.webp"},
+            ],
+        },
+        dhash=-5,
+    ),
+    PENDING: _shot(PENDING, OWNER, status="PROCESSING"),
+    FOREIGN: _shot(FOREIGN, OTHER, meta={"width": 10, "height": 10, "webp_key": "screenshots/x/image.webp"}, dhash=7),
+}
+
+
+class FakeRepo:
+    """Owner-scoped lookups over ROWS, like ScreenshotsRepository."""
+
+    similar_calls = []
+
+    def __init__(self, db):
+        pass
+
+    async def get_for_user(self, user_id, screenshot_id):
+        s = ROWS.get(uuid.UUID(str(screenshot_id)))
+        return s if s is not None and s.user_id == user_id else None
+
+    async def find_similar(self, user_id, dhash, *, max_distance, limit, exclude_id=None):
+        self.similar_calls.append((user_id, dhash, max_distance, limit, exclude_id))
+        return [(ROWS[PENDING], 3)]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr("app.services.screenshots.ScreenshotsRepository", FakeRepo)
+    monkeypatch.setattr(FakeRepo, "similar_calls", [])
+    app = create_app()
+    app.dependency_overrides[get_principal] = lambda: SimpleNamespace(id=OWNER, role="user", subscription_tier="pro")
+    app.dependency_overrides[get_read_db] = lambda: None
+    return TestClient(app)
+
+
+def test_similar(client):
+    res = client.get(f"/api/v1/screenshots/{DONE}/similar", params={"max_distance": 4, "limit": 5})
+    assert res.status_code == 200
+    (hit,) = res.json()
+    assert hit["distance"] == 3
+    assert hit["screenshot"]["id"] == str(PENDING) and hit["screenshot"]["user_id"] == str(OWNER)
+    assert FakeRepo.similar_calls == [(OWNER, (1 << 64) - 5, 4, 5, DONE)]
+
+    assert client.get(f"/api/v1/screenshots/{PENDING}/similar").status_code == 409
+    assert client.get(f"/api/v1/screenshots/{FOREIGN}/similar").status_code == 404
+    assert client.get(f"/api/v1/screenshots/{DONE}/similar", params={"max_distance": 99}).status_code == 422
+
+
+def test_srcset(client, monkeypatch):
+    monkeypatch.setattr(s3, "object_urls", lambda keys: [f"https://cdn.example.com/{k}" for k in keys])
+    res = client.get(f"/api/v1/screenshots/{DONE}/srcset")
+    assert res.status_code == 200
+    body = res.json()
+    assert [(i["width"], i["height"]) for i in body["images"]] == [(320, 694), (720, 1561), (1290, 2796)]
+    assert body["images"][-1]["url"] == f"https://cdn.example.com/{PREFIX}/image.webp"
+    assert body["srcset"] == ", ".join(f"{i['url']} {i['width']}w" for i in body["images"])
+
+    assert client.get(f"/api/v1/screenshots/{PENDING}/srcset").status_code == 409
+    assert client.get(f"/api/v1/screenshots/{FOREIGN}/srcset").status_code == 404
+
+
+def test_transform(client, monkeypatch):
+    buf = io.BytesIO()
+    Image.new("RGB", (320, 694), (10, 120, 200)).save(buf, format="WEBP")
+    stored = {f"{PREFIX}/w320.webp": buf.getvalue()}
+    monkeypatch.setattr(s3, "get_bytes", stored.get)
+    monkeypatch.setattr(s3, "upload_bytes", lambda key, data, content_type: stored.__setitem__(key, data))
+    monkeypatch.setattr("app.api.v1.endpoints.screenshots.transformer", Transformer())
+
+    res = client.get(f"/api/v1/screenshots/{DONE}/transform", params={"width": 100, "format": "png"})
+    assert res.status_code == 200
+    assert res.headers["content-type"] == "image/png"
+    assert res.headers["x-transform-cache"] == "rendered"
+    assert Image.open(io.BytesIO(res.content)).size == (100, 217)
+    again = client.get(f"/api/v1/screenshots/{DONE}/transform", params={"width": 100, "format": "png"})
+    assert again.headers["x-transform-cache"] == "memory" and again.content == res.content
+
+    assert client.get(f"/api/v1/screenshots/{PENDING}/transform", params={"width": 100}).status_code == 409
+    assert client.get(f"/api/v1/screenshots/{FOREIGN}/transform", params={"width": 100}).status_code == 404
+    assert client.get(f"/api/v1/screenshots/{DONE}/transform", params={"width": 100, "fit": "zoom"}).status_code == 422
+    # Nothing stored to render from.
+    res = client.get(f"/api/v1/screenshots/{DONE}/transform", params={"width": 1000})
+    assert res.status_code == 404
@@ -0,0 +1,45 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+from app.repositories.sessions import SessionsRepository
+
+
+def _rotate(db, fingerprint=None):
+    return SessionsRepository(db).rotate(
+        refresh_token_hash="old",
+        new_refresh_token_hash="new",
+        expires_at=datetime.now(timezone.utc) + timedelta(days=30),
+        device_fingerprint=fingerprint,
+    )
+
+
+@pytest.mark.asyncio
+async def test_rotate_is_one_update_returning_and_one_insert(fake_db):
+    user_id = uuid.uuid4()
+    row = SimpleNamespace(user_id=user_id, ip="1.2.3.4", user_agent="ua", device_fingerprint=None, role="admin")
+    db = fake_db(respond=lambda sql: [row])
+
+    got_user_id, role, new_session = await _rotate(db, fingerprint="fp")
+
+    assert (got_user_id, role) == (user_id, "admin")
+    assert new_session.refresh_token_hash == "new"
+    assert db.added == [new_session]
+    assert (db.commits, db.refreshed) == (1, [])
+    [sql] = db.statements
+    assert sql.startswith("UPDATE sessions SET revoked_at")
+    assert "FROM users" in sql
+    assert "sessions.revoked_at IS NULL" in sql
+    assert "sessions.device_fingerprint IS NULL OR sessions.device_fingerprint" in sql
+    assert sql.rstrip().endswith("users.role")
+
+
+@pytest.mark.asyncio
+async def test_rotate_rejects_without_inserting(fake_db):
+    db = fake_db()
+    assert await _rotate(db) is None
+    assert db.added == []
+    assert db.commits == 0
+    assert "device_fingerprint IS NULL" not in db.statements[0]
@@ -0,0 +1,72 @@
+import pytest
+
+from app.cache.memory import TTLCache
+from app.middleware import api_key_auth
+from app.middleware.api_key_auth import lease_size, token_bucket_allow
+
+
+class FakeScript:
+    """Stands in for a registered redis Script: a shared bucket that grants up to `want` tokens."""
+
+    def __init__(self, tokens: int):
+        self.tokens = tokens
+        self.calls = 0
+
+    async def __call__(self, keys, args):
+        self.calls += 1
+        want = int(args[3])
+        granted = min(want, self.tokens)
+        self.tokens -= granted
+        return [granted, self.tokens]
+
+
+@pytest.fixture(autouse=True)
+def _reset_buckets():
+    api_key_auth._leases.clear()
+    api_key_auth._mem.clear()
+    yield
+    api_key_auth._leases.clear()
+    api_key_auth._mem.clear()
+
+
+def test_lease_size_scales_with_rate():
+    assert lease_size(60) == 1
+    assert lease_size(600) == 1
+    assert lease_size(6000) == 10
+
+
+@pytest.mark.asyncio
+async def test_leased_tokens_cut_redis_calls(monkeypatch):
+    script = FakeScript(tokens=25)
+    monkeypatch.setattr(api_key_auth, "get_redis_client", lambda: object())
+    monkeypatch.setattr(api_key_auth, "_token_bucket_script", lambda _r: script)
+
+    results = [await token_bucket_allow("tb:k", 6000) for _ in range(30)]
+
+    # 25 tokens in the shared bucket: admitted in 3 leases (10 + 10 + 5), then every denial re-checks.
+    assert sum(1 for allowed, _, _ in results if allowed) == 25
+    assert script.calls == 3 + 5
+
+
+@pytest.mark.asyncio
+async def test_memory_fallback_limits_and_evicts(monkeypatch):
+    monkeypatch.setattr(api_key_auth, "get_redis_client", lambda: None)
+    monkeypatch.setattr(api_key_auth, "_mem", TTLCache(max_entries=2, ttl_seconds=120))
+
+    allowed = [(await token_bucket_allow("tb:a", 2))[0] for _ in range(3)]
+    assert allowed == [True, True, False]
+
+    await token_bucket_allow("tb:b", 2)
+    await token_bucket_allow("tb:c", 2)
+    assert len(api_key_auth._mem) == 2
+    assert "tb:a" not in api_key_auth._mem
+
+
+def test_ttl_cache_expires_entries():
+    cache = TTLCache(max_entries=10, ttl_seconds=60)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl_seconds=-1)
+    assert cache.get("a") == 1
+    assert cache.get("b") is None
+    assert cache.discard_where(lambda k, _v: k == "a") == 1
+    assert len(cache) == 0
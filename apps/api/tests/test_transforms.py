@@ -0,0 +1,95 @@
+import asyncio
+import io
+
+import pytest
+from PIL import Image
+
+from app.core.config import settings
+from app.processing.transforms import Transformer, TransformSpec, derived_key, pick_source, render
+from app.storage import s3
+
+META = {
+    "width": 1290,
+    "height": 2796,
+    "webp_key": "screenshots/u/s/image.webp",
+    "variants": [
+        {"width": 720, "height": 1561, "key": "screenshots/u/s/w720.webp"},
+        {"width": 320, "height": 694, "key": "screenshots/u/s/w320.webp"},
+    ],
+}
+
+
+def _webp(size) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", size, (10, 120, 200)).save(buf, format="WEBP")
+    return buf.getvalue()
+
+
+def test_sizes_per_fit():
+    assert TransformSpec(width=300).output_size(1290, 2796) == (300, 650)
+    assert TransformSpec(width=300, height=300).output_size(1290, 2796) == (138, 300)
+    assert TransformSpec(width=300, height=300, fit="cover").scaled_size(1290, 2796) == (300, 650)
+    assert TransformSpec(width=300, height=300, fit="cover").output_size(1290, 2796) == (300, 300)
+    assert TransformSpec(width=300, height=300, fit="fill").output_size(1290, 2796) == (300, 300)
+    # contain never enlarges
+    assert TransformSpec(width=4000).output_size(1290, 2796) == (1290, 2796)
+
+
+def test_pick_source_prefers_smallest_large_enough_rendition():
+    assert pick_source(META, TransformSpec(width=300)) == "screenshots/u/s/w320.webp"
+    assert pick_source(META, TransformSpec(width=500)) == "screenshots/u/s/w720.webp"
+    assert pick_source(META, TransformSpec(width=1000)) == "screenshots/u/s/image.webp"
+    assert pick_source(META, TransformSpec(width=400, height=400, fit="cover")) == "screenshots/u/s/w720.webp"
+
+
+def test_derived_key_is_per_screenshot_and_spec():
+    key = derived_key(META["webp_key"], TransformSpec(width=300, fit="cover", format="jpeg"))
+    assert key == f"{settings.TRANSFORM_CACHE_PREFIX}screenshots/u/s/300x0-cover.jpeg"
+
+
+@pytest.mark.parametrize("fmt", ["webp", "png", "jpeg"])
+def test_render_encodes_requested_size_and_format(fmt):
+    spec = TransformSpec(width=100, height=100, fit="cover", format=fmt)
+    out = Image.open(io.BytesIO(render(_webp((320, 694)), spec, (100, 100))))
+    assert out.size == (100, 100)
+    assert out.format == fmt.upper()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_transforms_render_once_then_hit_memory(monkeypatch):
+    stored = {"screenshots/u/s/w320.webp": _webp((320, 694))}
+    gets, puts = [], []
+
+    def fake_get(key):
+        gets.append(key)
+        return stored.get(key)
+
+    def fake_put(key, data, content_type):
+        puts.append(key)
+        stored[key] = data
+
+    monkeypatch.setattr(s3, "get_bytes", fake_get)
+    monkeypatch.setattr(s3, "upload_bytes", fake_put)
+    transformer = Transformer()
+    spec = TransformSpec(width=160)
+
+    results = await asyncio.gather(*(transformer.transform(META, spec) for _ in range(5)))
+    assert {source for _, source in results} == {"rendered"}
+    assert len({data for data, _ in results}) == 1
+    assert gets == [derived_key(META["webp_key"], spec), "screenshots/u/s/w320.webp"]
+    assert puts == [derived_key(META["webp_key"], spec)]
+
+    _, source = await transformer.transform(META, spec)
+    assert source == "memory"
+    assert len(gets) == 2
+
+    # Another process: the derived asset comes from storage.
+    _, source = await Transformer().transform(META, spec)
+    assert source == "storage"
+
+
+@pytest.mark.asyncio
+async def test_missing_source_raises_lookup_error(monkeypatch):
+    monkeypatch.setattr(s3, "get_bytes", lambda key: None)
+    with pytest.raises(LookupError):
+        await Transformer().transform(META, TransformSpec(width=100))
@@ -0,0 +1,39 @@
+from datetime import date, datetime, timezone
+
+import pytest
+
+from app.repositories.usage import UsageRepository, is_usage_partition, partition_name
+
+
+def _with_partitions(fake_db, *names):
+    return fake_db(respond=lambda sql: [(n,) for n in names] if "pg_inherits" in sql else [])
+
+
+def test_partition_names_are_recognised():
+    assert partition_name(date(2026, 3, 7)) == "usage_logs_p20260307"
+    assert is_usage_partition("usage_logs_p20260307")
+    assert is_usage_partition("usage_logs_default")
+    assert not is_usage_partition("usage_logs")
+    assert not is_usage_partition("usage_rollups")
+
+
+@pytest.mark.asyncio
+async def test_rollup_rejects_unknown_granularity(fake_db):
+    with pytest.raises(ValueError):
+        await UsageRepository(fake_db()).rollup("minute", datetime.now(timezone.utc), datetime.now(timezone.utc))
+
+
+@pytest.mark.asyncio
+async def test_retention_drops_only_expired_daily_partitions(fake_db):
+    db = _with_partitions(fake_db, "usage_logs_default", "usage_logs_p20260101", "usage_logs_p20260110", "usage_logs_p20260111")
+    dropped = await UsageRepository(db).drop_partitions_before(date(2026, 1, 11))
+    assert dropped == ["usage_logs_p20260101", "usage_logs_p20260110"]
+    assert any(s.startswith("DELETE FROM usage_logs_default") for s in db.statements)
+
+
+@pytest.mark.asyncio
+async def test_missing_partitions_are_created(fake_db):
+    db = _with_partitions(fake_db, "usage_logs_p20260101")
+    created = await UsageRepository(db).ensure_partitions(date(2026, 1, 1), 3)
+    assert created == ["usage_logs_p20260102", "usage_logs_p20260103"]
+    assert "FOR VALUES FROM ('2026-01-02T00:00:00+00:00') TO ('2026-01-03T00:00:00+00:00')" in db.statements[1]